@@ -131,6 +131,42 @@ async function fetchJSON(url){
   return res.json();
 }
 
+// El navegador no revalida POST por sí solo: se guarda { etag, data } por (url, cuerpo) y el ETag
+// se reenvía en If-None-Match; un 304 reutiliza la copia guardada (también tras recargar la página)
+const POST_CACHE_PREFIX = 'agrofuturo:post:';
+
+function readPostCache(key){
+  try {
+    return JSON.parse(localStorage.getItem(POST_CACHE_PREFIX + key) || 'null');
+  } catch (err) {
+    return null;
+  }
+}
+
+function writePostCache(key, entry){
+  try {
+    if (entry) localStorage.setItem(POST_CACHE_PREFIX + key, JSON.stringify(entry));
+    else localStorage.removeItem(POST_CACHE_PREFIX + key);
+  } catch (err) {
+    // Sin almacenamiento (modo privado o cuota llena): sólo se pierde la revalidación
+  }
+}
+
+async function postJSON(url, body){
+  const payload = JSON.stringify(body);
+  const key = `${url}|${payload}`;
+  const cached = readPostCache(key);
+  const headers = { 'Content-Type': 'application/json' };
+  if (cached?.etag) headers['If-None-Match'] = cached.etag;
+  const res = await fetch(url, { method: 'POST', headers, body: payload });
+  if (res.status === 304 && cached) return cached.data;
+  if (!res.ok) throw new Error(`HTTP ${res.status} en ${url}`);
+  const data = await res.json();
+  const etag = res.headers.get('ETag');
+  writePostCache(key, etag ? { etag, data } : null);
+  return data;
+}
+
 function buildClusterLookup(kmeans){
   const lookup = {};
   if (!kmeans?.clusters) return lookup;
@@ -293,13 +329,20 @@ function zoneToListing(z, idx){
 async function bootstrapData(){
   setLoading(true);
   try {
-    const [zonesRes, kmeansRes, tempSeries, rainSeries, sortRes] = await Promise.all([
-      fetchJSON(`${API_BASE}/soil/zones?limit=40`),
-      fetchJSON(`${API_BASE}/algorithms/kmeans?k=4`).catch(() => null),
-      fetchJSON(`${API_BASE}/climate/timeseries?metric=TT&limit=240`).catch(() => ({ series: [] })),
-      fetchJSON(`${API_BASE}/climate/timeseries?metric=RR&limit=240`).catch(() => ({ series: [] })),
-      fetchJSON(`${API_BASE}/algorithms/sort?dataset=soil&metric=soil_score&method=quicksort&limit=200`).catch(() => null)
-    ]);
+    // Un solo round-trip: el backend planifica las operaciones sobre los mismos datos cargados
+    const batch = await postJSON(`${API_BASE}/algorithms/batch`, {
+      operations: [
+        { op: 'soil/zones', params: { limit: 40 } },
+        { op: 'algorithms/kmeans', params: { k: 4 } },
+        { op: 'climate/timeseries', params: { metric: 'TT', limit: 240 } },
+        { op: 'climate/timeseries', params: { metric: 'RR', limit: 240 } },
+        { op: 'algorithms/sort', params: { dataset: 'soil', metric: 'soil_score', method: 'quicksort', limit: 200 } }
+      ]
+    });
+    const [zonesRes, kmeansRes, tempOp, rainOp, sortRes] = batch.results.map(r => (r.status === 200 ? r.data : null));
+    if (!zonesRes) throw new Error('Zonas no disponibles en el backend');
+    const tempSeries = tempOp || { series: [] };
+    const rainSeries = rainOp || { series: [] };
     kmeansResult = kmeansRes;
     climateSeries = { TT: tempSeries?.series || [], RR: rainSeries?.series || [] };
     const colorLookup = buildClusterLookup(kmeansRes);
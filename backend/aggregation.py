@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import math
+import threading
+from concurrent.futures import Executor, Future
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .climate_store import ClimateStore
+from .executor import PoolUnavailable, TaskTimeout, compute_pool
+from .shared_arrays import ArraySpec, SharedArray, attach_array
+
+logger = logging.getLogger(__name__)
+
+AGG_METRICS = ["TT", "HR", "RR", "PP", "FF", "DD"]
+PARTITION_SCHEMES = ("rows", "year", "month")
+
+
+@dataclass
+class Partial:
+    """Mergeable per-partition summary, one slot per metric.
+
+    Sums are taken over ``value - shift`` (one shift per metric, shared by every
+    partition) so the variance from sum/sumsq does not lose precision on metrics
+    with a large offset such as pressure.
+    """
+
+    count: np.ndarray
+    total: np.ndarray
+    sumsq: np.ndarray
+    min: np.ndarray
+    max: np.ndarray
+    nan_count: np.ndarray
+
+    @classmethod
+    def empty(cls, n_metrics: int) -> "Partial":
+        zeros = np.zeros(n_metrics)
+        return cls(
+            count=zeros.copy(),
+            total=zeros.copy(),
+            sumsq=zeros.copy(),
+            min=np.full(n_metrics, np.inf),
+            max=np.full(n_metrics, -np.inf),
+            nan_count=zeros.copy(),
+        )
+
+    def merge(self, other: "Partial") -> "Partial":
+        return Partial(
+            count=self.count + other.count,
+            total=self.total + other.total,
+            sumsq=self.sumsq + other.sumsq,
+            min=np.minimum(self.min, other.min),
+            max=np.maximum(self.max, other.max),
+            nan_count=self.nan_count + other.nan_count,
+        )
+
+
+def compute_partial(block: np.ndarray, shift: np.ndarray) -> Partial:
+    """Partial over a (metrics × rows) block; NaNs are counted, not aggregated."""
+    valid = ~np.isnan(block)
+    centered = np.where(valid, block - shift[:, None], 0.0)
+    return Partial(
+        count=valid.sum(axis=1).astype(float),
+        total=centered.sum(axis=1),
+        sumsq=(centered * centered).sum(axis=1),
+        min=np.fmin.reduce(block, axis=1, initial=np.inf),
+        max=np.fmax.reduce(block, axis=1, initial=-np.inf),
+        nan_count=(~valid).sum(axis=1).astype(float),
+    )
+
+
+def merge_partials(partials: Sequence[Partial], n_metrics: int) -> Partial:
+    merged = Partial.empty(n_metrics)
+    for partial in partials:
+        merged = merged.merge(partial)
+    return merged
+
+
+def finalize(partial: Partial, shift: np.ndarray, metrics: Sequence[str]) -> Dict[str, Dict]:
+    """Turn a partial into per-metric count/sum/mean/var/std/min/max (sample variance, ddof=1)."""
+    stats: Dict[str, Dict] = {}
+    for i, metric in enumerate(metrics):
+        n = partial.count[i]
+        mean_c = partial.total[i] / n if n else math.nan
+        var = (partial.sumsq[i] - partial.total[i] * mean_c) / (n - 1) if n > 1 else math.nan
+        var = max(var, 0.0) if not math.isnan(var) else None
+        stats[metric] = {
+            "count": int(n),
+            "nan_count": int(partial.nan_count[i]),
+            "sum": float(partial.total[i] + shift[i] * n),
+            "mean": float(mean_c + shift[i]) if n else None,
+            "var": var,
+            "std": math.sqrt(var) if var is not None else None,
+            "min": float(partial.min[i]) if n else None,
+            "max": float(partial.max[i]) if n else None,
+        }
+    return stats
+
+
+def partition_bounds(store: ClimateStore, scheme: str = "rows", partitions: int = 4) -> List[Tuple[str, int, int]]:
+    """(label, start, end) row ranges over the time-sorted store."""
+    n = len(store)
+    if scheme == "rows":
+        chunk = max(1, math.ceil(n / max(1, partitions)))
+        return [(str(idx), lo, min(lo + chunk, n)) for idx, lo in enumerate(range(0, n, chunk))]
+    if scheme == "year":
+        return [(str(year), lo, hi) for year, (lo, hi) in sorted(store.year_index.items())]
+    if scheme == "month":
+        key = store.year * 12 + (store.month - 1)
+        starts = np.flatnonzero(np.diff(key)) + 1
+        los = np.concatenate([[0], starts]).tolist() if n else []
+        his = np.concatenate([starts, [n]]).tolist() if n else []
+        return [(f"{store.year[lo]}-{store.month[lo]:02d}", lo, hi) for lo, hi in zip(los, his)]
+    raise ValueError(f"Esquema de partición inválido: {scheme}, usa {', '.join(PARTITION_SCHEMES)}")
+
+
+class SharedClimateMatrix:
+    """Metrics × rows float64 matrix of a ClimateStore copied once into shared memory.
+
+    ``users`` counts the aggregations whose tasks may still attach it: a matrix
+    replaced by a newer store is only released once that count drops to 0.
+    """
+
+    def __init__(self, store: ClimateStore, metrics: Sequence[str] = AGG_METRICS):
+        self.users = 0
+        self.retired = False
+        self.metrics = [m for m in metrics if store.has_metric(m)]
+        matrix = np.vstack([store.metrics[m] for m in self.metrics]) if self.metrics else np.empty((0, len(store)))
+        self.shared = SharedArray(matrix)
+        # Desplazamiento por métrica: primer valor válido (estabiliza sumsq)
+        self.shift = np.array(
+            [matrix[i][~np.isnan(matrix[i])][0] if np.any(~np.isnan(matrix[i])) else 0.0 for i in range(len(matrix))]
+        )
+
+    @property
+    def spec(self) -> ArraySpec:
+        return self.shared.spec
+
+    def close(self) -> None:
+        self.shared.close()
+
+
+def _partials(matrix: np.ndarray, shift: np.ndarray, ranges: List[Tuple[int, int]]) -> List[Partial]:
+    return [compute_partial(matrix[:, lo:hi], shift) for lo, hi in ranges]
+
+
+def _partials_task(spec: ArraySpec, shift: np.ndarray, ranges: List[Tuple[int, int]]) -> List[Partial]:
+    # Corre en el worker: adjunta la matriz compartida (sin copiar) y resume cada rango
+    return _partials(attach_array(spec), shift, ranges)
+
+
+_pool_lock = threading.Lock()
+# id del store -> (store, copia compartida); el store se retiene para que su id no se reuse
+_shared: Dict[int, Tuple[ClimateStore, SharedClimateMatrix]] = {}
+# Copias reemplazadas que alguna agregación en curso todavía usa
+_retired: List[SharedClimateMatrix] = []
+
+
+def shared_matrix_for(store: ClimateStore) -> SharedClimateMatrix:
+    """Shared-memory copy of `store`, created once per store.
+
+    Copies of older stores (replaced by a reload or an ingest) are released right
+    away if no aggregation is using them, otherwise when the last one finishes.
+    """
+    with _pool_lock:
+        return _matrix_for(store)
+
+
+def _matrix_for(store: ClimateStore) -> SharedClimateMatrix:
+    # Llamar con _pool_lock tomado
+    entry = _shared.get(id(store))
+    if entry is None:
+        for _, old in _shared.values():
+            old.retired = True
+            if old.users:
+                _retired.append(old)
+            else:
+                old.close()
+        _shared.clear()
+        entry = _shared[id(store)] = (store, SharedClimateMatrix(store))
+    return entry[1]
+
+
+def _acquire(store: ClimateStore) -> SharedClimateMatrix:
+    with _pool_lock:
+        matrix = _matrix_for(store)
+        matrix.users += 1
+        return matrix
+
+
+def _release(matrix: SharedClimateMatrix) -> None:
+    with _pool_lock:
+        matrix.users -= 1
+        if matrix.retired and not matrix.users:
+            _retired.remove(matrix)
+            matrix.close()
+
+
+def _release_after(matrix: SharedClimateMatrix, futures: Sequence[Future]) -> None:
+    # Un lote que superó el timeout puede seguir corriendo y adjuntar la matriz: se suelta al terminar el último
+    pending = [f for f in futures if not f.done()]
+    if not pending:
+        _release(matrix)
+        return
+    left = [len(pending)]
+    lock = threading.Lock()
+
+    def _finished(_: Future) -> None:
+        with lock:
+            left[0] -= 1
+            last = not left[0]
+        if last:
+            _release(matrix)
+
+    for future in pending:
+        future.add_done_callback(_finished)
+
+
+@atexit.register
+def _shutdown() -> None:
+    for matrix in [m for _, m in _shared.values()] + _retired:
+        matrix.close()
+    _shared.clear()
+    _retired.clear()
+
+
+def _aggregate_partials(
+    matrix: SharedClimateMatrix,
+    ranges: List[Tuple[int, int]],
+    executor: Optional[Executor],
+    parallel: bool,
+    futures: List[Future],
+) -> List[Partial]:
+    # Los futures enviados quedan en `futures` para soltar la matriz cuando terminen
+    if parallel and len(ranges) > 1:
+        pool = executor or compute_pool
+        workers = compute_pool.workers if executor is None else getattr(executor, "_max_workers", 1)
+        n_batches = min(len(ranges), workers or 1)
+        batches = [ranges[i::n_batches] for i in range(n_batches)]
+        try:
+            for batch in batches:
+                futures.append(pool.submit(_partials_task, matrix.spec, matrix.shift, batch))
+            results = compute_pool.gather(futures)  # un solo plazo para todos los lotes
+            # Reordena: el lote i tiene los rangos i, i + n_batches, ...
+            partials: List[Partial] = [None] * len(ranges)  # type: ignore[list-item]
+            for b, batch_partials in enumerate(results):
+                partials[b::n_batches] = batch_partials
+            return partials
+        except (BrokenProcessPool, PoolUnavailable, OSError) as exc:
+            logger.warning("Pool de procesos no disponible, agregando en el proceso actual: %s", exc)
+            if executor is None:
+                compute_pool.reset()
+        except BaseException as exc:
+            for future in futures:  # saturado o timeout: no deja lotes huérfanos en la cola
+                future.cancel()
+            if isinstance(exc, TimeoutError):
+                raise TaskTimeout(f"La agregación superó {compute_pool.timeout:g}s") from None
+            raise
+    # En el proceso actual se lee la copia propia, sin volver a adjuntar el segmento por nombre
+    return _partials(matrix.shared.array, matrix.shift, ranges)
+
+
+def aggregate_climate(
+    store: ClimateStore,
+    scheme: str = "rows",
+    partitions: int = 4,
+    executor: Optional[Executor] = None,
+    parallel: bool = True,
+) -> Dict:
+    """Per-partition and global stats for every climate metric.
+
+    Partitions are spread in batches over the shared compute pool (or `executor`);
+    workers read the metric matrix from shared memory and return partials, which
+    are merged here, so the global stats are exact for uneven partitions. With the
+    compute pool a full queue raises `PoolSaturated`; a broken pool falls back to
+    aggregating in the current process. The matrix stays alive while any batch of
+    this call may still read it, even if an ingest replaces the store meanwhile.
+    """
+    bounds = partition_bounds(store, scheme, partitions)
+    ranges = [(lo, hi) for _, lo, hi in bounds]
+    matrix = _acquire(store)
+    futures: List[Future] = []
+    try:
+        partials = _aggregate_partials(matrix, ranges, executor, parallel, futures)
+    finally:
+        _release_after(matrix, futures)
+
+    metrics = matrix.metrics
+    merged = merge_partials(partials, len(metrics))
+    return {
+        "scheme": scheme,
+        "metrics": finalize(merged, matrix.shift, metrics),
+        "partitions": [
+            {"label": label, "rows": hi - lo, "metrics": finalize(partial, matrix.shift, metrics)}
+            for (label, lo, hi), partial in zip(bounds, partials)
+        ],
+    }
@@ -1,13 +1,20 @@
 from __future__ import annotations
 
 import math
-from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 
+from .aggregation import aggregate_climate
+from .climate_store import ClimateStore
+from .clustering import centroid_cache, kmeans
+from .executor import compute_pool
 from .graph import ZoneGraph
+from .metrics import KMEANS_ITERATIONS, SHORTEST_PATH_ROUNDS, stage_timer
+from .shared_arrays import ArraySpec, attach_array
+from .shortest_paths import ShortestPaths, attach_csr, resolve_method, shortest_paths, solve, source_indices, to_csr
+from .sorting import quicksort, sort_items  # noqa: F401 (quicksort se re-exporta)
 
 
 def _cluster_metrics(graph: ZoneGraph, nodes: List[str]) -> Dict:
@@ -23,118 +30,226 @@ def _cluster_metrics(graph: ZoneGraph, nodes: List[str]) -> Dict:
     }
 
 
-def _process_climate_chunk(chunk: pd.DataFrame, idx: int) -> Dict:
-    # Agrega métricas climáticas por partición (usado en divide y vencerás)
+def _climate_summary(stats: Dict[str, Dict]) -> Dict:
+    # Campos históricos del endpoint a partir de las estadísticas combinadas
     return {
-        "chunk": idx,  # id de partición
-        "rows": int(len(chunk)),  # filas en chunk
-        "temp_avg": float(chunk["TT"].mean()),  # temperatura promedio
-        "humidity_avg": float(chunk["HR"].mean()),  # humedad promedio
-        "rain_total": float(chunk["RR"].sum()),  # lluvia acumulada
-        "pressure_avg": float(chunk["PP"].mean()),  # presión promedio
+        "temp_avg": stats["TT"]["mean"],  # temperatura promedio
+        "humidity_avg": stats["HR"]["mean"],  # humedad promedio
+        "rain_total": stats["RR"]["sum"],  # lluvia acumulada
+        "pressure_avg": stats["PP"]["mean"],  # presión promedio
     }
 
 
 # --- Divide y vencerás clima (endpoint /algorithms/divide-and-conquer) ---
-def run_divide_and_conquer(climate_df: pd.DataFrame, partitions: int = 4) -> Dict:
-    """Divide el dataset de clima en N y procesa en paralelo (divide y vencerás)."""
-    df = climate_df.sort_values("datetime").reset_index(drop=True)  # ordena cronológicamente
+@stage_timer("divide_and_conquer")
+def run_divide_and_conquer(climate: ClimateStore | pd.DataFrame, partitions: int = 4, scheme: str = "rows") -> Dict:
+    """Divide el clima en particiones, resume cada una en paralelo y combina los parciales."""
+    store = climate if isinstance(climate, ClimateStore) else ClimateStore(climate)  # arrays ordenados por tiempo
     partitions = max(1, partitions)  # al menos 1
-    chunk_size = math.ceil(len(df) / partitions)  # tamaño por chunk
-    chunks = [df.iloc[i : i + chunk_size] for i in range(0, len(df), chunk_size)]  # crea chunks
-
-    with ThreadPoolExecutor(max_workers=partitions) as executor:  # pool threads
-        results = list(executor.map(lambda args: _process_climate_chunk(*args), [(chunk, idx) for idx, chunk in enumerate(chunks)]))  # procesa en paralelo
+    result = aggregate_climate(store, scheme=scheme, partitions=partitions)  # pool de procesos + memoria compartida
 
     aggregate = {
-        "rows": int(len(df)),
+        "rows": int(len(store)),
         "partitions": partitions,
-        "temp_avg": float(np.mean([r["temp_avg"] for r in results])),
-        "humidity_avg": float(np.mean([r["humidity_avg"] for r in results])),
-        "rain_total": float(np.sum([r["rain_total"] for r in results])),
-        "pressure_avg": float(np.mean([r["pressure_avg"] for r in results])),
+        "scheme": scheme,
+        **_climate_summary(result["metrics"]),  # promedios ponderados por filas, no promedio de promedios
+        "stats": result["metrics"],  # count/sum/mean/var/std/min/max por métrica
     }
-    return {"aggregate": aggregate, "partitions": results}
+    chunks = [
+        {
+            "chunk": idx,  # id de partición
+            "label": part["label"],  # índice, año o año-mes según el esquema
+            "rows": part["rows"],  # filas en la partición
+            **_climate_summary(part["metrics"]),
+            "stats": part["metrics"],
+        }
+        for idx, part in enumerate(result["partitions"])
+    ]
+    return {"aggregate": aggregate, "partitions": chunks}
 
 
 # --- QuickSort (endpoint /algorithms/sort; usado en frontend para ranking de zonas y series de clima) ---
 # Front: quicksort ordena rankings de suelo/clima; se llama desde app.js al cargar el ranking inicial.
-def quicksort(items: List[Dict], key: str) -> List[Dict]:
-    # Ordena recursivamente usando QuickSort
-    if len(items) <= 1:
-        return items  # base
-    pivot = items[len(items) // 2][key]  # pivote central
-    left = [x for x in items if x[key] < pivot]  # menores
-    middle = [x for x in items if x[key] == pivot]  # iguales
-    right = [x for x in items if x[key] > pivot]  # mayores
-    return quicksort(left, key) + middle + quicksort(right, key)
-
-
-def run_sort(items: List[Dict], key: str, method: str = "quicksort", reverse: bool = False) -> List[Dict]:
-    # Selecciona QuickSort (único método soportado) y opcionalmente revierte el orden
-    sorted_items = quicksort(items, key)  # ordena
-    if reverse:
-        sorted_items.reverse()  # invierte si se requiere
+# La implementación (iterativa) y las demás estrategias viven en sorting.py
+def run_sort(
+    items: List[Dict],
+    key: str,
+    method: str = "quicksort",
+    reverse: bool = False,
+    top: Optional[int] = None,
+    keys: Optional[List[Tuple[str, bool]]] = None,
+) -> List[Dict]:
+    # method=auto elige según tamaño: QuickSort para pocos items, argsort NumPy para muchos, top-k si hay `top`
+    sorted_items, _ = sort_items(items, key, method=method, reverse=reverse, top=top, keys=keys)
     return sorted_items  # resultado
 
 
+async def run_sort_pooled(
+    items: List[Dict],
+    key: str,
+    method: str = "quicksort",
+    reverse: bool = False,
+    top: Optional[int] = None,
+    keys: Optional[List[Tuple[str, bool]]] = None,
+) -> List[Dict]:
+    # Igual que run_sort pero en el pool de procesos (los items ya son sólo etiqueta/valor)
+    with stage_timer("sort"):
+        return await compute_pool.run(run_sort, items, key, method, reverse, top, keys)
 
 
 # --- K-Means (endpoint /algorithms/kmeans, clusters de suelo para mapas/dashboard) ---
-def run_kmeans(features: pd.DataFrame, norm_meta: Dict[str, Tuple[float, float]], k: int = 4, max_iter: int = 20) -> Dict:
-    feature_cols = [c for c in features.columns if c.endswith("_norm")]  # selecciona columnas ya normalizadas
-    col_index = {c: idx for idx, c in enumerate(feature_cols)}  # mapea cada columna normalizada a su índice en la matriz
-    data = features[feature_cols].to_numpy()  # convierte el dataframe a una matriz NumPy para cálculos vectorizados
-    k = max(2, min(k, len(data)))  # asegura que k esté entre 2 y el número de filas disponibles
-
-    rng = np.random.default_rng(seed=42)  # crea generador aleatorio con semilla fija para reproducibilidad
-    centroids = data[rng.choice(len(data), size=k, replace=False)]  # elige k filas aleatorias como centroides iniciales
-    labels = np.zeros(len(data), dtype=int)  # inicializa etiquetas de cluster para cada punto
-
-    for _ in range(max_iter):  # itera hasta max_iter veces o hasta converger
-        distances = np.linalg.norm(data[:, None, :] - centroids[None, :, :], axis=2)  # calcula distancias punto-centroide
-        new_labels = np.argmin(distances, axis=1)  # asigna cada punto al centroide más cercano
-        new_centroids = np.array(  # recalcula centroides como promedio de los puntos asignados
-            [data[new_labels == i].mean(axis=0) if np.any(new_labels == i) else centroids[i] for i in range(k)]
-        )
-        if np.allclose(new_centroids, centroids, atol=1e-4):  # si los centroides no cambian (convergen) rompe el ciclo
-            labels = new_labels
-            centroids = new_centroids
-            break
-        labels = new_labels  # actualiza etiquetas para la siguiente iteración
-        centroids = new_centroids  # actualiza centroides para la siguiente iteración
+def _kmeans_payload(
+    data: np.ndarray,
+    label_values: np.ndarray,
+    norm_meta: Dict[str, Tuple[float, float]],
+    col_index: Dict[str, int],
+    k: int,
+    mode: str,
+    max_iter: int,
+    init: Optional[np.ndarray],
+    list_members: bool,
+) -> Tuple[Dict, np.ndarray]:
+    # Núcleo de K-Means + armado de clusters; corre en el proceso actual o en un worker del pool
+    result = kmeans(data, k, mode=mode, max_iter=max_iter, init=init)  # k-means++ + Lloyd/Hamerly/mini-batch por bloques
+    labels, centroids = result.labels, result.centroids
+    sizes = np.bincount(labels, minlength=k)  # puntos por cluster
 
     clusters = []  # lista de clusters resultantes
-    distrito_col = features["distrito"].tolist()  # almacena los nombres de distrito para mapearlos a clusters
     for idx in range(k):  # recorre cada cluster final
-        members = [distrito_col[i] for i, lbl in enumerate(labels) if lbl == idx]  # extrae distritos pertenecientes al cluster
         centroid_denorm = {}  # preparará el centroide reescalado a valores originales
         for col, (min_v, max_v) in norm_meta.items():  # para cada variable normalizada
             norm_val = centroids[idx][col_index[f"{col}_norm"]]  # toma el valor normalizado del centroide en esa dimensión
             centroid_denorm[col] = float(min_v + norm_val * (max_v - min_v))  # reescala a rango original usando min/max
-        clusters.append({"id": idx, "members": members, "centroid": centroid_denorm})  # agrega el cluster con miembros y centroide
+        cluster = {"id": idx, "size": int(sizes[idx]), "centroid": centroid_denorm}
+        in_cluster = label_values[labels == idx]
+        if list_members:
+            cluster["members"] = in_cluster.tolist()  # distritos pertenecientes al cluster
+        else:
+            # A nivel de muestra se resume la composición por etiqueta en vez de listar miles de filas
+            names, counts = np.unique(in_cluster, return_counts=True)
+            cluster["composition"] = {str(n): int(c) for n, c in zip(names, counts)}
+        clusters.append(cluster)  # agrega el cluster con miembros y centroide
+
+    payload = {
+        "k": k,
+        "mode": result.mode,  # lloyd | hamerly | minibatch
+        "iterations": result.iterations,  # iteraciones hasta converger (o max_iter)
+        "converged": result.converged,
+        "inertia": result.inertia,  # suma de distancias² al centroide
+        "clusters": clusters,
+    }
+    return payload, centroids
+
+
+def _kmeans_task(data: ArraySpec, label_values: ArraySpec, *args) -> Tuple[Dict, np.ndarray]:
+    # Corre en el worker: matriz y etiquetas se leen de memoria compartida (sin copiar)
+    return _kmeans_payload(attach_array(data), attach_array(label_values), *args)
 
-    return {"k": k, "clusters": clusters}  # devuelve k usado y clusters con centroides desnormalizados
+
+def _kmeans_finish(payload: Dict, centroids: np.ndarray, warm_start_key: Optional[Tuple]) -> Dict:
+    KMEANS_ITERATIONS.observe(payload["iterations"], mode=payload["mode"])
+    if warm_start_key is not None:
+        sizes = np.array([cluster["size"] for cluster in payload["clusters"]])
+        centroid_cache.store(warm_start_key, centroids, sizes)
+    return payload  # devuelve k usado y clusters con centroides desnormalizados
+
+
+@stage_timer("kmeans")
+def run_kmeans(
+    features: pd.DataFrame,
+    norm_meta: Dict[str, Tuple[float, float]],
+    k: int = 4,
+    max_iter: int = 100,
+    mode: str = "auto",
+    label_col: str = "distrito",
+    list_members: bool = True,
+    warm_start_key: Optional[Tuple] = None,
+) -> Dict:
+    feature_cols = [c for c in features.columns if c.endswith("_norm")]  # selecciona columnas ya normalizadas
+    col_index = {c: idx for idx, c in enumerate(feature_cols)}  # mapea cada columna normalizada a su índice en la matriz
+    data = features[feature_cols].to_numpy(dtype=float)  # convierte el dataframe a una matriz NumPy para cálculos vectorizados
+    k = max(2, min(k, len(data)))  # asegura que k esté entre 2 y el número de filas disponibles
+
+    # Arranque en caliente: centroides cacheados para otro k del mismo nivel/versión
+    init = centroid_cache.initial_centroids(warm_start_key, k) if warm_start_key is not None else None
+    label_values = features[label_col].to_numpy()  # etiqueta de cada fila (distrito) para mapearla a clusters
+    payload, centroids = _kmeans_payload(
+        data, label_values, norm_meta, col_index, k, mode, max_iter, init, list_members
+    )
+    return _kmeans_finish(payload, centroids, warm_start_key)
+
+
+async def run_kmeans_pooled(
+    features: pd.DataFrame,
+    norm_meta: Dict[str, Tuple[float, float]],
+    k: int = 4,
+    max_iter: int = 100,
+    mode: str = "auto",
+    label_col: str = "distrito",
+    list_members: bool = True,
+    warm_start_key: Optional[Tuple] = None,
+) -> Dict:
+    """run_kmeans in the compute pool; the feature matrix and labels are shared once per frame."""
+    with stage_timer("kmeans"):
+        feature_cols = [c for c in features.columns if c.endswith("_norm")]
+        col_index = {c: idx for idx, c in enumerate(feature_cols)}
+        data = compute_pool.share(features, "kmeans:data", lambda: features[feature_cols].to_numpy(dtype=float))
+        # Etiquetas como texto de ancho fijo (un arreglo de objetos no cabe en memoria compartida)
+        labels = compute_pool.share(
+            features, f"kmeans:{label_col}", lambda: features[label_col].to_numpy().astype(str)
+        )
+        k = max(2, min(k, data.shape[0]))
+        init = centroid_cache.initial_centroids(warm_start_key, k) if warm_start_key is not None else None
+        payload, centroids = await compute_pool.run(
+            _kmeans_task, data, labels, norm_meta, col_index, k, mode, max_iter, init, list_members
+        )
+        return _kmeans_finish(payload, centroids, warm_start_key)
 
 
 # --- Bellman–Ford (endpoint /algorithms/bellman-ford, rutas mínimas consumidas por frontend) ---
-def run_bellman_ford(graph: ZoneGraph, source: str) -> Dict:
-    # Caminos de menor costo desde un nodo origen (Bellman–Ford)
-    nodes = list(graph.adjacency.keys())  # nodos
-    dist = {n: float("inf") for n in nodes}  # distancias
-    prev: Dict[str, str | None] = {n: None for n in nodes}  # predecesores
-    dist[source] = 0.0  # origen a 0
-
-    edges = [(u, v, w) for u, neighbors in graph.adjacency.items() for v, w in neighbors]  # aristas
-    for _ in range(len(nodes) - 1):  # |V|-1 iteraciones
-        updated = False  # flag
-        for u, v, w in edges:  # relaja cada arista
-            if dist[u] + w < dist[v]:
-                dist[v] = dist[u] + w  # actualiza distancia
-                prev[v] = u  # guarda predecesor
-                updated = True  # hubo cambio
-        if not updated:
-            break  # sin cambios => óptimo
-
-    distance_safe = {k: (v if math.isfinite(v) else None) for k, v in dist.items()}  # JSON-safe
-    return {"source": source, "distance": distance_safe, "prev": prev}
+def _shortest_paths_payload(source: str | List[str], result: ShortestPaths) -> Dict:
+    SHORTEST_PATH_ROUNDS.observe(result.rounds, method=result.method)
+    names = result.csr.names
+
+    distance_safe = {n: (float(d) if math.isfinite(d) else None) for n, d in zip(names, result.dist.tolist())}  # JSON-safe
+    prev = {n: (names[p] if p >= 0 else None) for n, p in zip(names, result.prev.tolist())}  # predecesores
+    paths = {}  # caminos ya reconstruidos origen -> destino
+    for i, n in enumerate(names):
+        path = result.path_to(i)
+        paths[n] = [names[j] for j in path] if path is not None else None
+    response = {"source": source, "method": result.method, "distance": distance_safe, "prev": prev, "paths": paths}
+    if len(result.sources) > 1:
+        response["origin"] = {n: (names[o] if o >= 0 else None) for n, o in zip(names, result.origin.tolist())}
+    return response
+
+
+@stage_timer("bellman_ford")
+def run_bellman_ford(graph: ZoneGraph, source: str | List[str], method: str = "auto") -> Dict:
+    # Caminos de menor costo desde uno o varios orígenes sobre arrays CSR (ver shortest_paths)
+    sources = [source] if isinstance(source, str) else list(source)
+    result = shortest_paths(graph, sources, method)  # Dijkstra si no hay pesos negativos
+    return _shortest_paths_payload(source, result)
+
+
+def _shortest_paths_task(
+    indptr: ArraySpec, indices: ArraySpec, weights: ArraySpec, sources: List[int], method: str
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    # Corre en el worker: CSR desde memoria compartida; los nombres no hacen falta, sólo índices
+    result = solve(attach_csr(indptr, indices, weights), sources, method)
+    return result.dist, result.prev, result.origin, result.rounds
+
+
+async def run_bellman_ford_pooled(graph: ZoneGraph, source: str | List[str], method: str = "auto") -> Dict:
+    """run_bellman_ford in the compute pool; the graph's CSR arrays are shared once per graph."""
+    with stage_timer("bellman_ford"):
+        sources = [source] if isinstance(source, str) else list(source)
+        csr = to_csr(graph)
+        idx = source_indices(csr, sources)
+        method = resolve_method(csr, method)
+        indptr, indices, weights = (
+            compute_pool.share(graph, f"csr:{name}", lambda a=getattr(csr, name): a)
+            for name in ("indptr", "indices", "weights")
+        )
+        dist, prev, origin, rounds = await compute_pool.run(_shortest_paths_task, indptr, indices, weights, idx, method)
+        result = ShortestPaths(csr=csr, sources=idx, dist=dist, prev=prev, origin=origin, method=method, rounds=rounds)
+        return _shortest_paths_payload(source, result)
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from .config import ANOMALY_Z, BATCH_MAX_OPERATIONS, DEFAULT_KMEANS_K, DEFAULT_SORT_LIMIT, FEATURE_WEIGHT, GEO_WEIGHT
+
+
+class _OpParams(BaseModel):
+    # Parámetros con los mismos nombres, defaults y límites que el query string del GET
+    model_config = ConfigDict(extra="forbid", populate_by_name=True)
+
+
+class ZonesParams(_OpParams):
+    limit: int = Field(50, ge=1, le=200)
+    format: str = "rows"
+
+
+class CubeParams(_OpParams):
+    by: str = "distrito"
+    provincia: Optional[List[str]] = None
+    distrito: Optional[List[str]] = None
+    cell: Optional[List[str]] = None
+    start: Optional[str] = Field(None, alias="from")
+    end: Optional[str] = Field(None, alias="to")
+    metrics: Optional[str] = None
+    stats: str = "mean"
+    format: str = "rows"
+
+
+class TimeseriesParams(_OpParams):
+    metric: str = "TT"
+    year: Optional[int] = None
+    limit: int = Field(DEFAULT_SORT_LIMIT, ge=10, le=2000)
+    start: Optional[datetime] = Field(None, alias="from")
+    end: Optional[datetime] = Field(None, alias="to")
+    format: str = "rows"
+    points: Optional[int] = Field(None, ge=2, le=5000)
+    resolution: Optional[str] = None
+    downsample: str = "lttb"
+
+
+class RollingParams(_OpParams):
+    metric: str = "TT"
+    window: str = "24h"
+    year: Optional[int] = None
+    limit: int = Field(DEFAULT_SORT_LIMIT, ge=10, le=5000)
+    start: Optional[datetime] = Field(None, alias="from")
+    end: Optional[datetime] = Field(None, alias="to")
+    z: float = Field(ANOMALY_Z, gt=0, le=10)
+    anomalies: bool = False
+    format: str = "rows"
+
+
+class SortParams(_OpParams):
+    dataset: str = "climate"
+    metric: str = "TT"
+    method: str = "quicksort"
+    year: Optional[int] = None
+    limit: int = Field(DEFAULT_SORT_LIMIT, ge=10, le=5000)
+    reverse: bool = False
+    top: Optional[int] = Field(None, ge=1, le=5000)
+    keys: Optional[str] = None
+    start: Optional[datetime] = Field(None, alias="from")
+    end: Optional[datetime] = Field(None, alias="to")
+    format: str = "rows"
+
+
+class KMeansParams(_OpParams):
+    k: int = Field(DEFAULT_KMEANS_K, ge=2, le=12)
+    level: str = "district"
+    mode: str = "auto"
+    warm_start: bool = False
+    max_iter: int = Field(100, ge=1, le=500)
+
+
+class BellmanFordParams(_OpParams):
+    start: Optional[str] = None
+    feature_weight: float = Field(FEATURE_WEIGHT, ge=0.0, le=1.0)
+    geo_weight: float = Field(GEO_WEIGHT, ge=0.0, le=1.0)
+    sources: Optional[List[str]] = None
+    method: str = "auto"
+
+
+class GraphDistancesParams(_OpParams):
+    distritos: Optional[List[str]] = None
+    targets: Optional[List[str]] = None
+    feature_weight: float = Field(FEATURE_WEIGHT, ge=0.0, le=1.0)
+    geo_weight: float = Field(GEO_WEIGHT, ge=0.0, le=1.0)
+
+
+class DivideAndConquerParams(_OpParams):
+    partitions: int = Field(4, ge=1, le=16)
+    scheme: str = "rows"
+
+
+# Operación -> (parámetros, componentes del warmup que necesita)
+BATCH_OPERATIONS: Dict[str, Tuple[Type[_OpParams], Tuple[str, ...]]] = {
+    "soil/zones": (ZonesParams, ("soil",)),
+    "soil/cube": (CubeParams, ("soil_cube",)),
+    "climate/timeseries": (TimeseriesParams, ("climate_store", "climate_rollups")),
+    "climate/rolling": (RollingParams, ("climate_rolling",)),
+    "algorithms/sort": (SortParams, ("climate_store", "soil")),
+    "algorithms/kmeans": (KMeansParams, ("soil",)),
+    "algorithms/bellman-ford": (BellmanFordParams, ("graph", "soil")),
+    "algorithms/divide-and-conquer": (DivideAndConquerParams, ("climate_store",)),
+    "graph/distances": (GraphDistancesParams, ("graph", "graph_analytics")),
+}
+
+
+class BatchOperation(BaseModel):
+    id: Optional[str] = Field(None, description="Etiqueta libre que se devuelve con el resultado")
+    op: str = Field(..., description="Ruta del GET equivalente, p.ej. soil/zones o algorithms/kmeans")
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=BATCH_MAX_OPERATIONS)
+
+
+def plan_key(op: str, params: _OpParams) -> Tuple:
+    """Identity of an operation: equal keys are computed once per batch."""
+    return op, tuple(sorted((name, repr(value)) for name, value in params.model_dump().items()))
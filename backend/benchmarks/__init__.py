@@ -0,0 +1 @@
+# Benchmarks del backend; cada módulo se ejecuta con `python -m backend.benchmarks.<modulo>`.
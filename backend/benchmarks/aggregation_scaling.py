@@ -0,0 +1,76 @@
+"""Scaling of the divide-and-conquer aggregation engine with partitions and worker processes.
+
+    python -m backend.benchmarks.aggregation_scaling --rows 5000000 --workers 1 2 4 8
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from ..aggregation import aggregate_climate, shared_matrix_for
+from ..climate_store import ClimateStore
+
+
+def synthetic_store(rows: int, seed: int = 0) -> ClimateStore:
+    rng = np.random.default_rng(seed)
+    when = pd.date_range("2018-01-01", periods=rows, freq="min", tz="UTC")
+    df = pd.DataFrame(
+        {
+            "datetime": when,
+            "year": when.year,
+            "month": when.month,
+            "UBIGEO": 120101,
+            "TT": rng.normal(12, 5, rows),
+            "HR": rng.uniform(30, 95, rows),
+            "RR": np.maximum(0, rng.normal(-1, 1.5, rows)),
+            "PP": rng.normal(680, 2, rows),
+            "FF": rng.gamma(2, 1.5, rows),
+            "DD": rng.uniform(0, 360, rows),
+        }
+    )
+    return ClimateStore(df)
+
+
+def run(rows: int, workers: List[int], partitions: List[int], repeat: int) -> List[Dict]:
+    store = synthetic_store(rows)
+    shared_matrix_for(store)  # copia a memoria compartida fuera de la medición
+    results = []
+    for n_workers in workers:
+        with ProcessPoolExecutor(n_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            aggregate_climate(store, "rows", n_workers, executor=pool)  # arranque de workers
+            for n_parts in partitions:
+                samples = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    aggregate_climate(store, "rows", n_parts, executor=pool)
+                    samples.append(time.perf_counter() - start)
+                results.append({"workers": n_workers, "partitions": n_parts, "seconds": statistics.median(samples)})
+    start = time.perf_counter()
+    aggregate_climate(store, "rows", 1, parallel=False)
+    results.append({"workers": 0, "partitions": 1, "seconds": time.perf_counter() - start})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--partitions", type=int, nargs="+", default=[1, 2, 4, 8, 16, 64])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(f"{args.rows} filas × 6 métricas (workers=0: serial en el proceso actual)")
+    print(f"{'workers':>8}{'partitions':>12}{'seconds':>10}")
+    for row in run(args.rows, args.workers, args.partitions, args.repeat):
+        print(f"{row['workers']:>8}{row['partitions']:>12}{row['seconds']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
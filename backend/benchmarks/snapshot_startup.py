@@ -0,0 +1,53 @@
+"""Cold-start comparison: parsing the CSVs vs loading their columnar snapshots.
+
+    python -m backend.benchmarks.snapshot_startup --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from typing import Callable, Dict
+
+from .. import snapshot
+from ..config import CLIMATE_PATH, SOIL_PATH
+from ..data_loader import load_climate, load_soil, parse_climate_csv, parse_soil_csv
+
+
+def _median_seconds(fn: Callable[[], object], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def run(repeat: int = 5) -> Dict[str, Dict[str, float]]:
+    if not snapshot.snapshots_available():
+        raise SystemExit("Snapshots deshabilitados o pyarrow no instalado")
+    results: Dict[str, Dict[str, float]] = {}
+    for name, path, parse, loader in (
+        ("climate", CLIMATE_PATH, parse_climate_csv, load_climate.__wrapped__),
+        ("soil", SOIL_PATH, parse_soil_csv, load_soil.__wrapped__),
+    ):
+        loader()  # deja escrito un snapshot vigente
+        results[name] = {
+            "csv_s": _median_seconds(lambda: parse(path), repeat),
+            "snapshot_s": _median_seconds(loader, repeat),
+        }
+        results[name]["speedup"] = results[name]["csv_s"] / results[name]["snapshot_s"]
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(f"{'dataset':<10}{'csv (s)':>12}{'snapshot (s)':>15}{'speedup':>10}")
+    for name, row in run(args.repeat).items():
+        print(f"{name:<10}{row['csv_s']:>12.3f}{row['snapshot_s']:>15.3f}{row['speedup']:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
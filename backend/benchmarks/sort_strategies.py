@@ -0,0 +1,58 @@
+"""Sort strategies behind /algorithms/sort over climate series of growing size.
+
+    python -m backend.benchmarks.sort_strategies --metric TT --top 100
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from typing import Dict, List
+
+from ..data_loader import load_climate_store
+from ..sorting import sort_items
+
+
+def _median_seconds(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def run(metric: str = "TT", top: int = 100, repeat: int = 3) -> List[Dict]:
+    store = load_climate_store()
+    full = [
+        {"label": f"{s['year']}-{s['month']:02d}", "value": s["value"]}
+        for s in store.records(metric, 0, len(store))
+        if s["value"] is not None
+    ]
+    sizes = sorted({n for n in (200, 2_000, 20_000, len(full)) if n <= len(full)})
+    results = []
+    for n in sizes:
+        items = full[:n]
+        row = {"items": n}
+        for method in ("quicksort", "introsort", "numpy"):
+            row[method] = _median_seconds(lambda: sort_items(items, "value", method), repeat)
+        row[f"top{top}"] = _median_seconds(lambda: sort_items(items, "value", "auto", True, top), repeat)
+        results.append(row)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--metric", default="TT")
+    parser.add_argument("--top", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    rows = run(args.metric, args.top, args.repeat)
+    cols = list(rows[0])
+    print("".join(f"{c:>12}" for c in cols))
+    for row in rows:
+        print(f"{row['items']:>12}" + "".join(f"{row[c]:>12.4f}" for c in cols[1:]))
+
+
+if __name__ == "__main__":
+    main()
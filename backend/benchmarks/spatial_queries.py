@@ -0,0 +1,89 @@
+"""Soil sample spatial index vs brute-force scans (bbox, radius, k-nearest).
+
+    python -m backend.benchmarks.spatial_queries --samples 50000 500000 --queries 500
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from ..graph import haversine_matrix, smallest_k
+from ..spatial_index import SoilSpatialIndex
+from .synthetic import district_layout, soil_chunk
+
+
+def _mean_ms(fn: Callable[[int], object], queries: int) -> float:
+    start = time.perf_counter()
+    for i in range(queries):
+        fn(i)
+    return (time.perf_counter() - start) / queries * 1e3
+
+
+def run(samples: int, queries: int, districts: int = 28, seed: int = 0) -> List[Dict]:
+    rng = np.random.default_rng(seed)
+    d_lat, d_lon = district_layout(districts, rng)
+    df = soil_chunk(0, samples, districts, d_lat, d_lon, rng)
+    lat, lon = df["lat"].to_numpy(), df["lon"].to_numpy()
+
+    start = time.perf_counter()
+    index = SoilSpatialIndex(df)
+    build_ms = (time.perf_counter() - start) * 1e3
+    index.nearest(float(lat[0]), float(lon[0]), 1)  # construye el BallTree fuera de la medición
+
+    # Consultas alrededor de muestras reales: cajas de ~1-5 km, radios de 0.5-5 km
+    centers = rng.integers(0, samples, queries)
+    c_lat, c_lon = lat[centers], lon[centers]
+    half = rng.uniform(0.005, 0.025, queries)
+    radius = rng.uniform(0.5, 5, queries)
+
+    def bbox_index(i):
+        return index.bbox(c_lat[i] - half[i], c_lon[i] - half[i], c_lat[i] + half[i], c_lon[i] + half[i])
+
+    def bbox_scan(i):
+        lo_lat, hi_lat, lo_lon, hi_lon = c_lat[i] - half[i], c_lat[i] + half[i], c_lon[i] - half[i], c_lon[i] + half[i]
+        return np.flatnonzero((lat >= lo_lat) & (lat <= hi_lat) & (lon >= lo_lon) & (lon <= hi_lon))
+
+    def radius_scan(i):
+        dist = haversine_matrix([c_lat[i]], [c_lon[i]], lat, lon)[0]
+        return np.flatnonzero(dist <= radius[i])
+
+    def nearest_scan(i):
+        return smallest_k(haversine_matrix([c_lat[i]], [c_lon[i]], lat, lon)[0], 10)
+
+    return [
+        {"samples": samples, "query": "build", "index_ms": build_ms, "scan_ms": None},
+        {"samples": samples, "query": "bbox", "index_ms": _mean_ms(bbox_index, queries), "scan_ms": _mean_ms(bbox_scan, queries)},
+        {
+            "samples": samples,
+            "query": "radius",
+            "index_ms": _mean_ms(lambda i: index.radius(c_lat[i], c_lon[i], radius[i]), queries),
+            "scan_ms": _mean_ms(radius_scan, queries),
+        },
+        {
+            "samples": samples,
+            "query": "nearest k=10",
+            "index_ms": _mean_ms(lambda i: index.nearest(c_lat[i], c_lon[i], 10), queries),
+            "scan_ms": _mean_ms(nearest_scan, queries),
+        },
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, nargs="+", default=[50_000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--districts", type=int, default=28)
+    args = parser.parse_args()
+    print(f"{'samples':>9}  {'query':<14}{'index (ms)':>12}{'scan (ms)':>12}{'speedup':>10}")
+    for samples in args.samples:
+        for row in run(samples, args.queries, args.districts):
+            scan = row["scan_ms"]
+            extra = f"{scan:>12.3f}{scan / row['index_ms']:>9.1f}x" if scan is not None else ""
+            print(f"{row['samples']:>9}  {row['query']:<14}{row['index_ms']:>12.3f}{extra}")
+
+
+if __name__ == "__main__":
+    main()
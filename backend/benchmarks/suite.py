@@ -0,0 +1,346 @@
+"""End-to-end benchmark on synthetic data: loaders, graph, algorithms and endpoints.
+
+    python -m backend.benchmarks.suite --climate-scale 10 --soil-samples 500000 --districts 1000 \\
+        --report bench.json [--baseline previous.json]
+
+Writes a JSON report (one median per measured step) so runs can be compared; with
+``--baseline`` every step is compared to the previous report and slowdowns beyond
+``--threshold`` make the command exit with status 1.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .. import algorithms, data_loader, snapshot
+from ..climate_store import ClimateStore
+from ..config import FEATURE_WEIGHT, GEO_WEIGHT, K_NEIGHBORS
+from ..graph import (
+    build_zone_graph,
+    build_zone_graph_reference,
+    graph_from_matrices,
+    precompute_graph_matrices,
+    zone_graphs_match,
+)
+from .synthetic import CLIMATE_BASE_ROWS, write_climate_csv, write_soil_csv
+
+REPORT_FORMAT = 1
+# El constructor de referencia recorre pares con iterrows: se compara sobre los primeros distritos
+REFERENCE_MAX_NODES = 150
+# Cada endpoint nuevo de la API se agrega aquí (GET) o en POST_ENDPOINTS para que la suite lo cubra
+ENDPOINTS = [
+    "/datasets/summary",
+    "/soil/zones?limit=200",
+    "/climate/timeseries?metric=TT&limit=2000",
+    "/climate/timeseries?metric=TT&limit=2000&format=columnar",
+    "/climate/timeseries?metric=TT&points=500",
+    "/climate/timeseries?metric=RR&points=1000&downsample=minmax&resolution=day",
+    "/algorithms/divide-and-conquer?partitions=8",
+    "/algorithms/divide-and-conquer?scheme=month",
+    "/algorithms/sort?dataset=climate&metric=TT&limit=5000&method=auto",
+    "/algorithms/sort?dataset=soil&metric=soil_score&limit=200",
+    "/algorithms/kmeans?k=4",
+    "/algorithms/kmeans?k=4&level=sample",
+    "/algorithms/bellman-ford",
+    "/algorithms/bellman-ford?feature_weight=0.3&geo_weight=0.7",
+    "/soil/samples/export?format=ndjson&limit=5000",
+    "/soil/samples/export?format=csv&distrito=Distrito_0&distrito=Distrito_1",
+    "/soil/samples/bbox?min_lat=-12.2&min_lon=-75.35&max_lat=-11.95&max_lon=-75.05",
+    "/soil/samples/radius?lat=-12.07&lon=-75.2&radius_km=10",
+    "/soil/samples/nearest?lat=-12.07&lon=-75.2&k=100",
+    "/soil/cube?by=provincia,month&stats=mean,std",
+    "/soil/cube?by=cell",
+    "/climate/rolling?metric=TT&window=7d&limit=2000",
+    "/climate/rolling?metric=RR&window=30d&anomalies=true",
+    "/graph/analytics",
+    "/graph/distances?distritos=Distrito_0&distritos=Distrito_1",
+]
+
+
+def _ingest_body() -> Dict:
+    # Una lectura una hora después de la última cargada: cada llamada agrega una fila nueva
+    store = data_loader.load_climate_store()
+    stamp = pd.Timestamp(int(store.timestamps[-1]) + 3600, unit="s")
+    reading = {"UBIGEO": int(store.ubigeo[-1]), "YY": stamp.year, "MM": stamp.month, "DY": stamp.day, "HH": stamp.hour}
+    return {"rows": [{**reading, "TT": 12.5, "HR": 70.0, "RR": 0.0, "PP": 680.0, "FF": 2.0, "DD": 90.0}]}
+
+
+# Lote como el del dashboard del frontend
+BATCH_BODY = {
+    "operations": [
+        {"id": "zones", "op": "soil/zones", "params": {"limit": 50}},
+        {"id": "tt", "op": "climate/timeseries", "params": {"metric": "TT", "limit": 240}},
+        {"id": "sort", "op": "algorithms/sort", "params": {"dataset": "soil", "metric": "soil_score", "limit": 200}},
+        {"id": "kmeans", "op": "algorithms/kmeans", "params": {"k": 4}},
+        {"id": "route", "op": "algorithms/bellman-ford", "params": {}},
+        {"id": "dc", "op": "algorithms/divide-and-conquer", "params": {"partitions": 4}},
+    ]
+}
+# (url, cuerpo JSON): el cuerpo se arma en cada llamada (p.ej. lecturas nuevas para una ingesta).
+# La ingesta va última: cambia la versión del dataset e invalida los cachés de los demás
+POST_ENDPOINTS: List[Tuple[str, Callable[[], Dict]]] = [
+    ("/algorithms/batch", lambda: BATCH_BODY),
+    # Un perfil crudo y el promedio de un distrito contra todas las muestras (el recorrido más pesado)
+    (
+        "/soil/similar",
+        lambda: {"profiles": [{"pH": 6.5, "MO_pct": 3.2}], "distritos": ["Distrito_0"], "level": "sample", "k": 20},
+    ),
+    ("/climate/ingest", _ingest_body),
+]
+
+
+def clear_loader_caches() -> None:
+    data_loader.clear_caches()
+
+
+@contextmanager
+def synthetic_datasets(climate_path: Path, soil_path: Path, snapshot_dir: Path) -> Iterator[None]:
+    """Point the loaders (and snapshots) at the synthetic files for the duration of the block."""
+    saved = (data_loader.CLIMATE_PATH, data_loader.SOIL_PATH, snapshot.SNAPSHOT_DIR)
+    data_loader.CLIMATE_PATH, data_loader.SOIL_PATH, snapshot.SNAPSHOT_DIR = climate_path, soil_path, snapshot_dir
+    clear_loader_caches()
+    try:
+        yield
+    finally:
+        data_loader.CLIMATE_PATH, data_loader.SOIL_PATH, snapshot.SNAPSHOT_DIR = saved
+        clear_loader_caches()
+
+
+class Recorder:
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.results: List[Dict] = []
+
+    def measure(self, group: str, name: str, fn: Callable[[], object], repeat: Optional[int] = None) -> object:
+        samples = []
+        out = None
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            out = fn()
+            samples.append(time.perf_counter() - start)
+        self.results.append(
+            {
+                "group": group,
+                "name": name,
+                "median_s": statistics.median(samples),
+                "min_s": min(samples),
+                "samples": len(samples),
+            }
+        )
+        print(f"{group:<10}{name:<62}{statistics.median(samples):>10.4f}s", flush=True)
+        return out
+
+
+def _bench_loaders(rec: Recorder) -> None:
+    rec.measure("loader", "parse_climate_csv", lambda: data_loader.parse_climate_csv(data_loader.CLIMATE_PATH))
+    rec.measure("loader", "parse_soil_csv", lambda: data_loader.parse_soil_csv(data_loader.SOIL_PATH))
+    # Primera llamada: CSV + escritura del snapshot; las siguientes leen el snapshot
+    clear_loader_caches()
+    rec.measure("loader", "load_climate (cold)", data_loader.load_climate, repeat=1)
+    rec.measure("loader", "load_soil (cold)", data_loader.load_soil, repeat=1)
+    if snapshot.snapshots_available():
+        rec.measure("loader", "load_climate (snapshot)", data_loader.load_climate.__wrapped__)
+        rec.measure("loader", "load_soil (snapshot)", data_loader.load_soil.__wrapped__)
+    climate_df, _ = data_loader.load_climate()
+    rec.measure("loader", "load_climate_store", lambda: ClimateStore(climate_df))
+    rec.measure("loader", "load_soil_samples", data_loader.load_soil_samples.__wrapped__)
+
+
+def _bench_graph(rec: Recorder):
+    _, grouped, _ = data_loader.load_soil()
+    rec.measure("graph", "build_zone_graph", lambda: build_zone_graph(grouped, K_NEIGHBORS, FEATURE_WEIGHT, GEO_WEIGHT))
+    matrices = rec.measure("graph", "precompute_graph_matrices", lambda: precompute_graph_matrices(grouped), repeat=1)
+    graph = rec.measure(
+        "graph",
+        "graph_from_matrices",
+        lambda: graph_from_matrices(matrices, K_NEIGHBORS, FEATURE_WEIGHT, GEO_WEIGHT),
+    )
+    check_graph_builders(grouped, graph)
+    return graph
+
+
+def check_graph_builders(grouped: pd.DataFrame, graph) -> None:
+    """Dense, spatial, from-matrices and reference builders must give the same graph (up to the last ulp)."""
+    args = (K_NEIGHBORS, FEATURE_WEIGHT, GEO_WEIGHT)
+    dense = build_zone_graph(grouped, *args, method="dense")
+    checks = {
+        "spatial": (dense, build_zone_graph(grouped, *args, method="spatial")),
+        "graph_from_matrices": (dense, graph),
+    }
+    subset = grouped.head(REFERENCE_MAX_NODES)
+    checks["reference"] = (build_zone_graph(subset, *args, method="dense"), build_zone_graph_reference(subset, *args))
+    failed = [name for name, (a, b) in checks.items() if not zone_graphs_match(a, b)]
+    if failed:
+        raise SystemExit(f"Grafos distintos al denso/de referencia: {', '.join(failed)}")
+    print(f"graph     constructores coinciden (referencia sobre {len(subset)} distritos)", flush=True)
+
+
+def _bench_algorithms(rec: Recorder, graph) -> None:
+    store = data_loader.load_climate_store()
+    _, grouped, norm_meta = data_loader.load_soil()
+    samples, sample_meta = data_loader.load_soil_samples()
+
+    algorithms.run_divide_and_conquer(store, 4)  # arranque del pool de procesos fuera de la medición
+    for partitions, scheme in ((4, "rows"), (16, "rows"), (1, "year"), (1, "month")):
+        rec.measure(
+            "algorithm",
+            f"run_divide_and_conquer scheme={scheme} partitions={partitions}",
+            lambda: algorithms.run_divide_and_conquer(store, partitions, scheme),
+        )
+
+    values = store.metrics["TT"][:5000]
+    items = [{"label": str(i), "value": float(v)} for i, v in enumerate(values) if not np.isnan(v)]
+    for method in ("quicksort", "introsort", "numpy"):
+        rec.measure("algorithm", f"run_sort n={len(items)} method={method}", lambda: algorithms.run_sort(items, "value", method))
+    rec.measure("algorithm", f"run_sort n={len(items)} top=20", lambda: algorithms.run_sort(items, "value", "auto", top=20))
+
+    rec.measure("algorithm", f"run_kmeans district n={len(grouped)}", lambda: algorithms.run_kmeans(grouped, norm_meta, 4))
+    for mode in ("hamerly", "minibatch"):
+        rec.measure(
+            "algorithm",
+            f"run_kmeans sample n={len(samples)} mode={mode}",
+            lambda: algorithms.run_kmeans(samples, sample_meta, 4, mode=mode, list_members=False),
+        )
+
+    source = grouped.iloc[0].distrito
+    for method in ("dijkstra", "bellman-ford"):
+        rec.measure("algorithm", f"run_bellman_ford method={method}", lambda: algorithms.run_bellman_ford(graph, source, method))
+
+
+def _bench_endpoints(rec: Recorder) -> None:
+    from fastapi.testclient import TestClient
+
+    from ..main import app, result_cache
+
+    start = time.perf_counter()
+    with TestClient(app) as client:
+        # El arranque no bloquea: se mide hasta que la precarga en segundo plano termina
+        client.get("/ready", params={"wait": 600}).raise_for_status()
+        rec.results.append(
+            {"group": "endpoint", "name": "startup", "median_s": time.perf_counter() - start, "min_s": None, "samples": 1}
+        )
+        # Cada medición vacía antes el caché de resultados de /algorithms/*: mide el cálculo, no un acierto
+        # del LRU (los aciertos se reportan aparte como "(cached)")
+        for url in ENDPOINTS:
+            response = client.get(url)  # calienta caches (grafo por pesos, muestras) antes de medir
+            response.raise_for_status()
+            rec.measure("endpoint", f"GET {url}", lambda: _uncached(result_cache, lambda: client.get(url)))
+            if url.startswith("/algorithms/"):
+                rec.measure("endpoint", f"GET {url} (cached)", lambda: client.get(url).raise_for_status())
+        for url, body in POST_ENDPOINTS:
+            client.post(url, json=body()).raise_for_status()
+            rec.measure("endpoint", f"POST {url}", lambda: _uncached(result_cache, lambda: client.post(url, json=body())))
+
+
+def _uncached(result_cache, call: Callable) -> None:
+    result_cache.clear()
+    call().raise_for_status()
+
+
+def environment() -> Dict:
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "snapshots": snapshot.snapshots_available(),
+    }
+
+
+def compare(report: Dict, baseline: Dict, threshold: float) -> List[Dict]:
+    """Steps whose median grew more than `threshold` (e.g. 0.2 = 20 %) against the baseline."""
+    previous = {(r["group"], r["name"]): r["median_s"] for r in baseline.get("results", [])}
+    regressions = []
+    for row in report["results"]:
+        before = previous.get((row["group"], row["name"]))
+        if before:
+            ratio = row["median_s"] / before
+            if ratio > 1 + threshold:
+                regressions.append({**row, "baseline_s": before, "ratio": ratio})
+    return regressions
+
+
+def run(
+    climate_rows: int, soil_samples: int, districts: int, repeat: int, workdir: Path, endpoints: bool = True
+) -> Dict:
+    climate_path, soil_path = workdir / "climate.csv", workdir / "soil.csv"
+    start = time.perf_counter()
+    write_climate_csv(climate_path, climate_rows)
+    write_soil_csv(soil_path, soil_samples, districts)
+    print(f"Datos sintéticos generados en {time.perf_counter() - start:.1f}s ({workdir})", flush=True)
+
+    rec = Recorder(repeat)
+    with synthetic_datasets(climate_path, soil_path, workdir / "snapshots"):
+        _bench_loaders(rec)
+        graph = _bench_graph(rec)
+        _bench_algorithms(rec, graph)
+        if endpoints:
+            _bench_endpoints(rec)
+    return {
+        "format": REPORT_FORMAT,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "params": {
+            "climate_rows": climate_rows,
+            "soil_samples": soil_samples,
+            "districts": districts,
+            "repeat": repeat,
+        },
+        "environment": environment(),
+        "results": rec.results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--climate-scale", type=float, default=1.0, help=f"múltiplo de {CLIMATE_BASE_ROWS} filas")
+    parser.add_argument("--soil-samples", type=int, default=50_000)
+    parser.add_argument("--districts", type=int, default=28)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--report", type=Path, default=Path("benchmark_report.json"))
+    parser.add_argument("--baseline", type=Path, default=None, help="reporte anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=0.2, help="tolerancia de regresión (0.2 = 20 %%)")
+    parser.add_argument("--workdir", type=Path, default=None, help="directorio para los CSV (por defecto temporal)")
+    parser.add_argument("--skip-endpoints", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="agrofuturo-bench-") as tmp:
+        workdir = args.workdir or Path(tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        report = run(
+            int(CLIMATE_BASE_ROWS * args.climate_scale),
+            args.soil_samples,
+            args.districts,
+            args.repeat,
+            workdir,
+            endpoints=not args.skip_endpoints,
+        )
+    args.report.write_text(json.dumps(report, indent=2))
+    print(f"Reporte: {args.report}")
+
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("params") != report["params"]:
+            print(f"Aviso: la línea base usa otros parámetros ({baseline.get('params')})")
+        regressions = compare(report, baseline, args.threshold)
+        for row in regressions:
+            print(f"REGRESIÓN {row['group']}/{row['name']}: {row['baseline_s']:.4f}s -> {row['median_s']:.4f}s (x{row['ratio']:.2f})")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
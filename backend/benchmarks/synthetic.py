@@ -0,0 +1,132 @@
+"""Synthetic climate/soil CSVs with the same schemas as the real datasets, at any scale.
+
+    python -m backend.benchmarks.synthetic --out /tmp/agro --climate-rows 6000000 --soil-samples 500000 --districts 1000
+"""
+from __future__ import annotations
+
+import argparse
+import math
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+# Rango horario del dataset real (IGP, 2018-2024); con más filas se agregan estaciones
+CLIMATE_START = "2018-01-01"
+CLIMATE_END = "2024-12-31 23:00"
+CLIMATE_BASE_ROWS = len(pd.date_range(CLIMATE_START, CLIMATE_END, freq="h"))
+SOIL_BASE_SAMPLES = 50_000
+PROVINCIAS = ("Huancayo", "Concepcion", "Chupaca", "Jauja", "Tarma")
+# Centro aproximado del valle del Mantaro
+CENTER_LAT, CENTER_LON = -12.07, -75.2
+_CHUNK_ROWS = 500_000
+
+
+def climate_chunk(timestamps: pd.DatetimeIndex, ubigeo: int, rng: np.random.Generator) -> pd.DataFrame:
+    n = len(timestamps)
+    hours = timestamps.hour.to_numpy()
+    tt = 12 + 6 * np.sin((hours - 9) / 24 * 2 * np.pi) + rng.normal(0, 2, n)
+    frame = pd.DataFrame(
+        {
+            "ESTACION": f"EMA {ubigeo}",
+            "UBIGEO": ubigeo,
+            "YY": timestamps.year,
+            "MM": timestamps.month,
+            "DY": timestamps.day,
+            "HH": hours,
+            "TT": np.round(tt, 1),
+            "HR": np.round(rng.uniform(30, 95, n), 1),
+            "RR": np.round(np.maximum(0, rng.normal(-1, 1.5, n)), 1),
+            "PP": np.round(rng.normal(680, 2, n), 1),
+            "FF": np.round(rng.gamma(2, 1.5, n), 1),
+            "DD": rng.integers(0, 360, n),
+        }
+    )
+    # Huecos como en el dataset real (sensores sin lectura)
+    frame.loc[rng.random(n) < 0.003, "TT"] = np.nan
+    return frame
+
+
+def write_climate_csv(path: Path, rows: int, seed: int = 0) -> int:
+    """Write `rows` hourly readings; past the 2018-2024 range each extra station repeats it."""
+    rng = np.random.default_rng(seed)
+    hours = pd.date_range(CLIMATE_START, CLIMATE_END, freq="h")
+    stations = max(1, math.ceil(rows / len(hours)))
+    written = 0
+    with open(path, "w", newline="") as handle:
+        for station in range(stations):
+            remaining = min(len(hours), rows - written)
+            for lo in range(0, remaining, _CHUNK_ROWS):
+                chunk = climate_chunk(hours[lo : min(lo + _CHUNK_ROWS, remaining)], 120101 + station, rng)
+                chunk.to_csv(handle, index=False, header=written == 0)
+                written += len(chunk)
+    return written
+
+
+def district_layout(districts: int, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    # Distritos repartidos en ~1° alrededor del valle, como centros de muestreo
+    spread = 0.15 * max(1.0, math.sqrt(districts / 28))
+    return CENTER_LAT + rng.normal(0, spread, districts), CENTER_LON + rng.normal(0, spread, districts)
+
+
+def soil_chunk(
+    start: int, n: int, districts: int, d_lat: np.ndarray, d_lon: np.ndarray, rng: np.random.Generator
+) -> pd.DataFrame:
+    d = rng.integers(0, districts, n)
+    return pd.DataFrame(
+        {
+            "id_muestra": [f"M{i:08d}" for i in range(start, start + n)],
+            "provincia": np.array(PROVINCIAS)[d % len(PROVINCIAS)],
+            "distrito": np.char.add("Distrito_", d.astype(str)),
+            "lat": d_lat[d] + rng.normal(0, 0.01, n),
+            "lon": d_lon[d] + rng.normal(0, 0.01, n),
+            "fecha_muestra": (pd.Timestamp("2019-01-01") + pd.to_timedelta(rng.integers(0, 2000, n), unit="D")).strftime(
+                "%Y-%m-%d"
+            ),
+            "textura": rng.choice(["franco", "arcilloso", "arenoso"], n),
+            "arena_pct": rng.uniform(10, 70, n),
+            "limo_pct": rng.uniform(10, 50, n),
+            "arcilla_pct": rng.uniform(5, 40, n),
+            "MO_pct": rng.uniform(0.5, 6, n),
+            "pH": rng.normal(6.5, 0.6, n),
+            "CE_dS_m": rng.uniform(0.1, 2, n),
+            "densidad_aparente_g_cm3": rng.uniform(1, 1.6, n),
+            "CEC_cmol_kg": rng.uniform(5, 35, n),
+            "N_total_pct": rng.uniform(0.05, 0.4, n),
+            "P_disponible_mg_kg": rng.uniform(2, 60, n),
+            "K_intercambiable_mg_kg": rng.uniform(50, 400, n),
+            "pendiente_pct": rng.uniform(0, 40, n),
+            "profundidad_efectiva_cm": rng.uniform(20, 150, n),
+            "indice_calidad_suelo": rng.uniform(0, 1, n),
+            "cultivo_previo": rng.choice(["papa", "maiz", "quinua", "haba"], n),
+        }
+    )
+
+
+def write_soil_csv(path: Path, samples: int, districts: int, seed: int = 0) -> int:
+    rng = np.random.default_rng(seed)
+    d_lat, d_lon = district_layout(districts, rng)
+    with open(path, "w", newline="") as handle:
+        for lo in range(0, samples, _CHUNK_ROWS):
+            n = min(_CHUNK_ROWS, samples - lo)
+            soil_chunk(lo, n, districts, d_lat, d_lon, rng).to_csv(handle, index=False, header=lo == 0)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--climate-rows", type=int, default=CLIMATE_BASE_ROWS)
+    parser.add_argument("--soil-samples", type=int, default=SOIL_BASE_SAMPLES)
+    parser.add_argument("--districts", type=int, default=28)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    args.out.mkdir(parents=True, exist_ok=True)
+    write_climate_csv(args.out / "climate.csv", args.climate_rows, args.seed)
+    write_soil_csv(args.out / "soil.csv", args.soil_samples, args.districts, args.seed)
+    print(f"Escrito en {args.out}: climate.csv ({args.climate_rows} filas), soil.csv ({args.soil_samples} muestras)")
+
+
+if __name__ == "__main__":
+    main()
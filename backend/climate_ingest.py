@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel, Field
+
+from . import data_loader
+from .climate_store import ClimateStore, to_epoch_seconds
+from .config import CLIMATE_INGEST_MAX_ROWS, CLIMATE_INGEST_PERSIST
+
+# Columnas del CSV de la estación, en su orden (también las de la bitácora de ingesta)
+INGEST_COLUMNS = ["ESTACION", "UBIGEO", "YY", "MM", "DY", "HH", *data_loader.CLIMATE_NUMERIC_COLS]
+
+
+class ClimateReading(BaseModel):
+    """One hourly station reading, with the source CSV's column names."""
+
+    ESTACION: Optional[str] = None
+    UBIGEO: int
+    YY: int = Field(..., ge=1900, le=2100)
+    MM: int = Field(..., ge=1, le=12)
+    DY: int = Field(..., ge=1, le=31)
+    HH: int = Field(..., ge=0, le=23)
+    TT: Optional[float] = None
+    HR: Optional[float] = None
+    RR: Optional[float] = None
+    PP: Optional[float] = None
+    FF: Optional[float] = None
+    DD: Optional[float] = None
+
+
+class ClimateBatch(BaseModel):
+    rows: List[ClimateReading] = Field(..., min_length=1, max_length=CLIMATE_INGEST_MAX_ROWS)
+
+
+# Una ingesta a la vez: cada una parte del store vigente y publica el siguiente
+_lock = threading.Lock()
+
+
+def _in_store(store: ClimateStore, ts: np.ndarray, ubigeo: np.ndarray) -> np.ndarray:
+    """Rows whose (timestamp, ubigeo) already exists in the store (binary search per row)."""
+    lo = np.searchsorted(store.timestamps, ts, side="left")
+    hi = np.searchsorted(store.timestamps, ts, side="right")
+    found = np.zeros(len(ts), dtype=bool)
+    for i in np.flatnonzero(hi > lo):  # sólo filas con la misma hora ya cargada (backfill)
+        found[i] = bool(np.any(store.ubigeo[lo[i] : hi[i]] == ubigeo[i]))
+    return found
+
+
+def ingest_rows(rows: List[Dict]) -> Dict:
+    """Validate and append readings without re-reading or regrouping the loaded history.
+
+    Rows with an impossible date, or whose (UBIGEO, hour) is already loaded or repeated
+    in the batch, are rejected. Accepted rows go to the append-only log (if enabled),
+    then the store is extended and only the batch is rolled up and merged into the
+    hour/day/week/month tiers; `monthly` is rebuilt from the month tier's partial sums
+    and the rolling-window totals are recomputed from the first new row on.
+    Publishing bumps the dataset version, so ETags and result caches miss (in shared
+    mode it publishes a new shared version that every worker adopts).
+    """
+    raw = pd.DataFrame(rows, columns=INGEST_COLUMNS)
+    cleaned = data_loader.clean_climate_frame(raw.copy())
+    rejected = {int(i): "fecha/hora inválida" for i in raw.index.difference(cleaned.index)}
+
+    # Con workers compartidos el lock es entre procesos y se parte de la última versión publicada
+    with _lock, data_loader.shared_writer():
+        store = data_loader.load_climate_store()
+        rollups = data_loader.load_climate_rollups()
+        rolling = data_loader.load_climate_rolling()
+        repeated = cleaned.duplicated(subset=["UBIGEO", "datetime"], keep="first").to_numpy()
+        loaded = _in_store(store, to_epoch_seconds(cleaned["datetime"]), cleaned["UBIGEO"].to_numpy())
+        for i in cleaned.index[repeated]:
+            rejected[int(i)] = "repetida en el lote"
+        for i in cleaned.index[loaded & ~repeated]:
+            rejected[int(i)] = "ya existe (UBIGEO y hora)"
+        accepted = cleaned[~(repeated | loaded)]
+
+        if len(accepted):
+            if CLIMATE_INGEST_PERSIST:
+                version = data_loader.append_ingest_log(raw.loc[accepted.index])
+            else:
+                version = f"{time.time_ns():x}"
+            batch = ClimateStore(accepted)
+            store = store.extend(batch)
+            data_loader.publish_climate(store, rollups.extend(batch), rolling.extend(store, batch), version)
+
+    return {
+        "received": len(raw),
+        "accepted": int(len(accepted)),
+        "rejected": [{"row": i, "reason": reason} for i, reason in sorted(rejected.items())],
+        "rows": int(len(store)),
+        "version": data_loader.dataset_version(),
+    }
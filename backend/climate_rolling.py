@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .climate_store import ClimateStore, nan_to_none
+from .config import ANOMALY_MIN_COUNT, ANOMALY_Z, FROST_TEMP_C, HEAVY_RAIN_MM_H
+
+ROLLING_METRICS = ["TT", "HR", "RR", "FF"]
+# Ventanas móviles (hacia atrás, incluyen la lectura actual): nombre -> segundos
+ROLLING_WINDOWS = {"24h": 86400, "7d": 7 * 86400, "30d": 30 * 86400}
+# Desvíos menores a esta fracción del desvío global de la métrica se toman como 0:
+# la diferencia de dos totales acumulados no distingue una ventana constante de ruido
+ROLLING_STD_TOL = 1e-3
+
+
+@dataclass
+class RunningTotals:
+    """Running count/sum/sum² of one metric (values minus ``shift``, NaNs skipped): entry i covers rows [0, i)."""
+
+    shift: float
+    count: np.ndarray
+    total: np.ndarray
+    sumsq: np.ndarray
+    std_floor: float
+
+    def extend(self, values: np.ndarray, pos: int) -> "RunningTotals":
+        """Totals for ``values`` (the whole new column) reusing the entries up to row ``pos``."""
+        valid = ~np.isnan(values[pos:])
+        centered = np.where(valid, values[pos:] - self.shift, 0.0)
+        return RunningTotals(
+            self.shift,
+            _accumulate(self.count[: pos + 1], valid.astype(np.int64)),
+            _accumulate(self.total[: pos + 1], centered),
+            _accumulate(self.sumsq[: pos + 1], centered * centered),
+            self.std_floor,
+        )
+
+
+def _accumulate(head: np.ndarray, values: np.ndarray) -> np.ndarray:
+    # Cada fila nueva suma O(1) al último total
+    return np.concatenate([head, head[-1] + np.cumsum(values)])
+
+
+def _totals(values: np.ndarray) -> RunningTotals:
+    valid = ~np.isnan(values)
+    shift = float(values[valid].mean()) if valid.any() else 0.0
+    std = float(values[valid].std()) if valid.any() else 0.0
+    empty = RunningTotals(shift, np.zeros(1, dtype=np.int64), np.zeros(1), np.zeros(1), ROLLING_STD_TOL * std)
+    return empty.extend(values, 0)
+
+
+def _counts(head: np.ndarray, flags: np.ndarray) -> np.ndarray:
+    return _accumulate(head, flags.astype(np.int64))
+
+
+class ClimateRolling:
+    """Trailing-window statistics over the time-sorted climate store.
+
+    Per metric it keeps running totals of count/sum/sum² and, per standard window,
+    the row where each row's window starts (binary search on the timestamps): the
+    mean/std of any row over any window are two lookups, O(1) per row, and the
+    frost hours (TT <= FROST_TEMP_C) and heavy-rain hours (RR >= HEAVY_RAIN_MM_H) are
+    running counts too. A reading is an anomaly when it is at least ``z`` standard
+    deviations from the mean of the previous readings of its window (at least
+    ANOMALY_MIN_COUNT of them). `extend` recomputes only from the first new row
+    (O(batch) for appended readings, O(rows after it) for a backfill) into new
+    arrays, like `ClimateStore.extend`, so readers of the previous state are unaffected.
+    """
+
+    def __init__(
+        self,
+        store: ClimateStore,
+        metrics: Sequence[str] = ROLLING_METRICS,
+        windows: Optional[Dict[str, int]] = None,
+    ):
+        self.metrics = [m for m in metrics if store.has_metric(m)]
+        self.windows = dict(windows or ROLLING_WINDOWS)
+        self.store = store
+        self.totals = {m: _totals(store.metrics[m]) for m in self.metrics}
+        self.starts = {name: self._window_starts(seconds, 0) for name, seconds in self.windows.items()}
+        self.events = {
+            name: _counts(np.zeros(1, dtype=np.int64), flags) for name, flags in self._event_flags(0).items()
+        }
+
+    def _window_starts(self, seconds: int, pos: int) -> np.ndarray:
+        ts = self.store.timestamps
+        return np.searchsorted(ts, ts[pos:] - seconds, side="right")
+
+    def _event_flags(self, pos: int) -> Dict[str, np.ndarray]:
+        flags = {}
+        with np.errstate(invalid="ignore"):
+            if self.store.has_metric("TT"):
+                flags["frost_hours"] = self.store.metrics["TT"][pos:] <= FROST_TEMP_C
+            if self.store.has_metric("RR"):
+                flags["heavy_rain_hours"] = self.store.metrics["RR"][pos:] >= HEAVY_RAIN_MM_H
+        return flags
+
+    def extend(self, store: ClimateStore, batch: ClimateStore) -> "ClimateRolling":
+        """Rolling state for ``store`` = this store extended with ``batch`` (see `ClimateStore.extend`)."""
+        if not len(batch):
+            return self
+        # Primera fila que cambia: filas anteriores conservan totales y ventanas
+        pos = int(np.searchsorted(self.store.timestamps, batch.timestamps[0], side="right"))
+        out = ClimateRolling.__new__(ClimateRolling)
+        out.metrics, out.windows, out.store = self.metrics, self.windows, store
+        out.totals = {m: totals.extend(store.metrics[m], pos) for m, totals in self.totals.items()}
+        out.starts = {
+            name: np.concatenate([self.starts[name][:pos], out._window_starts(seconds, pos)])
+            for name, seconds in self.windows.items()
+        }
+        out.events = {
+            name: _counts(self.events[name][: pos + 1], flags) for name, flags in out._event_flags(pos).items()
+        }
+        return out
+
+    def has_metric(self, metric: str) -> bool:
+        return metric in self.metrics
+
+    def stats(
+        self, metric: str, window: str, rows: np.ndarray, include_current: bool = True
+    ) -> Dict[str, np.ndarray]:
+        """count/mean/std of ``metric`` over each row's window (optionally without the row itself)."""
+        totals = self.totals[metric]
+        starts = self.starts[window][rows]
+        ends = rows + 1 if include_current else rows
+        n = totals.count[ends] - totals.count[starts]
+        total = totals.total[ends] - totals.total[starts]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_c = np.where(n > 0, total / n, np.nan)
+            sumsq = totals.sumsq[ends] - totals.sumsq[starts]
+            var = np.where(n > 1, np.maximum((sumsq - total * mean_c) / (n - 1), 0.0), np.nan)
+        std = np.sqrt(var)
+        std[std < totals.std_floor] = 0.0
+        return {"count": n, "mean": mean_c + totals.shift, "std": std}
+
+    def anomalies(self, metric: str, window: str, rows: np.ndarray, z: float = ANOMALY_Z) -> Dict[str, np.ndarray]:
+        """z-score of each reading against the previous readings of its window, and the flag ``|z| >= z``."""
+        values = self.store.metrics[metric][rows]
+        prev = self.stats(metric, window, rows, include_current=False)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scored = (prev["count"] >= ANOMALY_MIN_COUNT) & (prev["std"] > 0)
+            scores = np.where(scored, (values - prev["mean"]) / prev["std"], np.nan)
+        return {"z": scores, "anomaly": np.abs(scores) >= z}
+
+    def series(
+        self,
+        metric: str,
+        window: str,
+        lo: int,
+        hi: int,
+        z: float = ANOMALY_Z,
+        only_anomalies: bool = False,
+        limit: Optional[int] = None,
+    ) -> Dict[str, List]:
+        """Columns timestamp/value/count/mean/std/z/anomaly (+ event counts) for rows [lo, hi).
+
+        With ``only_anomalies`` the whole range is scored and only flagged rows are kept.
+        """
+        if only_anomalies:
+            rows = np.arange(lo, hi)
+            rows = rows[self.anomalies(metric, window, rows, z)["anomaly"]]
+        else:
+            rows = np.arange(lo, hi if limit is None else min(hi, lo + limit))
+        rows = rows[:limit] if limit is not None else rows
+        stats = self.stats(metric, window, rows)
+        scores = self.anomalies(metric, window, rows, z)
+        out = {
+            "timestamp": self.store.timestamps[rows].tolist(),
+            "value": nan_to_none(self.store.metrics[metric][rows]),
+            "count": stats["count"].tolist(),
+            "mean": nan_to_none(stats["mean"]),
+            "std": nan_to_none(stats["std"]),
+            "z": nan_to_none(scores["z"]),
+            "anomaly": scores["anomaly"].tolist(),
+        }
+        starts = self.starts[window][rows]
+        for name, counts in self.events.items():
+            out[name] = (counts[rows + 1] - counts[starts]).tolist()
+        return out
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .climate_store import ClimateStore, nan_to_none
+
+ROLLUP_METRICS = ["TT", "HR", "RR", "PP", "FF", "DD"]
+RESOLUTIONS = ("hour", "day", "week", "month")
+DOWNSAMPLE_MODES = ("lttb", "minmax")
+# Se usa el nivel más fino con a lo sumo points × ROLLUP_OVERSAMPLE buckets en el rango:
+# el costo de una consulta depende de `points`, no del largo del rango
+ROLLUP_OVERSAMPLE = 8
+
+_HOUR, _DAY, _WEEK = 3600, 86400, 7 * 86400
+_MONDAY = 4 * _DAY  # 1970-01-05 fue lunes: las semanas empiezan en lunes (UTC)
+
+
+def _hour_key(ts: np.ndarray) -> np.ndarray:
+    return ts // _HOUR
+
+
+def _day_key(ts: np.ndarray) -> np.ndarray:
+    return ts // _DAY
+
+
+def _week_key(ts: np.ndarray) -> np.ndarray:
+    return (ts - _MONDAY) // _WEEK
+
+
+def _month_key(ts: np.ndarray) -> np.ndarray:
+    # Meses desde 1970-01
+    return ts.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+
+
+_KEY_FNS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "hour": _hour_key,
+    "day": _day_key,
+    "week": _week_key,
+    "month": _month_key,
+}
+
+
+def _key_start(resolution: str, keys: np.ndarray) -> np.ndarray:
+    """Epoch seconds at which each bucket key starts."""
+    if resolution == "hour":
+        return keys * _HOUR
+    if resolution == "day":
+        return keys * _DAY
+    if resolution == "week":
+        return keys * _WEEK + _MONDAY
+    return keys.astype("datetime64[M]").astype("datetime64[s]").astype(np.int64)
+
+
+@dataclass
+class RollupTier:
+    """One resolution: per bucket start, count/sum/min/max of every metric (NaNs skipped)."""
+
+    resolution: str
+    keys: np.ndarray
+    timestamps: np.ndarray
+    count: Dict[str, np.ndarray]
+    total: Dict[str, np.ndarray]
+    min: Dict[str, np.ndarray]
+    max: Dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def mean(self, metric: str, lo: int = 0, hi: Optional[int] = None) -> np.ndarray:
+        count = self.count[metric][lo:hi]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, self.total[metric][lo:hi] / count, np.nan)
+
+    def range_for(self, start: Optional[int] = None, end: Optional[int] = None) -> Tuple[int, int]:
+        """Buckets whose period contains any instant of [start, end]."""
+        key_fn = _KEY_FNS[self.resolution]
+        lo = 0 if start is None else int(np.searchsorted(self.keys, key_fn(np.int64(start)), side="left"))
+        hi = len(self) if end is None else int(np.searchsorted(self.keys, key_fn(np.int64(end)), side="right"))
+        return lo, max(lo, hi)
+
+
+def _group(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(group start offsets, group keys) of a non-decreasing key array."""
+    if not len(keys):
+        return np.empty(0, dtype=np.int64), keys
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(keys)) + 1])
+    return starts, keys[starts]
+
+
+def _tier_from_rows(store: ClimateStore, metrics: Sequence[str]) -> RollupTier:
+    keys = _hour_key(store.timestamps)
+    starts, group_keys = _group(keys)
+    count, total, mins, maxs = {}, {}, {}, {}
+    for metric in metrics:
+        values = store.metrics[metric]
+        valid = ~np.isnan(values)
+        if len(starts):
+            count[metric] = np.add.reduceat(valid.astype(np.int64), starts)
+            total[metric] = np.add.reduceat(np.where(valid, values, 0.0), starts)
+            mins[metric] = np.fmin.reduceat(values, starts)
+            maxs[metric] = np.fmax.reduceat(values, starts)
+        else:
+            count[metric], total[metric] = np.empty(0, dtype=np.int64), np.empty(0)
+            mins[metric], maxs[metric] = np.empty(0), np.empty(0)
+    return RollupTier("hour", group_keys, _key_start("hour", group_keys), count, total, mins, maxs)
+
+
+def _coarsen(tier: RollupTier, resolution: str) -> RollupTier:
+    """Roll a finer tier up (sums of sums, min of mins): exact, no pass over the raw rows."""
+    starts, group_keys = _group(_KEY_FNS[resolution](tier.timestamps))
+    reduce = lambda ufunc, arr: ufunc.reduceat(arr, starts) if len(starts) else arr[:0]  # noqa: E731
+    return RollupTier(
+        resolution,
+        group_keys,
+        _key_start(resolution, group_keys),
+        {m: reduce(np.add, v) for m, v in tier.count.items()},
+        {m: reduce(np.add, v) for m, v in tier.total.items()},
+        {m: reduce(np.fmin, v) for m, v in tier.min.items()},
+        {m: reduce(np.fmax, v) for m, v in tier.max.items()},
+    )
+
+
+def _merge_tiers(a: RollupTier, b: RollupTier) -> RollupTier:
+    """Bucket-wise merge of two tiers of one resolution (counts/sums add, min/max combine)."""
+    if not len(b):
+        return a
+    if not len(a) or b.keys[0] > a.keys[-1]:
+        # Caso habitual (datos nuevos posteriores): se agregan cubetas al final
+        join = lambda x, y: np.concatenate([x, y])  # noqa: E731
+        return RollupTier(
+            a.resolution,
+            join(a.keys, b.keys),
+            join(a.timestamps, b.timestamps),
+            {m: join(a.count[m], b.count[m]) for m in a.count},
+            {m: join(a.total[m], b.total[m]) for m in a.total},
+            {m: join(a.min[m], b.min[m]) for m in a.min},
+            {m: join(a.max[m], b.max[m]) for m in a.max},
+        )
+    keys = np.union1d(a.keys, b.keys)
+    ia, ib = np.searchsorted(keys, a.keys), np.searchsorted(keys, b.keys)
+
+    def merge(x: np.ndarray, y: np.ndarray, ufunc, empty) -> np.ndarray:
+        out = np.full(len(keys), empty, dtype=x.dtype)
+        out[ia] = x
+        out[ib] = ufunc(out[ib], y)
+        return out
+
+    return RollupTier(
+        a.resolution,
+        keys,
+        _key_start(a.resolution, keys),
+        {m: merge(a.count[m], b.count[m], np.add, 0) for m in a.count},
+        {m: merge(a.total[m], b.total[m], np.add, 0.0) for m in a.total},
+        {m: merge(a.min[m], b.min[m], np.fmin, np.nan) for m in a.min},
+        {m: merge(a.max[m], b.max[m], np.fmax, np.nan) for m in a.max},
+    )
+
+
+def _tiers_from_hours(hour: RollupTier) -> Dict[str, RollupTier]:
+    day = _coarsen(hour, "day")
+    # Semanas y meses desde días: un día nunca cruza una semana ni un mes
+    return {"hour": hour, "day": day, "week": _coarsen(day, "week"), "month": _coarsen(day, "month")}
+
+
+class ClimateRollups:
+    """Hour -> day -> week/month tiers of every climate metric, built once per store."""
+
+    def __init__(self, store: ClimateStore, metrics: Sequence[str] = ROLLUP_METRICS):
+        self.metrics = [m for m in metrics if store.has_metric(m)]
+        self.tiers: Dict[str, RollupTier] = _tiers_from_hours(_tier_from_rows(store, self.metrics))
+
+    def extend(self, batch: ClimateStore) -> "ClimateRollups":
+        """New rollups with the rows of `batch` added; only the batch is grouped, then merged per tier."""
+        added = _tiers_from_hours(_tier_from_rows(batch, self.metrics))
+        out = ClimateRollups.__new__(ClimateRollups)
+        out.metrics = self.metrics
+        out.tiers = {res: _merge_tiers(tier, added[res]) for res, tier in self.tiers.items()}
+        return out
+
+    def has_metric(self, metric: str) -> bool:
+        return metric in self.metrics
+
+    def choose(self, points: int, start: Optional[int] = None, end: Optional[int] = None) -> str:
+        """Finest tier with at most points × ROLLUP_OVERSAMPLE buckets in range (else the coarsest)."""
+        for resolution in RESOLUTIONS:
+            lo, hi = self.tiers[resolution].range_for(start, end)
+            if hi - lo <= points * ROLLUP_OVERSAMPLE:
+                return resolution
+        return RESOLUTIONS[-1]
+
+    def series(
+        self,
+        metric: str,
+        points: Optional[int] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        resolution: Optional[str] = None,
+        downsample: str = "lttb",
+        limit: Optional[int] = None,
+    ) -> Tuple[str, Dict[str, List]]:
+        """(resolution used, columns timestamp/value/min/max/count) for a metric over [start, end].
+
+        With `points`, the tier is picked automatically (unless `resolution` is given) and
+        reduced to at most `points` rows with LTTB or min/max buckets.
+        """
+        if resolution is None:
+            resolution = self.choose(points or limit or 1, start, end)
+        tier = self.tiers[resolution]
+        lo, hi = tier.range_for(start, end)
+        if points is None and limit is not None:
+            hi = min(hi, lo + limit)
+        ts = tier.timestamps[lo:hi]
+        mean = tier.mean(metric, lo, hi)
+        mins, maxs = tier.min[metric][lo:hi], tier.max[metric][lo:hi]
+        count = tier.count[metric][lo:hi]
+        keep = np.flatnonzero(count > 0)  # buckets sin datos no se dibujan
+        if points is not None and len(keep) > points and downsample == "minmax":
+            picks, value = minmax_indices(ts[keep], mins[keep], maxs[keep], points)
+            keep = keep[picks]
+        else:
+            if points is not None and len(keep) > points:
+                keep = keep[lttb_indices(ts[keep].astype(float), mean[keep], points)]
+            value = mean[keep]
+        return resolution, {
+            "timestamp": ts[keep].tolist(),
+            "value": nan_to_none(np.asarray(value, dtype=float)),
+            "min": nan_to_none(mins[keep]),
+            "max": nan_to_none(maxs[keep]),
+            "count": count[keep].tolist(),
+        }
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `points` samples that keep the visual shape."""
+    n = len(x)
+    if points >= n:
+        return np.arange(n)
+    if points < 3:
+        return np.array([0, n - 1][:points], dtype=np.int64)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)  # cubetas internas; extremos fijos
+    # Promedio de cada cubeta (y del último punto), usado como tercer vértice del triángulo
+    bounds = np.append(edges, n)
+    sizes = np.diff(bounds)
+    avg_x = (np.add.reduceat(x, bounds[:-1]) / sizes).tolist()
+    avg_y = (np.add.reduceat(y, bounds[:-1]) / sizes).tolist()
+    out = np.empty(points, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    prev = 0
+    for b in range(points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        px, py, nx, ny = x[prev], y[prev], avg_x[b + 1], avg_y[b + 1]
+        area = np.abs((px - nx) * (y[lo:hi] - py) - (px - x[lo:hi]) * (ny - py))
+        prev = lo + int(area.argmax())
+        out[b + 1] = prev
+    return out
+
+
+def minmax_indices(ts: np.ndarray, mins: np.ndarray, maxs: np.ndarray, points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Per bucket of rows, the row holding the minimum and the one holding the maximum, in time order.
+
+    Returns (row indices, value per index: the min or max that was kept).
+    """
+    n = len(ts)
+    buckets = max(1, points // 2)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    starts = edges[:-1][edges[:-1] < edges[1:]]
+    # Índice del mínimo/máximo dentro de cada cubeta, vectorizado con reduceat + comparación
+    bucket_of = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    min_val = np.minimum.reduceat(mins, starts)
+    max_val = np.maximum.reduceat(maxs, starts)
+    rows = np.arange(n)
+    min_idx = np.minimum.reduceat(np.where(mins == min_val[bucket_of], rows, n), starts)
+    max_idx = np.minimum.reduceat(np.where(maxs == max_val[bucket_of], rows, n), starts)
+    idx = np.concatenate([min_idx, max_idx])
+    values = np.concatenate([min_val, max_val])
+    order = np.lexsort((values, idx))
+    idx, values = idx[order], values[order]
+    # Si mínimo y máximo caen en la misma fila se emite una vez (con el mínimo; el máximo queda en `max`)
+    first = np.concatenate([[True], idx[1:] != idx[:-1]])
+    return idx[first], values[first]
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Métricas del dataset de clima; year/month/UBIGEO ya tienen sus propios arreglos
+CLIMATE_NUMERIC_COLS = ["TT", "HR", "RR", "PP", "FF", "DD"]
+
+
+def to_epoch_seconds(values: pd.Series) -> np.ndarray:
+    """UTC datetimes -> int64 epoch seconds, independent of the datetime64 unit."""
+    return ((values - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64)
+
+
+def nan_to_none(values: np.ndarray) -> List:
+    """Float array -> list of Python floats with NaN as None (JSON-safe)."""
+    out = values.astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
+
+
+class ClimateStore:
+    """Time-sorted, column-oriented view of the climate frame.
+
+    Built once per dataset: every metric column (CLIMATE_NUMERIC_COLS) becomes a contiguous NumPy array
+    in chronological order, with a year -> (start, end) offset index and binary
+    search for arbitrary [from, to] ranges, so a request is a slice.
+    """
+
+    def __init__(self, climate_df: pd.DataFrame):
+        df = climate_df.sort_values("datetime", kind="stable")
+        self.timestamps = to_epoch_seconds(df["datetime"])
+        self.year = df["year"].to_numpy(dtype=np.int64)
+        self.month = df["month"].to_numpy(dtype=np.int64)
+        self.ubigeo = df["UBIGEO"].to_numpy()
+        self.metrics: Dict[str, np.ndarray] = {
+            col: np.ascontiguousarray(df[col].to_numpy(dtype=float))
+            for col in CLIMATE_NUMERIC_COLS
+            if col in df.columns
+        }
+        self.year_index: Dict[int, Tuple[int, int]] = self._index_years(np.unique(self.year))
+
+    @classmethod
+    def from_arrays(
+        cls,
+        timestamps: np.ndarray,
+        year: np.ndarray,
+        month: np.ndarray,
+        ubigeo: np.ndarray,
+        metrics: Dict[str, np.ndarray],
+    ) -> "ClimateStore":
+        """Store over arrays already in time order (e.g. memory-mapped), used as they are: no sort, no copy."""
+        out = cls.__new__(cls)
+        out.timestamps, out.year, out.month, out.ubigeo, out.metrics = timestamps, year, month, ubigeo, metrics
+        out.year_index = out._index_years(np.unique(year))
+        return out
+
+    def _index_years(self, years: np.ndarray) -> Dict[int, Tuple[int, int]]:
+        # `year` está ordenado (filas por tiempo): cada año es un rango contiguo
+        starts = np.searchsorted(self.year, years, side="left")
+        ends = np.searchsorted(self.year, years, side="right")
+        return {int(y): (int(s), int(e)) for y, s, e in zip(years, starts, ends) if e > s}
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def extend(self, other: "ClimateStore") -> "ClimateStore":
+        """New store with the rows of `other` merged in time order; `self` is left untouched.
+
+        Rows later than the current end (the usual case) are appended; older ones are
+        inserted after any row with the same timestamp. Metrics missing from `other`
+        are NaN. The year index is rebuilt with one binary search per year.
+        """
+        if not len(other):
+            return self
+        if not len(self) or other.timestamps[0] >= self.timestamps[-1]:
+            join = lambda old, new: np.concatenate([old, new])  # noqa: E731
+        else:
+            pos = np.searchsorted(self.timestamps, other.timestamps, side="right")
+            join = lambda old, new: np.insert(old, pos, new)  # noqa: E731
+        out = ClimateStore.__new__(ClimateStore)
+        out.timestamps = join(self.timestamps, other.timestamps)
+        out.year = join(self.year, other.year)
+        out.month = join(self.month, other.month)
+        out.ubigeo = join(self.ubigeo, other.ubigeo.astype(self.ubigeo.dtype))
+        out.metrics = {
+            col: join(values, other.metrics.get(col, np.full(len(other), np.nan)))
+            for col, values in self.metrics.items()
+        }
+        out.year_index = out._index_years(np.union1d(list(self.year_index), other.year))
+        return out
+
+    def has_metric(self, metric: str) -> bool:
+        return metric in self.metrics
+
+    def year_range(self, year: int) -> Tuple[int, int]:
+        return self.year_index.get(int(year), (0, 0))
+
+    def time_range(self, start: Optional[int] = None, end: Optional[int] = None) -> Tuple[int, int]:
+        """Row offsets for epoch seconds in [start, end] (both inclusive, either open)."""
+        lo = 0 if start is None else int(np.searchsorted(self.timestamps, start, side="left"))
+        hi = len(self) if end is None else int(np.searchsorted(self.timestamps, end, side="right"))
+        return lo, max(lo, hi)
+
+    def range_for(
+        self, year: Optional[int] = None, start: Optional[int] = None, end: Optional[int] = None
+    ) -> Tuple[int, int]:
+        lo, hi = self.time_range(start, end)
+        if year:
+            y_lo, y_hi = self.year_range(year)
+            lo, hi = max(lo, y_lo), min(hi, y_hi)
+        return lo, max(lo, hi)
+
+    def records(self, metric: str, lo: int, hi: int) -> List[Dict]:
+        """Rows [lo, hi) in the `/climate/timeseries` item shape."""
+        return [
+            {"timestamp": ts, "value": value, "ubigeo": ubigeo, "year": year, "month": month}
+            for ts, value, ubigeo, year, month in zip(
+                self.timestamps[lo:hi].tolist(),
+                nan_to_none(self.metrics[metric][lo:hi]),
+                self.ubigeo[lo:hi].tolist(),
+                self.year[lo:hi].tolist(),
+                self.month[lo:hi].tolist(),
+            )
+        ]
+
+    def columns(self, metric: str, lo: int, hi: int) -> Dict[str, List]:
+        """Rows [lo, hi) as one list per field (columnar `/climate/timeseries`)."""
+        return {
+            "timestamp": self.timestamps[lo:hi].tolist(),
+            "value": nan_to_none(self.metrics[metric][lo:hi]),
+            "ubigeo": self.ubigeo[lo:hi].tolist(),
+            "year": self.year[lo:hi].tolist(),
+            "month": self.month[lo:hi].tolist(),
+        }
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+from .config import KMEANS_CHUNK_ROWS
+
+KMEANS_MODES = ("auto", "lloyd", "hamerly", "minibatch")
+# auto: Lloyd para pocos puntos, Hamerly hasta HAMERLY_MAX_POINTS, mini-batch por encima
+LLOYD_MAX_POINTS = 5_000
+HAMERLY_MAX_POINTS = 250_000
+
+
+@dataclass
+class KMeansResult:
+    centroids: np.ndarray
+    labels: np.ndarray
+    iterations: int
+    inertia: float
+    converged: bool
+    mode: str
+
+
+def _pairwise_sq(data: np.ndarray, centroids: np.ndarray, data_sq: Optional[np.ndarray] = None) -> np.ndarray:
+    """Squared distances (rows × k) via |x|² - 2x·c + |c|², without the n×k×d tensor."""
+    data_sq = (data * data).sum(axis=1) if data_sq is None else data_sq
+    d2 = data_sq[:, None] - 2.0 * data @ centroids.T + (centroids * centroids).sum(axis=1)[None, :]
+    return np.maximum(d2, 0.0, out=d2)
+
+
+def assign(data: np.ndarray, centroids: np.ndarray, chunk_rows: int = KMEANS_CHUNK_ROWS, second: bool = False):
+    """Nearest centroid per row in row chunks (memory O(chunk_rows × k)).
+
+    Returns (labels, best distance) and, with ``second=True``, also the distance
+    to the second-closest centroid (Hamerly lower bound).
+    """
+    n, k = len(data), len(centroids)
+    labels = np.empty(n, dtype=np.int64)
+    best = np.empty(n)
+    runner_up = np.empty(n) if second else None
+    for start in range(0, n, chunk_rows):
+        d2 = _pairwise_sq(data[start : start + chunk_rows], centroids)
+        idx = np.argmin(d2, axis=1)
+        rows = np.arange(len(idx))
+        labels[start : start + len(idx)] = idx
+        best[start : start + len(idx)] = np.sqrt(d2[rows, idx])
+        if second:
+            if k > 1:
+                d2[rows, idx] = np.inf
+                runner_up[start : start + len(idx)] = np.sqrt(d2.min(axis=1))
+            else:
+                runner_up[start : start + len(idx)] = np.inf
+    return (labels, best, runner_up) if second else (labels, best)
+
+
+def kmeans_plus_plus(
+    data: np.ndarray,
+    k: int,
+    rng: np.random.Generator,
+    weights: Optional[np.ndarray] = None,
+    init: Optional[np.ndarray] = None,
+    chunk_rows: int = KMEANS_CHUNK_ROWS,
+) -> np.ndarray:
+    """k-means++ (D² sampling) seeding; `init` centers are kept and extended up to k."""
+    n = len(data)
+    weights = np.ones(n) if weights is None else np.asarray(weights, dtype=float)
+    centers = [] if init is None else [c for c in np.asarray(init, dtype=float)[:k]]
+    if not centers:
+        centers.append(data[rng.choice(n, p=weights / weights.sum())])
+    _, dist = assign(data, np.asarray(centers), chunk_rows)
+    closest = dist**2
+    while len(centers) < k:
+        probs = closest * weights
+        total = probs.sum()
+        idx = rng.choice(n, p=probs / total) if total > 0 else int(rng.integers(n))
+        centers.append(data[idx])
+        np.minimum(closest, assign(data, data[idx : idx + 1], chunk_rows)[1] ** 2, out=closest)
+    return np.asarray(centers, dtype=float)
+
+
+def _update_centroids(data: np.ndarray, labels: np.ndarray, old: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    k, d = old.shape
+    counts = np.bincount(labels, minlength=k).astype(float)
+    sums = np.column_stack([np.bincount(labels, weights=data[:, j], minlength=k) for j in range(d)])
+    new = old.copy()  # un cluster vacío conserva su centroide
+    filled = counts > 0
+    new[filled] = sums[filled] / counts[filled, None]
+    return new, counts
+
+
+def _lloyd(data, centroids, max_iter, tol, chunk_rows):
+    labels, _ = assign(data, centroids, chunk_rows)
+    for it in range(1, max_iter + 1):
+        new_centroids, _ = _update_centroids(data, labels, centroids)
+        converged = np.allclose(new_centroids, centroids, atol=tol)
+        centroids = new_centroids
+        labels, _ = assign(data, centroids, chunk_rows)
+        if converged:
+            return centroids, labels, it, True
+    return centroids, labels, max_iter, False
+
+
+def _hamerly(data, centroids, max_iter, tol, chunk_rows):
+    """Hamerly's k-means: per point an upper bound to its center and a lower bound to
+    the second closest; only points whose bounds overlap are re-assigned."""
+    labels, upper, lower = assign(data, centroids, chunk_rows, second=True)
+    for it in range(1, max_iter + 1):
+        new_centroids, _ = _update_centroids(data, labels, centroids)
+        shift = np.sqrt(((new_centroids - centroids) ** 2).sum(axis=1))
+        converged = np.allclose(new_centroids, centroids, atol=tol)
+        centroids = new_centroids
+        # Actualiza cotas con el desplazamiento de cada centro
+        upper += shift[labels]
+        lower -= shift.max()
+        if len(centroids) > 1:
+            cc = np.sqrt(_pairwise_sq(centroids, centroids))
+            np.fill_diagonal(cc, np.inf)
+            half_gap = 0.5 * cc.min(axis=1)
+        else:
+            half_gap = np.full(1, np.inf)
+        bound = np.maximum(half_gap[labels], lower)
+        suspect = np.flatnonzero(upper > bound)
+        if suspect.size:
+            # Ajusta la cota superior con la distancia real y reasigna sólo los que siguen en duda
+            diff = data[suspect] - centroids[labels[suspect]]
+            upper[suspect] = np.sqrt((diff * diff).sum(axis=1))
+            suspect = suspect[upper[suspect] > bound[suspect]]
+        if suspect.size:
+            lbl, up, low = assign(data[suspect], centroids, chunk_rows, second=True)
+            labels[suspect], upper[suspect], lower[suspect] = lbl, up, low
+        if converged:
+            return centroids, labels, it, True
+    return centroids, labels, max_iter, False
+
+
+def _minibatch(data, centroids, max_iter, tol, chunk_rows, rng, batch_size):
+    """Sculley's mini-batch k-means: per-center learning rate 1 / (points seen)."""
+    counts = np.zeros(len(centroids))
+    centroids = centroids.copy()
+    converged = False
+    it = 0
+    for it in range(1, max_iter + 1):
+        batch = data[rng.choice(len(data), size=min(batch_size, len(data)), replace=False)]
+        lbl, _ = assign(batch, centroids, chunk_rows)
+        previous = centroids.copy()
+        batch_counts = np.bincount(lbl, minlength=len(centroids)).astype(float)
+        sums = np.column_stack(
+            [np.bincount(lbl, weights=batch[:, j], minlength=len(centroids)) for j in range(batch.shape[1])]
+        )
+        counts += batch_counts
+        seen = batch_counts > 0
+        eta = batch_counts[seen] / counts[seen]
+        centroids[seen] = (1 - eta)[:, None] * centroids[seen] + eta[:, None] * (sums[seen] / batch_counts[seen, None])
+        if np.allclose(centroids, previous, atol=tol):
+            converged = True
+            break
+    labels, _ = assign(data, centroids, chunk_rows)
+    return centroids, labels, it, converged
+
+
+def kmeans(
+    data: np.ndarray,
+    k: int,
+    mode: str = "auto",
+    max_iter: int = 100,
+    tol: float = 1e-4,
+    seed: int = 42,
+    init: Optional[np.ndarray] = None,
+    chunk_rows: int = KMEANS_CHUNK_ROWS,
+    batch_size: int = 1024,
+) -> KMeansResult:
+    """K-Means with k-means++ seeding (or `init` centers, extended with k-means++ if short)."""
+    data = np.ascontiguousarray(data, dtype=float)
+    rng = np.random.default_rng(seed=seed)
+    if mode == "auto":
+        mode = "lloyd" if len(data) <= LLOYD_MAX_POINTS else "hamerly" if len(data) <= HAMERLY_MAX_POINTS else "minibatch"
+    centroids = kmeans_plus_plus(data, k, rng, init=init, chunk_rows=chunk_rows)
+    if mode == "lloyd":
+        centroids, labels, iterations, converged = _lloyd(data, centroids, max_iter, tol, chunk_rows)
+    elif mode == "hamerly":
+        centroids, labels, iterations, converged = _hamerly(data, centroids, max_iter, tol, chunk_rows)
+    elif mode == "minibatch":
+        centroids, labels, iterations, converged = _minibatch(
+            data, centroids, max_iter, tol, chunk_rows, rng, batch_size
+        )
+    else:
+        raise ValueError(f"Modo de K-Means inválido: {mode}, usa {', '.join(KMEANS_MODES)}")
+    _, dist = assign(data, centroids, chunk_rows)
+    return KMeansResult(
+        centroids=centroids,
+        labels=labels,
+        iterations=iterations,
+        inertia=float((dist**2).sum()),
+        converged=converged,
+        mode=mode,
+    )
+
+
+class CentroidCache:
+    """Last centroids per (cache key, k) to warm-start K-Means when k changes.
+
+    For a new k the closest cached solution seeds the run: with fewer clusters the
+    cached centroids are subsampled by size-weighted k-means++, with more they are
+    kept and extended by D² sampling over the data.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, Dict[int, Tuple[np.ndarray, np.ndarray]]] = {}
+        self._lock = threading.Lock()
+
+    def store(self, key: Hashable, centroids: np.ndarray, sizes: np.ndarray) -> None:
+        with self._lock:
+            self._entries.setdefault(key, {})[len(centroids)] = (centroids.copy(), sizes.copy())
+
+    def initial_centroids(self, key: Hashable, k: int, seed: int = 42) -> Optional[np.ndarray]:
+        with self._lock:
+            cached = dict(self._entries.get(key, {}))
+        if not cached:
+            return None
+        if k in cached:
+            return cached[k][0]
+        nearest = min(cached, key=lambda c: (abs(c - k), c))
+        centroids, sizes = cached[nearest]
+        if nearest > k:
+            rng = np.random.default_rng(seed=seed)
+            return kmeans_plus_plus(centroids, k, rng, weights=np.maximum(sizes, 1))
+        return centroids  # kmeans() completa los centros que faltan con k-means++
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+centroid_cache = CentroidCache()
@@ -1,15 +1,99 @@
+import os
 from pathlib import Path
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 CLIMATE_PATH = ROOT_DIR / "IGP_EstacionEMA_2018-2024_Dataset.xlsx - Worksheet.csv"
 SOIL_PATH = ROOT_DIR / "soil_huancayo_sintetico_50kv.2.xlsx - Sheet1.csv"
+# Snapshots columnares (Arrow/Feather) de los datasets ya limpios, junto a los CSV
+SNAPSHOT_DIR = ROOT_DIR / ".snapshots"
+SNAPSHOTS_ENABLED = True
+# Almacenamiento compacto de los frames crudos: categorías para textos repetidos,
+# enteros/float32 sólo donde no se pierde precisión y columnas redundantes fuera
+COMPACT_DATASETS = True
+# Modo compartido para `uvicorn --workers N`: un proceso publica los datasets como .npy
+# en SHARED_DATASETS_DIR y cada worker los mapea en memoria (sólo lectura, sin copia).
+# Los workers revisan cada SHARED_POLL_S s si hay una versión nueva y la adoptan sin reiniciar
+SHARED_DATASETS = False
+SHARED_DATASETS_DIR = ROOT_DIR / ".shared"
+SHARED_POLL_S = 2.0
+SHARED_KEEP_VERSIONS = 3
 
 # Hyperparameters for graph similarity
 K_NEIGHBORS = 5
 FEATURE_WEIGHT = 0.6
 GEO_WEIGHT = 0.4
+# Graph builder: max elements per distance block (rows × n, caps memory) and
+# node count from which build_zone_graph switches to the spatial-index mode
+GRAPH_BLOCK_ELEMENTS = 2_000_000
+GRAPH_SPATIAL_MIN_NODES = 5000
+# Graphs kept per (feature_weight, geo_weight, k) for /algorithms/bellman-ford
+GRAPH_CACHE_SIZE = 64
+# Analítica del grafo (/graph/analytics, /graph/distances): nodos desde los que la matriz de
+# distancias de todos los pares se reparte por orígenes en el pool de cómputo
+GRAPH_APSP_PARALLEL_MIN_NODES = 500
+
+# Pool de procesos compartido para el cómputo pesado (K-Means, caminos mínimos, ordenamiento,
+# agregación): procesos (0 = os.cpu_count()), tareas en cola además de las que corren antes
+# de responder 429, segundos máximos por tarea (504) y arrays de entrada en memoria compartida
+COMPUTE_WORKERS = 0
+COMPUTE_MAX_QUEUE = 32
+COMPUTE_TIMEOUT_S = 30.0
+COMPUTE_RETRY_AFTER_S = 1
+COMPUTE_SHARED_ARRAYS = 32
+
+# Filas por bloque al calcular distancias punto-centroide en K-Means (memoria chunk × k)
+KMEANS_CHUNK_ROWS = 16_384
+
+# Cubo de agregación de suelo (/soil/cube): lado de la celda de grilla en grados (~5.5 km)
+SOIL_CUBE_CELL_DEG = 0.05
+
+# Búsqueda por similitud (/soil/similar): valores por bloque (perfiles × filas × variables),
+# perfiles por consulta y k máximo
+SIMILARITY_BLOCK_ELEMENTS = 2_000_000
+SIMILARITY_MAX_PROFILES = 100
+SIMILARITY_MAX_K = 200
 
 # Defaults for algorithm endpoints
 DEFAULT_KMEANS_K = 4
 DEFAULT_SORT_LIMIT = 200
 
+
+# Arranque en segundo plano: segundos que un request espera a un dataset/estructura
+# que aún se está cargando antes de responder 503 (con Retry-After)
+WARMUP_WAIT_S = 10.0
+WARMUP_RETRY_AFTER_S = 5
+
+# Respuestas: gzip sólo por encima de este tamaño (bytes)
+GZIP_MIN_BYTES = 1024
+
+# Profiler por muestreo: se activa por request con este header (p.ej. X-Profile: 1);
+# el perfil queda en /debug/profiles/{id}. Apagado por defecto: cualquier cliente podría activarlo
+# y leer las pilas; se habilita sólo para depurar con AGROFUTURO_PROFILER=1
+PROFILER_ENABLED = os.environ.get("AGROFUTURO_PROFILER", "").strip().lower() in ("1", "true", "yes")
+PROFILE_HEADER = "X-Profile"
+PROFILE_INTERVAL_S = 0.005
+
+# Exportación de muestras de suelo: filas por chunk y tamaño de CSV desde el que se
+# lee el archivo por partes en vez de usar el frame en memoria
+SOIL_EXPORT_CHUNK_ROWS = 5_000
+SOIL_EXPORT_CSV_MIN_BYTES = 512 * 1024 * 1024
+
+# Ingesta incremental de clima (POST /climate/ingest): máximo de filas por lote y si las
+# filas aceptadas se agregan a una bitácora append-only junto al CSV (se reaplica al arrancar)
+CLIMATE_INGEST_MAX_ROWS = 10_000
+CLIMATE_INGEST_PERSIST = True
+
+# Estadísticas móviles de clima (/climate/rolling): umbrales de horas de helada (TT, °C) y de
+# lluvia intensa (RR, mm/h; 2.5 = moderada o más en la escala horaria de la OMM), z mínimo
+# para marcar una anomalía y lecturas previas mínimas en la ventana para calcularla
+FROST_TEMP_C = 0.0
+HEAVY_RAIN_MM_H = 2.5
+ANOMALY_Z = 3.0
+ANOMALY_MIN_COUNT = 12
+
+# POST /algorithms/batch: máximo de operaciones por request
+BATCH_MAX_OPERATIONS = 32
+
+# Caché de resultados de /algorithms/* (entradas y segundos de vida)
+RESULT_CACHE_SIZE = 256
+RESULT_CACHE_TTL_S = 600
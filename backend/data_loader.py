@@ -1,15 +1,51 @@
 from __future__ import annotations
 
 import logging
+import time
+from contextlib import contextmanager
 from functools import lru_cache
-from typing import Dict, List, Tuple
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 
-from .config import CLIMATE_PATH, SOIL_PATH
+from . import shared_datasets, snapshot
+from .climate_rolling import ClimateRolling
+from .climate_rollups import ClimateRollups
+from .climate_store import CLIMATE_NUMERIC_COLS, ClimateStore, nan_to_none
+from .config import (
+    ANOMALY_Z,
+    CLIMATE_INGEST_PERSIST,
+    CLIMATE_PATH,
+    COMPACT_DATASETS,
+    SHARED_DATASETS,
+    SOIL_CUBE_CELL_DEG,
+    SOIL_PATH,
+)
+from .graph import GraphMatrices, precompute_graph_matrices
+from .metrics import stage_timer
+from .similarity import SIMILARITY_LEVELS, SimilarityIndex
+from .soil_cube import CUBE_STATS, SoilCube
+from .spatial_index import SoilSpatialIndex
 
 logger = logging.getLogger(__name__)
 
+# Huella de los archivos cargados; cambia si se recarga un dataset distinto o se ingieren filas
+_VERSION_PARTS: Dict[str, str] = {}
+# Clima vigente tras ingestas en caliente (store, rollups, monthly); vacío = el de la carga inicial
+_CLIMATE_LIVE: Dict[str, Any] = {}
+
+
+def _file_fingerprint(path: Path) -> str:
+    stat = path.stat()
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def dataset_version() -> str:
+    """Identifier of the currently loaded datasets, used to key downstream caches."""
+    return ".".join(f"{name}:{part}" for name, part in sorted(_VERSION_PARTS.items()))
+
 
 def _normalize_columns(df: pd.DataFrame, cols: List[str]) -> Dict[str, Tuple[float, float]]:
     """Add *_norm columns and return min/max metadata."""
@@ -27,15 +63,79 @@ def _normalize_columns(df: pd.DataFrame, cols: List[str]) -> Dict[str, Tuple[flo
     return meta
 
 
-@lru_cache(maxsize=1)
-def load_climate():
-    """Read and enrich the climate dataset."""
-    if not CLIMATE_PATH.exists():
-        raise FileNotFoundError(f"No se encontró el dataset de clima en {CLIMATE_PATH}")
+SOIL_NUMERIC_COLS = [
+    "lat",
+    "lon",
+    "arena_pct",
+    "limo_pct",
+    "arcilla_pct",
+    "MO_pct",
+    "pH",
+    "CE_dS_m",
+    "densidad_aparente_g_cm3",
+    "CEC_cmol_kg",
+    "N_total_pct",
+    "P_disponible_mg_kg",
+    "K_intercambiable_mg_kg",
+    "pendiente_pct",
+    "profundidad_efectiva_cm",
+    "indice_calidad_suelo",
+]
+SOIL_FEATURE_COLS = [
+    "pH",
+    "MO_pct",
+    "CEC_cmol_kg",
+    "N_total_pct",
+    "P_disponible_mg_kg",
+    "K_intercambiable_mg_kg",
+    "pendiente_pct",
+    "indice_calidad_suelo",
+]
+# Modo compacto: textos repetidos como categorías y columnas que ya no se usan tras
+# la limpieza (la fecha/hora queda en `datetime`; year/month se derivan de ella)
+CLIMATE_CATEGORY_COLS = ["UBIGEO"]
+CLIMATE_DROP_COLS = ["ESTACION", "YY", "MM", "DY", "HH"]
+SOIL_CATEGORY_COLS = ["provincia", "distrito", "textura", "cultivo_previo"]
+
 
-    df = pd.read_csv(CLIMATE_PATH)
-    numeric_cols = ["TT", "HR", "RR", "PP", "FF", "DD"]
-    for col in numeric_cols:
+def _downcast(values: pd.Series) -> pd.Series:
+    """Smallest integer dtype for ints, float32 for floats it holds exactly; unchanged otherwise."""
+    if pd.api.types.is_integer_dtype(values):
+        return pd.to_numeric(values, downcast="integer")
+    if values.dtype != np.float64:
+        return values
+    arr = values.to_numpy()
+    # float32 sólo si la ida y vuelta a float64 es exacta: las respuestas no cambian
+    narrow = arr.astype(np.float32)
+    if np.array_equal(narrow.astype(np.float64), arr, equal_nan=True):
+        return pd.Series(narrow, index=values.index, name=values.name)
+    return values
+
+
+def compact_frame(df: pd.DataFrame, category_cols: Sequence[str], drop_cols: Sequence[str] = ()) -> pd.DataFrame:
+    """Lossless compact copy of a cleaned frame (categoricals, narrow numerics, dropped columns)."""
+    df = df.drop(columns=[col for col in drop_cols if col in df.columns])
+    for col in df.columns:
+        if col in category_cols:
+            df[col] = df[col].astype("category")
+        else:
+            df[col] = _downcast(df[col])
+    return df
+
+
+# Columnas del frame mensual: (métrica, agregación)
+MONTHLY_AGGS = {
+    "temp_avg": ("TT", "mean"),
+    "humidity_avg": ("HR", "mean"),
+    "rain_total": ("RR", "sum"),
+    "pressure_avg": ("PP", "mean"),
+    "wind_avg": ("FF", "mean"),
+}
+
+
+def clean_climate_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Type raw climate rows and derive datetime/year/month; rows without a valid date/hour are dropped."""
+    for col in CLIMATE_NUMERIC_COLS:
         df[col] = pd.to_numeric(df[col], errors="coerce")
 
     # Build datetime index
@@ -51,52 +151,47 @@ def load_climate():
     df = df.dropna(subset=["datetime"])
     df["year"] = df["datetime"].dt.year
     df["month"] = df["datetime"].dt.month
+    return df
 
-    monthly = (
-        df.groupby(["year", "month"])
-        .agg(
-            temp_avg=("TT", "mean"),
-            humidity_avg=("HR", "mean"),
-            rain_total=("RR", "sum"),
-            pressure_avg=("PP", "mean"),
-            wind_avg=("FF", "mean"),
-        )
-        .reset_index()
-        .sort_values(["year", "month"])
+
+def climate_monthly(df: pd.DataFrame) -> pd.DataFrame:
+    return df.groupby(["year", "month"]).agg(**MONTHLY_AGGS).reset_index().sort_values(["year", "month"])
+
+
+def monthly_from_rollups(rollups: ClimateRollups) -> pd.DataFrame:
+    """`climate_monthly` rebuilt from the month tier's mergeable count/sum (no pass over the rows)."""
+    tier = rollups.tiers["month"]
+    out = pd.DataFrame(
+        {"year": (tier.keys // 12 + 1970).astype(np.int32), "month": (tier.keys % 12 + 1).astype(np.int32)}
     )
+    for name, (metric, how) in MONTHLY_AGGS.items():
+        out[name] = tier.total[metric] if how == "sum" else tier.mean(metric)
+    return out
 
-    logger.info("Clima cargado: %s filas, rango años %s-%s", len(df), df["year"].min(), df["year"].max())
-    return df, monthly
 
+def parse_climate_csv(path: Path) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Parse, type and aggregate the climate CSV (no caching)."""
+    df = clean_climate_frame(pd.read_csv(path))
+    return df, climate_monthly(df)
 
-@lru_cache(maxsize=1)
-def load_soil():
-    """Read and aggregate the soil dataset at district level."""
-    if not SOIL_PATH.exists():
-        raise FileNotFoundError(f"No se encontró el dataset de suelo en {SOIL_PATH}")
 
-    df = pd.read_csv(SOIL_PATH)
-    numeric_cols = [
-        "lat",
-        "lon",
-        "arena_pct",
-        "limo_pct",
-        "arcilla_pct",
-        "MO_pct",
-        "pH",
-        "CE_dS_m",
-        "densidad_aparente_g_cm3",
-        "CEC_cmol_kg",
-        "N_total_pct",
-        "P_disponible_mg_kg",
-        "K_intercambiable_mg_kg",
-        "pendiente_pct",
-        "profundidad_efectiva_cm",
-        "indice_calidad_suelo",
-    ]
-    for col in numeric_cols:
+def _coerce_soil_types(df: pd.DataFrame) -> pd.DataFrame:
+    for col in SOIL_NUMERIC_COLS:
         df[col] = pd.to_numeric(df[col], errors="coerce")
     df["fecha_muestra"] = pd.to_datetime(df["fecha_muestra"], errors="coerce")
+    return df
+
+
+def iter_soil_csv(chunk_rows: int, path: Path | None = None) -> Iterator[pd.DataFrame]:
+    """Raw soil samples straight from the CSV in typed chunks (memory bounded by chunk_rows)."""
+    with pd.read_csv(path or SOIL_PATH, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield _coerce_soil_types(chunk)
+
+
+def parse_soil_csv(path: Path) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, Tuple[float, float]]]:
+    """Parse the soil CSV and aggregate it at district level (no caching)."""
+    df = _coerce_soil_types(pd.read_csv(path))
 
     grouped = (
         df.groupby("distrito")
@@ -123,34 +218,314 @@ def load_soil():
         .reset_index()
     )
 
-    feature_cols = [
-        "pH",
-        "MO_pct",
-        "CEC_cmol_kg",
-        "N_total_pct",
-        "P_disponible_mg_kg",
-        "K_intercambiable_mg_kg",
-        "pendiente_pct",
-        "indice_calidad_suelo",
-    ]
-    norm_meta = _normalize_columns(grouped, feature_cols)
-    grouped["soil_score"] = grouped[[f"{c}_norm" for c in feature_cols]].mean(axis=1)
+    norm_meta = _normalize_columns(grouped, SOIL_FEATURE_COLS)
+    grouped["soil_score"] = grouped[[f"{c}_norm" for c in SOIL_FEATURE_COLS]].mean(axis=1)
     grouped = grouped.sort_values("soil_score", ascending=False)
+    return df, grouped, norm_meta
+
 
-    logger.info("Suelo cargado: %s filas crudas, %s distritos", len(df), len(grouped))
+@lru_cache(maxsize=1)
+@stage_timer("load_climate")
+def load_climate():
+    """Read and enrich the climate dataset (from its snapshot when still valid, or the shared version)."""
+    if SHARED_DATASETS:
+        shared = load_shared()
+        return shared.frames["climate_df"], shared.frames["climate_monthly"]
+    return _read_climate()
+
+
+def _read_climate() -> Tuple[pd.DataFrame, pd.DataFrame]:
+    if not CLIMATE_PATH.exists():
+        raise FileNotFoundError(f"No se encontró el dataset de clima en {CLIMATE_PATH}")
+
+    _VERSION_PARTS["climate"] = _file_fingerprint(CLIMATE_PATH)
+    with stage_timer("load_climate:snapshot_read"):
+        cached = snapshot.load_snapshot(CLIMATE_PATH)
+    if cached is not None and cached[1].get("compact", False) == COMPACT_DATASETS:
+        frames, _ = cached
+        df, monthly = frames["df"], frames["monthly"]
+        source = "snapshot"
+    else:
+        fingerprint = snapshot.source_fingerprint(CLIMATE_PATH) if snapshot.snapshots_available() else None
+        with stage_timer("load_climate:parse_csv"):
+            df, monthly = parse_climate_csv(CLIMATE_PATH)
+            if COMPACT_DATASETS:
+                df = compact_frame(df, CLIMATE_CATEGORY_COLS, CLIMATE_DROP_COLS)
+        if fingerprint is not None:
+            with stage_timer("load_climate:snapshot_write"):
+                snapshot.write_snapshot(
+                    CLIMATE_PATH, fingerprint, {"df": df, "monthly": monthly}, {"compact": COMPACT_DATASETS}
+                )
+        source = "csv"
+
+    log_path = climate_ingest_log()
+    if CLIMATE_INGEST_PERSIST and log_path.exists():
+        # Filas ingeridas en ejecuciones anteriores: el arranque es una carga completa igual
+        with stage_timer("load_climate:ingest_log"):
+            df = _replay_ingest_log(df, log_path)
+            monthly = climate_monthly(df)
+        _VERSION_PARTS["climate_ingest"] = _file_fingerprint(log_path)
+
+    logger.info(
+        "Clima cargado (%s): %s filas, rango años %s-%s", source, len(df), df["year"].min(), df["year"].max()
+    )
+    return df, monthly
+
+
+def climate_ingest_log() -> Path:
+    """Append-only CSV (same columns as the source) with the rows ingested through the API."""
+    return CLIMATE_PATH.with_name(f"{CLIMATE_PATH.stem}.ingest.csv")
+
+
+def append_ingest_log(rows: pd.DataFrame) -> str:
+    """Append raw rows (source CSV columns) to the ingest log; returns its new fingerprint."""
+    path = climate_ingest_log()
+    header = not path.exists() or path.stat().st_size == 0
+    with path.open("a", encoding="utf-8", newline="") as fh:
+        rows.to_csv(fh, index=False, header=header)
+    return _file_fingerprint(path)
+
+
+def _replay_ingest_log(df: pd.DataFrame, path: Path) -> pd.DataFrame:
+    log = clean_climate_frame(pd.read_csv(path))
+    merged = pd.concat([df, log], ignore_index=True)
+    # Una lectura por (estación, hora): se descartan las del log que ya existen
+    dup = merged.duplicated(subset=["UBIGEO", "datetime"], keep="first").to_numpy()
+    dup[: len(df)] = False
+    merged = merged[~dup]
+    if COMPACT_DATASETS:
+        merged = compact_frame(merged, CLIMATE_CATEGORY_COLS, CLIMATE_DROP_COLS)
+    return merged
+
+
+@lru_cache(maxsize=1)
+@stage_timer("load_soil")
+def load_soil():
+    """Read and aggregate the soil dataset at district level (from its snapshot when still valid, or the shared version)."""
+    if SHARED_DATASETS:
+        shared = load_shared()
+        norm_meta = {col: tuple(bounds) for col, bounds in shared.meta["norm_meta"].items()}
+        return shared.frames["soil_df"], shared.frames["soil_grouped"], norm_meta
+    return _read_soil()
+
+
+def _read_soil() -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, Tuple[float, float]]]:
+    if not SOIL_PATH.exists():
+        raise FileNotFoundError(f"No se encontró el dataset de suelo en {SOIL_PATH}")
+
+    _VERSION_PARTS["soil"] = _file_fingerprint(SOIL_PATH)
+    with stage_timer("load_soil:snapshot_read"):
+        cached = snapshot.load_snapshot(SOIL_PATH)
+    if cached is not None and cached[1].get("compact", False) == COMPACT_DATASETS:
+        frames, meta = cached
+        df, grouped = frames["df"], frames["grouped"]
+        norm_meta = {col: tuple(bounds) for col, bounds in meta["norm_meta"].items()}
+        source = "snapshot"
+    else:
+        fingerprint = snapshot.source_fingerprint(SOIL_PATH) if snapshot.snapshots_available() else None
+        with stage_timer("load_soil:parse_csv"):
+            df, grouped, norm_meta = parse_soil_csv(SOIL_PATH)
+            if COMPACT_DATASETS:
+                df = compact_frame(df, SOIL_CATEGORY_COLS)
+        if fingerprint is not None:
+            meta = {
+                "norm_meta": {col: [float(v[0]), float(v[1])] for col, v in norm_meta.items()},
+                "compact": COMPACT_DATASETS,
+            }
+            with stage_timer("load_soil:snapshot_write"):
+                snapshot.write_snapshot(SOIL_PATH, fingerprint, {"df": df, "grouped": grouped}, meta)
+        source = "csv"
+
+    logger.info("Suelo cargado (%s): %s filas crudas, %s distritos", source, len(df), len(grouped))
     return df, grouped, norm_meta
 
 
+@lru_cache(maxsize=1)
+def load_soil_samples() -> Tuple[pd.DataFrame, Dict[str, Tuple[float, float]]]:
+    """Raw soil samples with complete features plus *_norm columns (sample-level min/max)."""
+    if SHARED_DATASETS:
+        shared = load_shared()
+        return shared.frames["soil_samples"], {col: tuple(b) for col, b in shared.meta["sample_norm_meta"].items()}
+    df, _, _ = load_soil()
+    return _soil_samples(df)
+
+
+def _soil_samples(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, Tuple[float, float]]]:
+    samples = df.loc[df[SOIL_FEATURE_COLS].notna().all(axis=1), ["distrito", "provincia", *SOIL_FEATURE_COLS]].copy()
+    norm_meta = _normalize_columns(samples, SOIL_FEATURE_COLS)
+    return samples, norm_meta
+
+
+@lru_cache(maxsize=1)
+@stage_timer("load_soil_index")
+def load_soil_index() -> SoilSpatialIndex:
+    """Grid/BallTree index over the raw sample coordinates (bbox, radius, nearest)."""
+    df, _, _ = load_soil()
+    index = SoilSpatialIndex(df)
+    if len(index):
+        index.build_tree()  # en la precarga, no en el primer /soil/samples/nearest
+    return index
+
+
+@lru_cache(maxsize=1)
+@stage_timer("load_soil_cube")
+def load_soil_cube() -> SoilCube:
+    """Soil partials by provincia × distrito × grid cell × month, with every roll-up precomputed."""
+    df, _, _ = load_soil()
+    return SoilCube(df, SOIL_NUMERIC_COLS, SOIL_CUBE_CELL_DEG)
+
+
+@lru_cache(maxsize=len(SIMILARITY_LEVELS))
+@stage_timer("load_similarity_index")
+def load_similarity_index(level: str = "district") -> SimilarityIndex:
+    """Profile similarity index: district averages or samples with complete features."""
+    if level == "district":
+        _, grouped, norm_meta = load_soil()
+        return SimilarityIndex(grouped, norm_meta, ("distrito", "provincia", "muestras"))
+    if level == "sample":
+        df, _, _ = load_soil()
+        samples, norm_meta = load_soil_samples()
+        frame = samples.join(df.loc[samples.index, ["id_muestra", "lat", "lon"]])
+        return SimilarityIndex(frame, norm_meta, ("id_muestra", "distrito", "provincia"))
+    raise ValueError(f"Nivel inválido: {level}, usa {', '.join(SIMILARITY_LEVELS)}")
+
+
+@lru_cache(maxsize=1)
+@stage_timer("load_graph_matrices")
+def load_graph_matrices() -> GraphMatrices:
+    """Weight-independent distance matrices of the district graph."""
+    if SHARED_DATASETS:
+        shared = load_shared()
+        graph = shared.meta["graph"]
+        return GraphMatrices(
+            graph["names"], graph["nodes"], shared.arrays["graph.feature_dist"], shared.arrays["graph.geo_norm"]
+        )
+    _, grouped, _ = load_soil()
+    return precompute_graph_matrices(grouped)
+
+
+@lru_cache(maxsize=1)
+@stage_timer("load_shared")
+def load_shared() -> shared_datasets.SharedVersion:
+    """Attach the current shared version (memory-mapped, read-only); publishes one first if there is none.
+
+    With several workers starting at once, the first to take the publish lock parses
+    the sources and publishes; the others wait for the lock and attach its version.
+    """
+    for _ in range(3):
+        version = shared_datasets.current_version()
+        attached = shared_datasets.open_version(version) if version else None
+        if attached is not None:
+            _VERSION_PARTS.clear()
+            _VERSION_PARTS["shared"] = version
+            logger.info("Datasets compartidos adjuntados: versión %s", version)
+            return attached
+        with shared_datasets.publish_lock():
+            # Sin versión (o de otro formato) y nadie la publicó mientras se esperaba el lock
+            if shared_datasets.current_version() == version:
+                _publish_locked()
+    raise RuntimeError("No se pudo adjuntar una versión compartida de los datasets")
+
+
+def shared_version() -> str | None:
+    """Id of the shared version this process serves (None if not attached)."""
+    return load_shared().version if SHARED_DATASETS and load_shared.cache_info().currsize else None
+
+
+def publish_shared() -> str:
+    """Parse the sources once and publish them as a new shared version; every worker swaps to it."""
+    with shared_datasets.publish_lock():
+        return _publish_locked()
+
+
+def _store_arrays(store: ClimateStore) -> Dict[str, np.ndarray]:
+    return {
+        "climate_store.timestamps": store.timestamps,
+        "climate_store.year": store.year,
+        "climate_store.month": store.month,
+        "climate_store.ubigeo": store.ubigeo,
+        **{f"climate_store.metric.{col}": values for col, values in store.metrics.items()},
+    }
+
+
+@stage_timer("publish_shared")
+def _publish_locked() -> str:
+    climate_df, monthly = _read_climate()
+    store = ClimateStore(climate_df)
+    soil_df, grouped, norm_meta = _read_soil()
+    samples, sample_meta = _soil_samples(soil_df)
+    matrices = precompute_graph_matrices(grouped)
+    arrays = {
+        **_store_arrays(store),
+        "graph.feature_dist": matrices.feature_dist,
+        "graph.geo_norm": matrices.geo_norm,
+    }
+    meta = {
+        "store_metrics": list(store.metrics),
+        # Id del suelo publicado: las versiones que sólo cambian el clima lo heredan
+        "soil_version": f"{time.time_ns():x}",
+        "norm_meta": {col: [float(v[0]), float(v[1])] for col, v in norm_meta.items()},
+        "sample_norm_meta": {col: [float(v[0]), float(v[1])] for col, v in sample_meta.items()},
+        "graph": {"names": matrices.names, "nodes": matrices.nodes},
+    }
+    frames = {
+        "climate_df": climate_df,
+        "climate_monthly": monthly,
+        "soil_df": soil_df,
+        "soil_grouped": grouped,
+        "soil_samples": samples,
+    }
+    version = shared_datasets.write_version(frames, arrays, meta)
+    logger.info("Versión compartida %s publicada: %s filas de clima, %s muestras", version, len(store), len(soil_df))
+    return version
+
+
+def refresh_shared() -> bool:
+    """Adopt the latest published version if this process serves an older one; True if it swapped.
+
+    Loaders start over from the new version; requests already running keep the
+    objects (and mappings) they hold. If the soil part is the same (a climate
+    ingest), only the climate loaders start over: soil frames, index, cube and
+    graph matrices are kept (the new version links the same files).
+    """
+    if not SHARED_DATASETS or not load_shared.cache_info().currsize:
+        return False
+    previous = load_shared()
+    version = shared_datasets.current_version()
+    if version is None or version == previous.version:
+        return False
+    load_shared.cache_clear()
+    soil_version = load_shared().meta.get("soil_version")
+    if soil_version is not None and soil_version == previous.meta.get("soil_version"):
+        _clear_climate_caches()
+    else:
+        clear_caches()
+        load_shared()
+    return True
+
+
+@contextmanager
+def shared_writer() -> Iterator[None]:
+    """Serialize a dataset write across worker processes (shared mode), starting from the latest version."""
+    if not SHARED_DATASETS:
+        yield
+        return
+    with shared_datasets.publish_lock():
+        refresh_shared()
+        yield
+
+
 def dataset_summary() -> Dict:
-    climate_df, monthly = load_climate()
+    # Clima desde el store vigente: incluye las filas ingeridas en caliente
+    store = load_climate_store()
     soil_df, soil_grouped, norm_meta = load_soil()
 
     return {
         "climate": {
-            "rows": int(len(climate_df)),
-            "years": {"min": int(climate_df["year"].min()), "max": int(climate_df["year"].max())},
-            "monthly_records": int(len(monthly)),
-            "ubigeos": climate_df["UBIGEO"].nunique(),
+            "rows": int(len(store)),
+            "years": {"min": min(store.year_index), "max": max(store.year_index)},
+            "monthly_records": int(len(load_climate_monthly())),
+            "ubigeos": int(pd.Series(store.ubigeo).nunique()),
         },
         "soil": {
             "rows": int(len(soil_df)),
@@ -158,63 +533,306 @@ def dataset_summary() -> Dict:
             "provincia": soil_grouped["provincia"].unique().tolist(),
             "feature_norms": {k: {"min": float(v[0]), "max": float(v[1])} for k, v in norm_meta.items()},
         },
+        "memory": memory_report(),
     }
 
 
-def climate_timeseries(metric: str, year: int | None = None, limit: int = 500) -> List[Dict]:
+@lru_cache(maxsize=1)
+@stage_timer("load_climate_store")
+def _build_climate_store() -> ClimateStore:
+    if SHARED_DATASETS:
+        arrays, meta = load_shared().arrays, load_shared().meta
+        return ClimateStore.from_arrays(
+            *(arrays[f"climate_store.{name}"] for name in ("timestamps", "year", "month", "ubigeo")),
+            {col: arrays[f"climate_store.metric.{col}"] for col in meta["store_metrics"]},
+        )
     climate_df, _ = load_climate()
+    return ClimateStore(climate_df)
+
+
+@lru_cache(maxsize=1)
+@stage_timer("load_climate_rollups")
+def _build_climate_rollups() -> ClimateRollups:
+    return ClimateRollups(_build_climate_store())
+
+
+@lru_cache(maxsize=1)
+@stage_timer("load_climate_rolling")
+def _build_climate_rolling() -> ClimateRolling:
+    return ClimateRolling(_build_climate_store())
+
+
+def load_climate_store() -> ClimateStore:
+    """Time-sorted, year-indexed climate arrays: built once from `load_climate`, then extended by ingestion."""
+    live = _CLIMATE_LIVE.get("store")
+    return live if live is not None else _build_climate_store()
+
+
+def load_climate_rollups() -> ClimateRollups:
+    """Hour/day/week/month rollups of the climate metrics (the month tier extends `monthly`)."""
+    live = _CLIMATE_LIVE.get("rollups")
+    return live if live is not None else _build_climate_rollups()
+
+
+def load_climate_rolling() -> ClimateRolling:
+    """Running totals and window offsets for the 24h/7d/30d rolling statistics (extended by ingestion)."""
+    live = _CLIMATE_LIVE.get("rolling")
+    return live if live is not None else _build_climate_rolling()
+
+
+def load_climate_monthly() -> pd.DataFrame:
+    live = _CLIMATE_LIVE.get("monthly")
+    return live if live is not None else load_climate()[1]
+
+
+def publish_climate(store: ClimateStore, rollups: ClimateRollups, rolling: ClimateRolling, version: str) -> None:
+    """Swap in the structures produced by an ingestion and bump the dataset version (downstream caches miss).
+
+    In shared mode (call inside `shared_writer`) the store and `monthly` are also
+    published as a new shared version that links every other file of the current
+    one: this process swaps now, keeping its extended structures; the other workers
+    on their next poll, rebuilding only the climate side.
+    """
+    monthly = monthly_from_rollups(rollups)
+    if SHARED_DATASETS:
+        with stage_timer("publish_shared:climate"):
+            shared_datasets.write_version(
+                {"climate_monthly": monthly},
+                _store_arrays(store),
+                {"store_metrics": list(store.metrics)},
+                base=load_shared().version,
+            )
+        load_shared.cache_clear()
+        load_shared()  # la versión recién escrita: fija el ETag `shared:<versión>`
+    else:
+        _VERSION_PARTS["climate_ingest"] = version
+    # Un solo update: quien lea store y rollups por separado obtiene objetos completos
+    _CLIMATE_LIVE.update(store=store, rollups=rollups, rolling=rolling, monthly=monthly)
+
+
+def climate_timeseries(
+    metric: str,
+    year: int | None = None,
+    limit: int = 500,
+    start: int | None = None,
+    end: int | None = None,
+    columnar: bool = False,
+) -> List[Dict] | Dict[str, List]:
+    """First `limit` points of a metric, optionally within a year and/or [start, end] epoch seconds."""
+    store = load_climate_store()
     metric = metric.upper()
-    if metric not in climate_df.columns:
+    if not store.has_metric(metric):
         raise ValueError(f"Metric {metric} no existe en el dataset de clima")
 
-    df = climate_df
+    lo, hi = store.range_for(year=year, start=start, end=end)
+    hi = min(hi, lo + limit)
+    return store.columns(metric, lo, hi) if columnar else store.records(metric, lo, hi)
+
+
+def climate_rolling_series(
+    metric: str,
+    window: str,
+    year: int | None = None,
+    start: int | None = None,
+    end: int | None = None,
+    limit: int = 500,
+    z: float | None = None,
+    only_anomalies: bool = False,
+    columnar: bool = False,
+) -> List[Dict] | Dict[str, List]:
+    """Rolling mean/std, event counts and anomaly flags of a metric per reading in a year and/or [start, end]."""
+    rolling = load_climate_rolling()
+    metric = metric.upper()
+    if not rolling.has_metric(metric):
+        raise ValueError(f"Metric {metric} sin estadísticas móviles, usa {', '.join(rolling.metrics)}")
+    if window not in rolling.windows:
+        raise ValueError(f"Ventana inválida: {window}, usa {', '.join(rolling.windows)}")
+    lo, hi = rolling.store.range_for(year=year, start=start, end=end)
+    columns = rolling.series(metric, window, lo, hi, z=z or ANOMALY_Z, only_anomalies=only_anomalies, limit=limit)
+    if columnar:
+        return columns
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def climate_rollup_series(
+    metric: str,
+    points: int | None = None,
+    year: int | None = None,
+    start: int | None = None,
+    end: int | None = None,
+    resolution: str | None = None,
+    downsample: str = "lttb",
+    limit: int | None = None,
+    columnar: bool = False,
+) -> Tuple[str, List[Dict] | Dict[str, List]]:
+    """(resolution, series) of a metric from the rollup tiers, optionally downsampled to `points`."""
+    rollups = load_climate_rollups()
+    metric = metric.upper()
+    if not rollups.has_metric(metric):
+        raise ValueError(f"Metric {metric} no existe en el dataset de clima")
     if year:
-        df = df[df["year"] == year]
-    df = df.sort_values("datetime")
-    records = (
-        df[["datetime", metric, "UBIGEO", "year", "month"]]
-        .head(limit)
-        .assign(timestamp=lambda x: x["datetime"].astype("int64") // 10**9)
-    )
-    return [
-        {
-            "timestamp": int(row.timestamp),
-            "value": float(getattr(row, metric)) if pd.notna(getattr(row, metric)) else None,
-            "ubigeo": getattr(row, "UBIGEO"),
-            "year": int(getattr(row, "year")),
-            "month": int(getattr(row, "month")),
-        }
-        for row in records.itertuples(index=False)
-    ]
+        # Año calendario UTC, intersectado con from/to
+        y_start = int(pd.Timestamp(year=year, month=1, day=1, tz="UTC").timestamp())
+        y_end = int(pd.Timestamp(year=year + 1, month=1, day=1, tz="UTC").timestamp()) - 1
+        start = y_start if start is None else max(start, y_start)
+        end = y_end if end is None else min(end, y_end)
+    resolution, columns = rollups.series(metric, points, start, end, resolution, downsample, limit)
+    if columnar:
+        return resolution, columns
+    names = list(columns)
+    return resolution, [dict(zip(names, values)) for values in zip(*columns.values())]
+
 
+SOIL_ZONE_COLS = [
+    "distrito",
+    "provincia",
+    "lat",
+    "lon",
+    "muestras",
+    "pH",
+    "MO_pct",
+    "CEC_cmol_kg",
+    "N_total_pct",
+    "P_disponible_mg_kg",
+    "K_intercambiable_mg_kg",
+    "pendiente_pct",
+    "indice_calidad_suelo",
+    "soil_score",
+]
 
-def soil_zones(limit: int = 50) -> List[Dict]:
+
+def soil_zones(limit: int = 50, columnar: bool = False) -> List[Dict] | Dict[str, List]:
     _, grouped, _ = load_soil()
-    records = grouped.head(limit)
-    cols = [
-        "distrito",
-        "provincia",
-        "lat",
-        "lon",
-        "muestras",
-        "pH",
-        "MO_pct",
-        "CEC_cmol_kg",
-        "N_total_pct",
-        "P_disponible_mg_kg",
-        "K_intercambiable_mg_kg",
-        "pendiente_pct",
-        "indice_calidad_suelo",
-        "soil_score",
-    ]
-    cleaned: List[Dict] = []
-    for row in records[cols].itertuples(index=False):
-        item: Dict = {}
-        for idx, col in enumerate(cols):
-            val = row[idx]
-            if col in ("distrito", "provincia"):
-                item[col] = val
-            else:
-                item[col] = float(val) if pd.notna(val) else None
-        cleaned.append(item)
-    return cleaned
+    records = grouped.head(limit)[SOIL_ZONE_COLS]
+    # Una lista por columna (NaN -> None); las filas se arman sólo si se piden
+    columns: Dict[str, List] = {}
+    for col in SOIL_ZONE_COLS:
+        if col in ("distrito", "provincia"):
+            columns[col] = records[col].tolist()
+        else:
+            columns[col] = nan_to_none(records[col].to_numpy(dtype=float))
+    if columnar:
+        return columns
+    return [dict(zip(SOIL_ZONE_COLS, values)) for values in zip(*columns.values())]
+
+
+def soil_cube_query(
+    by: Sequence[str] = (),
+    filters: Dict[str, Sequence[str]] | None = None,
+    month_from: int | None = None,
+    month_to: int | None = None,
+    metrics: Sequence[str] | None = None,
+    stats: Sequence[str] = ("mean",),
+    columnar: bool = False,
+) -> List[Dict] | Dict[str, List]:
+    """Soil aggregates at any level (provincia, distrito, grid cell, month) from the cube."""
+    cube = load_soil_cube()
+    metrics = list(metrics or SOIL_FEATURE_COLS)
+    unknown = [m for m in metrics if m not in cube.metrics] + [s for s in stats if s not in CUBE_STATS]
+    if unknown:
+        raise ValueError(f"Métrica o estadística inválida: {unknown[0]}")
+    columns = cube.columns(cube.query(by, filters, month_from, month_to), metrics, stats)
+    if columnar:
+        return columns
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def _frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _payload_bytes(obj: Any, seen: set | None = None) -> int:
+    """Bytes of the arrays/frames reachable from `obj` (attributes, dicts, lists)."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return 0 if obj.base is not None and id(obj.base) in seen else int(obj.nbytes)
+    if isinstance(obj, pd.DataFrame):
+        return _frame_bytes(obj)
+    if isinstance(obj, dict):
+        return sum(_payload_bytes(v, seen) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_payload_bytes(v, seen) for v in obj)
+    if hasattr(obj, "get_arrays"):  # BallTree de scikit-learn
+        return sum(_payload_bytes(v, seen) for v in obj.get_arrays())
+    if hasattr(obj, "__dict__"):
+        return _payload_bytes(vars(obj), seen)
+    return 0
+
+
+# Estructuras derivadas por dataset; sólo se miden si ya se construyeron (no se fuerzan)
+_DERIVED: Dict[str, Dict[str, Callable[[], Any]]] = {
+    "climate": {"store": load_climate_store, "rollups": load_climate_rollups, "rolling": load_climate_rolling},
+    "soil": {
+        "samples": load_soil_samples,
+        "spatial_index": load_soil_index,
+        "cube": load_soil_cube,
+        "graph_matrices": load_graph_matrices,
+    },
+}
+_BUILDERS: Dict[Callable[[], Any], Any] = {
+    load_climate_store: _build_climate_store,
+    load_climate_rollups: _build_climate_rollups,
+    load_climate_rolling: _build_climate_rolling,
+}
+
+
+def _built(loader: Callable[[], Any]) -> bool:
+    return _BUILDERS.get(loader, loader).cache_info().currsize > 0
+
+
+def loaded_structures() -> List[str]:
+    """Names of the derived structures already in memory (part of the summary ETag)."""
+    return [f"{dataset}.{name}" for dataset, parts in _DERIVED.items() for name, fn in parts.items() if _built(fn)]
+
+
+def memory_report() -> Dict:
+    """Bytes per dataset: the raw frame column by column, plus every derived structure already built."""
+    climate_df, monthly = load_climate()
+    soil_df, soil_grouped, _ = load_soil()
+    report: Dict[str, Dict] = {}
+    for dataset, df, small in (
+        ("climate", climate_df, {"monthly": monthly}),
+        ("soil", soil_df, {"grouped": soil_grouped}),
+    ):
+        usage = df.memory_usage(index=False, deep=True)
+        derived = {name: _frame_bytes(frame) for name, frame in small.items()}
+        for name, fn in _DERIVED[dataset].items():
+            if _built(fn):
+                derived[name] = _payload_bytes(fn())
+        frame_bytes = _frame_bytes(df)
+        report[dataset] = {
+            "compact": COMPACT_DATASETS,
+            "frame_bytes": frame_bytes,
+            "columns": {col: {"dtype": str(df[col].dtype), "bytes": int(usage[col])} for col in df.columns},
+            "derived_bytes": derived,
+            "total_bytes": frame_bytes + sum(derived.values()),
+        }
+    report["total_bytes"] = sum(part["total_bytes"] for part in report.values())
+    return report
+
+
+def _clear_climate_caches() -> None:
+    for loader in (load_climate, _build_climate_store, _build_climate_rollups, _build_climate_rolling):
+        loader.cache_clear()
+    _CLIMATE_LIVE.clear()
+
+
+def clear_caches() -> None:
+    """Forget every loaded dataset, derived structure and ingested state (the next access reloads)."""
+    _clear_climate_caches()
+    for loader in (
+        load_soil,
+        load_soil_samples,
+        load_soil_index,
+        load_soil_cube,
+        load_similarity_index,
+        load_graph_matrices,
+        load_shared,
+    ):
+        loader.cache_clear()
+    _VERSION_PARTS.clear()
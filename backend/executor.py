@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_EXCEPTION, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .config import COMPUTE_MAX_QUEUE, COMPUTE_SHARED_ARRAYS, COMPUTE_TIMEOUT_S, COMPUTE_WORKERS
+from .metrics import COMPUTE_POOL_TASKS, COMPUTE_POOL_UTILIZATION, COMPUTE_TASK_LATENCY, COMPUTE_TASKS
+from .shared_arrays import ArraySpec, SharedArray
+
+
+class ComputeError(Exception):
+    """A task could not be run or finished in the compute pool; carries the HTTP status to answer."""
+
+    status_code = 503
+
+
+class PoolSaturated(ComputeError):
+    status_code = 429
+
+
+class PoolUnavailable(ComputeError):
+    status_code = 503
+
+
+class TaskTimeout(ComputeError):
+    status_code = 504
+
+
+def _preload(modules: Tuple[str, ...]) -> int:
+    # Corre en el worker: importa de antemano los módulos de las tareas (pandas, NumPy...)
+    for module in modules:
+        importlib.import_module(module)
+    return os.getpid()
+
+
+class ComputePool:
+    """Long-lived process pool for CPU-bound work, with bounded depth and shared inputs.
+
+    At most ``workers + max_queue`` tasks are in flight; one more is rejected right
+    away with `PoolSaturated` (429) instead of piling up behind the others. A broken
+    pool raises `PoolUnavailable` (503) and is recreated on the next call. `run`
+    waits up to `timeout` seconds: a task still queued is cancelled, one already
+    running in a worker cannot be interrupted, finishes and its result is dropped.
+    Inputs go to the workers through `share` (a shared memory copy per owner object),
+    so each call pickles a few handles and scalars, not the datasets.
+    """
+
+    def __init__(
+        self,
+        workers: int = COMPUTE_WORKERS,
+        max_queue: int = COMPUTE_MAX_QUEUE,
+        timeout: float = COMPUTE_TIMEOUT_S,
+        max_shared: int = COMPUTE_SHARED_ARRAYS,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_shared = max_shared
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._busy = 0.0  # segundos-worker ocupados (integral de min(inflight, workers))
+        self._started: Optional[float] = None  # la utilización se mide desde que arranca el pool
+        self._last = time.monotonic()
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "rejected": 0, "timeouts": 0}
+        # (id del dueño, nombre) -> (dueño, copia compartida); el dueño se retiene para que su id no se reuse
+        self._shared: "OrderedDict[Tuple[int, str], Tuple[Any, SharedArray]]" = OrderedDict()
+        # Segmento -> tareas enviadas (en cola o corriendo) que lo reciben; no se liberan mientras haya alguna
+        self._pins: Dict[str, int] = {}
+        self._shared_lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+                if self._started is None:
+                    self._started = time.monotonic()
+            return self._executor
+
+    def reset(self) -> None:
+        # Un pool roto (worker muerto) no se recupera: se recrea en la próxima llamada
+        with self._lock:
+            broken, self._executor = self._executor, None
+        if broken is not None:
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    def _tick(self) -> None:
+        # Llamar con self._lock tomado, antes de cambiar _inflight
+        now = time.monotonic()
+        self._busy += min(self._inflight, self.workers) * (now - self._last)
+        self._last = now
+
+    def _count(self, task: str, outcome: str) -> None:
+        self.stats[outcome] += 1
+        COMPUTE_TASKS.inc(task=task, outcome=outcome)
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Queue ``fn(*args, **kwargs)`` in a worker (thread-safe); PoolSaturated if the pool is full."""
+        task = fn.__name__.lstrip("_")
+        with self._lock:
+            if self._inflight >= self.capacity:
+                self._count(task, "rejected")
+                raise PoolSaturated(f"Pool de cómputo saturado ({self._inflight} tareas en curso)")
+            self._tick()
+            self._inflight += 1
+            self.stats["submitted"] += 1
+        specs = [arg for arg in (*args, *kwargs.values()) if isinstance(arg, ArraySpec)]
+        self._pin(specs, 1)
+        submitted = time.monotonic()
+        try:
+            future = self._pool().submit(fn, *args, **kwargs)
+        except (BrokenProcessPool, RuntimeError, OSError) as exc:
+            with self._lock:
+                self._tick()
+                self._inflight -= 1
+            self._pin(specs, -1)
+            self.reset()
+            raise PoolUnavailable(f"Pool de cómputo no disponible: {exc}") from exc
+
+        def _finished(fut: Future) -> None:
+            self._pin(specs, -1)
+            with self._lock:
+                self._tick()
+                self._inflight -= 1
+                if fut.cancelled():
+                    self._count(task, "cancelled")
+                elif fut.exception() is not None:
+                    self._count(task, "failed")
+                else:
+                    self._count(task, "completed")
+            COMPUTE_TASK_LATENCY.observe(time.monotonic() - submitted, task=task)
+
+        future.add_done_callback(_finished)
+        return future
+
+    async def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """Await ``fn(*args, **kwargs)`` from a worker without blocking the event loop or its threads."""
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()  # sólo surte efecto si aún estaba en cola
+            with self._lock:
+                self._count(fn.__name__.lstrip("_"), "timeouts")
+            raise TaskTimeout(f"{fn.__name__.lstrip('_')} superó {timeout or self.timeout:g}s") from None
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BrokenProcessPool as exc:
+            self.reset()
+            raise PoolUnavailable(f"Pool de cómputo no disponible: {exc}") from exc
+
+    def gather(self, futures: List[Future], timeout: Optional[float] = None) -> List[Any]:
+        """Results of ``futures`` in order, blocking; one deadline (default `timeout`) for all of them.
+
+        Raises TimeoutError once the deadline passes with tasks still pending (the caller
+        cancels them), or the first task error as soon as it is known.
+        """
+        timeout = timeout or self.timeout
+        done, pending = wait(futures, timeout=timeout, return_when=FIRST_EXCEPTION)
+        if pending:
+            failed = next((f for f in done if not f.cancelled() and f.exception() is not None), None)
+            if failed is None:
+                raise TimeoutError(f"{len(pending)} de {len(futures)} tareas sin terminar tras {timeout:g}s")
+            failed.result()
+        return [f.result() for f in futures]
+
+    def share(self, owner: Any, name: str, build: Callable[[], np.ndarray]) -> ArraySpec:
+        """Handle to a shared memory copy of ``build()``, made once per (owner object, name).
+
+        Owners are the loaded datasets and graphs, replaced (not mutated) on reload, so a
+        new version gets a new copy. The oldest copies beyond `max_shared` are released,
+        except those passed to a task that has not finished yet (queued tasks attach them
+        later): those are released when their last task ends.
+        """
+        key = (id(owner), name)
+        with self._shared_lock:
+            entry = self._shared.get(key)
+            if entry is not None:
+                self._shared.move_to_end(key)
+                return entry[1].spec
+            shared = SharedArray(build())
+            self._shared[key] = (owner, shared)
+            self._trim(keep=key)
+            return shared.spec
+
+    def _pin(self, specs: List[ArraySpec], delta: int) -> None:
+        if not specs:
+            return
+        with self._shared_lock:
+            for spec in specs:
+                count = self._pins.get(spec.name, 0) + delta
+                if count > 0:
+                    self._pins[spec.name] = count
+                else:
+                    self._pins.pop(spec.name, None)
+            if delta < 0:
+                self._trim()
+
+    def _trim(self, keep: Optional[Tuple[int, str]] = None) -> None:
+        # Llamar con _shared_lock tomado: suelta las copias más viejas sin tareas pendientes
+        excess = len(self._shared) - self.max_shared
+        for key in list(self._shared):
+            if excess <= 0:
+                break
+            shared = self._shared[key][1]
+            if key == keep or self._pins.get(shared.spec.name):
+                continue
+            del self._shared[key]
+            shared.close()
+            excess -= 1
+
+    def prime(self, *modules: str) -> List[int]:
+        """Start every worker and import ``modules`` in it now, instead of on the first request."""
+        futures = [self.submit(_preload, modules) for _ in range(self.workers)]
+        return [f.result(timeout=max(self.timeout, 60)) for f in futures]
+
+    def info(self) -> Dict:
+        with self._lock:
+            self._tick()
+            inflight, busy = self._inflight, self._busy
+            uptime = self._last - self._started if self._started is not None else 0.0
+            stats = dict(self.stats)
+        running = min(inflight, self.workers)
+        return {
+            "workers": self.workers,
+            "started": self._executor is not None,
+            "capacity": self.capacity,
+            "running": running,
+            "queued": inflight - running,
+            "utilization": round(busy / (self.workers * uptime), 4) if uptime > 0 else 0.0,
+            "busy_seconds": round(busy, 3),
+            "shared_arrays": len(self._shared),
+            "shared_bytes": sum(shared.array.nbytes for _, shared in self._shared.values() if shared.array is not None),
+            **stats,
+        }
+
+    def _gauges(self) -> Iterable[Tuple[Dict[str, str], float]]:
+        info = self.info()
+        return [({"state": "running"}, info["running"]), ({"state": "queued"}, info["queued"])]
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        with self._shared_lock:
+            for _, shared in self._shared.values():
+                shared.close()
+            self._shared.clear()
+            self._pins.clear()
+
+
+compute_pool = ComputePool()
+COMPUTE_POOL_TASKS.set_collector(compute_pool._gauges)
+COMPUTE_POOL_UTILIZATION.set_collector(lambda: [({}, compute_pool.info()["utilization"])])
+atexit.register(compute_pool.shutdown)
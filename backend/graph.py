@@ -1,17 +1,30 @@
 from __future__ import annotations
 
 import math
-from dataclasses import dataclass
-from typing import Dict, List, Tuple
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
-from .config import FEATURE_WEIGHT, GEO_WEIGHT, K_NEIGHBORS
+from .config import (
+    FEATURE_WEIGHT,
+    GEO_WEIGHT,
+    GRAPH_BLOCK_ELEMENTS,
+    GRAPH_CACHE_SIZE,
+    GRAPH_SPATIAL_MIN_NODES,
+    K_NEIGHBORS,
+)
+from .metrics import stage_timer
+
+EARTH_RADIUS_KM = 6371
 
 
 def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Return distance in km."""
-    r = 6371
+    r = EARTH_RADIUS_KM
     d_lat = math.radians(lat2 - lat1)
     d_lon = math.radians(lon2 - lon1)
     a = (
@@ -22,20 +35,387 @@ def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return r * c
 
 
+def _haversine_a(lat_a: np.ndarray, lon_a: np.ndarray, lat_b: np.ndarray, lon_b: np.ndarray) -> np.ndarray:
+    lat_a = np.asarray(lat_a, dtype=float)[:, None]
+    lon_a = np.asarray(lon_a, dtype=float)[:, None]
+    lat_b = np.asarray(lat_b, dtype=float)[None, :]
+    lon_b = np.asarray(lon_b, dtype=float)[None, :]
+    d_lat = np.radians(lat_b - lat_a)
+    d_lon = np.radians(lon_b - lon_a)
+    a = np.sin(d_lat / 2) ** 2 + np.cos(np.radians(lat_a)) * np.cos(np.radians(lat_b)) * np.sin(d_lon / 2) ** 2
+    # Redondeo puede dejar a apenas fuera de [0, 1]
+    return np.clip(a, 0.0, 1.0, out=a)
+
+
+def _haversine_from_a(a: np.ndarray) -> np.ndarray:
+    return EARTH_RADIUS_KM * (2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a)))
+
+
+def haversine_matrix(lat_a: np.ndarray, lon_a: np.ndarray, lat_b: np.ndarray, lon_b: np.ndarray) -> np.ndarray:
+    """Vectorized `haversine`: km between every point of A (rows) and every point of B (cols)."""
+    return _haversine_from_a(_haversine_a(lat_a, lon_a, lat_b, lon_b))
+
+
+def feature_distance_matrix(feats_a: np.ndarray, feats_b: np.ndarray) -> np.ndarray:
+    """Euclidean distance between rows of A and rows of B.
+
+    Accumulates column by column, in the same order as the original per-pair loop.
+    """
+    acc = np.zeros((feats_a.shape[0], feats_b.shape[0]))
+    diff = np.empty_like(acc)
+    for c in range(feats_a.shape[1]):
+        np.subtract(feats_a[:, c][:, None], feats_b[:, c][None, :], out=diff)
+        diff *= diff
+        acc += diff
+    return np.sqrt(acc, out=acc)
+
+
+def smallest_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k smallest scores, ties broken by index (like a stable sort)."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        kth = np.partition(scores, k - 1)[k - 1]
+        candidates = np.flatnonzero(scores <= kth)
+    else:
+        candidates = np.arange(len(scores))
+    order = candidates[np.argsort(scores[candidates], kind="stable")]
+    return order[:k]
+
+
+def smallest_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row-wise `smallest_k` over a 2-D block, returning an (rows, k) index array."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < scores.shape[1]:
+        idx = np.argpartition(scores, k - 1, axis=1)[:, :k]
+    else:
+        idx = np.broadcast_to(np.arange(k), scores.shape).copy()
+    vals = np.take_along_axis(scores, idx, axis=1)
+    idx = np.take_along_axis(idx, np.lexsort((idx, vals), axis=1), axis=1)
+    # Empates en el k-ésimo valor: argpartition no garantiza el menor índice
+    kth = vals.max(axis=1)
+    tied = np.flatnonzero((scores <= kth[:, None]).sum(axis=1) > k)
+    for r in tied:
+        idx[r] = smallest_k(scores[r], k)
+    return idx
+
+
 @dataclass
 class ZoneGraph:
     nodes: Dict[str, Dict[str, float]]
     adjacency: Dict[str, List[Tuple[str, float]]]
     directed: Dict[str, List[Tuple[str, float]]]
+    # Vistas CSR derivadas (ver shortest_paths.to_csr), se construyen una vez por grafo
+    _csr: Dict = field(default_factory=dict, init=False, repr=False, compare=False)
+    # Componentes, árbol de expansión mínima y matriz de distancias (ver graph_analytics), una vez por grafo
+    _analytics: Optional[Any] = field(default=None, init=False, repr=False, compare=False)
+
+
+def _graph_inputs(soil_grouped: pd.DataFrame):
+    records = soil_grouped.reset_index(drop=True)
+    feature_cols = [c for c in records.columns if c.endswith("_norm")]
+    names = records["distrito"].tolist()
+    lat = records["lat"].to_numpy(dtype=float)
+    lon = records["lon"].to_numpy(dtype=float)
+    feats = records[feature_cols].to_numpy(dtype=float).reshape(len(records), len(feature_cols))
+    scores = records["soil_score"].to_numpy(dtype=float)
+    nodes = {
+        name: {
+            "lat": float(lat[i]),
+            "lon": float(lon[i]),
+            "soil_score": float(scores[i]),
+            **{c: float(feats[i, j]) for j, c in enumerate(feature_cols)},
+        }
+        for i, name in enumerate(names)
+    }
+    return names, nodes, lat, lon, feats
+
+
+def _assemble_graph(
+    names: List[str],
+    nodes: Dict[str, Dict[str, float]],
+    neighbors: List[np.ndarray],
+    weights: List[np.ndarray],
+) -> ZoneGraph:
+    adjacency: Dict[str, List[Tuple[str, float]]] = {
+        names[i]: [(names[j], float(w)) for j, w in zip(idx.tolist(), ws.tolist())]
+        for i, (idx, ws) in enumerate(zip(neighbors, weights))
+    }
+
+    # Directed edges: flow from mejor a peor calidad
+    directed: Dict[str, List[Tuple[str, float]]] = {k: [] for k in adjacency.keys()}
+    for node, neighs in adjacency.items():
+        node_score = nodes[node]["soil_score"]
+        for neigh, weight in neighs:
+            neigh_score = nodes[neigh]["soil_score"]
+            if node_score >= neigh_score:
+                directed[node].append((neigh, weight))
+
+    return ZoneGraph(nodes=nodes, adjacency=adjacency, directed=directed)
+
+
+def _max_geo_dense(lat: np.ndarray, lon: np.ndarray, block_size: int) -> float:
+    # La distancia crece con `a`, basta reducir `a` y convertir sólo el máximo
+    max_a = 0.0
+    for start in range(0, len(lat), block_size):
+        stop = min(start + block_size, len(lat))
+        block = _haversine_a(lat[start:stop], lon[start:stop], lat, lon)
+        if block.size:
+            max_a = max(max_a, float(block.max()))
+    return float(_haversine_from_a(np.float64(max_a)))
+
+
+def _neighbors_dense(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    feats: np.ndarray,
+    max_geo: float,
+    k_neighbors: int,
+    feature_weight: float,
+    geo_weight: float,
+    block_size: int,
+) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """Exact k-NN under the combined distance, one row block (block_size × n) at a time."""
+    n = len(lat)
+    neighbors: List[np.ndarray] = []
+    weights: List[np.ndarray] = []
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        geo = haversine_matrix(lat[start:stop], lon[start:stop], lat, lon)
+        feat = feature_distance_matrix(feats[start:stop], feats)
+        combined = feature_weight * feat + geo_weight * (geo / max_geo)
+        rows = np.arange(stop - start)
+        combined[rows, rows + start] = np.inf  # excluye el propio nodo
+        idx = smallest_k_rows(combined, min(k_neighbors, n - 1))
+        neighbors.extend(idx)
+        weights.extend(np.take_along_axis(combined, idx, axis=1))
+    return neighbors, weights
+
 
+def _max_geo_spatial(lat: np.ndarray, lon: np.ndarray, block_size: int) -> float:
+    """Exact diameter without the n² pass: hull candidates + ball-tree verification."""
+    from scipy.spatial import ConvexHull
+    from sklearn.neighbors import BallTree
 
+    n = len(lat)
+    # Candidatos: vértices del casco convexo en proyección equirectangular
+    x = np.radians(lon) * np.cos(np.radians(np.mean(lat)))
+    y = np.radians(lat)
+    try:
+        hull_idx = ConvexHull(np.column_stack([x, y])).vertices
+    except Exception:  # puntos colineales o repetidos
+        hull_idx = np.arange(n)
+    max_geo = _max_geo_dense(lat[hull_idx], lon[hull_idx], max(1, block_size * n // max(len(hull_idx), 1)))
+
+    # Verifica: todo punto con algún vecino fuera del radio max_geo se recalcula exacto
+    tree = BallTree(np.radians(np.column_stack([lat, lon])), metric="haversine")
+    radius = max_geo / EARTH_RADIUS_KM * (1 - 1e-9)
+    counts = tree.query_radius(np.radians(np.column_stack([lat, lon])), r=radius, count_only=True)
+    suspects = np.flatnonzero(counts < n)
+    for start in range(0, len(suspects), block_size):
+        rows = suspects[start : start + block_size]
+        max_geo = max(max_geo, float(haversine_matrix(lat[rows], lon[rows], lat, lon).max()))
+    return max_geo
+
+
+def _neighbors_spatial(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    feats: np.ndarray,
+    max_geo: float,
+    k_neighbors: int,
+    feature_weight: float,
+    geo_weight: float,
+) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """Exact k-NN using a KD-tree (features) and a ball tree (geo) to generate candidates.
+
+    For each node the union of its m nearest neighbours in feature space and in
+    geographic space is scored exactly. Any node outside both lists is at least
+    ``fw * f_m + gw * g_m / max_geo`` away, so the top-k is final once the k-th
+    candidate score is strictly below that bound; otherwise m doubles.
+    """
+    from sklearn.neighbors import BallTree, KDTree
+
+    n = len(lat)
+    k = min(k_neighbors, n - 1)
+    coords = np.radians(np.column_stack([lat, lon]))
+    geo_tree = BallTree(coords, metric="haversine")
+    feat_tree = KDTree(feats) if feats.shape[1] else None
+
+    neighbors: List[np.ndarray] = [np.empty(0, dtype=np.int64)] * n
+    weights: List[np.ndarray] = [np.empty(0)] * n
+    pending = np.arange(n)
+    m = max(4 * k, 16)
+    while len(pending):
+        m_eff = min(m + 1, n)
+        geo_d, geo_i = geo_tree.query(coords[pending], k=m_eff)
+        geo_d = geo_d * EARTH_RADIUS_KM
+        if feat_tree is not None:
+            feat_d, feat_i = feat_tree.query(feats[pending], k=m_eff)
+        else:
+            feat_d, feat_i = np.zeros_like(geo_d), geo_i
+        exhaustive = m_eff >= n
+        retry: List[int] = []
+        for row, node in enumerate(pending.tolist()):
+            cand = np.union1d(geo_i[row], feat_i[row])
+            cand = cand[cand != node]
+            geo = haversine_matrix(lat[node : node + 1], lon[node : node + 1], lat[cand], lon[cand])[0]
+            feat = feature_distance_matrix(feats[node : node + 1], feats[cand])[0]
+            combined = feature_weight * feat + geo_weight * (geo / max_geo)
+            sel = smallest_k(combined, k)
+            if not exhaustive and k:
+                bound = feature_weight * feat_d[row, -1] + geo_weight * (geo_d[row, -1] / max_geo)
+                if not combined[sel[-1]] < bound * (1 - 1e-9):
+                    retry.append(node)
+                    continue
+            neighbors[node] = cand[sel]
+            weights[node] = combined[sel]
+        pending = np.asarray(retry, dtype=np.int64)
+        m *= 2
+    return neighbors, weights
+
+
+@stage_timer("build_zone_graph")
 def build_zone_graph(
     soil_grouped: pd.DataFrame,
     k_neighbors: int = K_NEIGHBORS,
     feature_weight: float = FEATURE_WEIGHT,
     geo_weight: float = GEO_WEIGHT,
+    method: str = "auto",
+    block_size: int | None = None,
 ) -> ZoneGraph:
-    """Create an undirected + directed graph from district soil features."""
+    """Create an undirected + directed graph from district soil features.
+
+    ``method="dense"`` computes distance matrices with NumPy broadcasting in row
+    blocks of ``block_size`` rows (default: GRAPH_BLOCK_ELEMENTS // n, so memory
+    stays bounded); ``method="spatial"`` uses KD/ball trees and
+    avoids the n² pass, for large n. ``"auto"`` switches at GRAPH_SPATIAL_MIN_NODES.
+    Both return the same nodes, neighbours and edge order as the original pairwise
+    loops; edge weights may differ in the last ulp (NumPy vs libm atan2/pow), see
+    `zone_graphs_match`.
+    """
+    names, nodes, lat, lon, feats = _graph_inputs(soil_grouped)
+    n = len(names)
+    if method == "auto":
+        method = "spatial" if n >= GRAPH_SPATIAL_MIN_NODES else "dense"
+    if method not in ("dense", "spatial"):
+        raise ValueError(f"Método de grafo inválido: {method}")
+    block_size = block_size or max(1, GRAPH_BLOCK_ELEMENTS // max(n, 1))
+    if n < 2:
+        return _assemble_graph(names, nodes, [np.empty(0, dtype=np.int64)] * n, [np.empty(0)] * n)
+
+    if method == "spatial":
+        max_geo = _max_geo_spatial(lat, lon, block_size) or 1.0
+        neighbors, weights = _neighbors_spatial(lat, lon, feats, max_geo, k_neighbors, feature_weight, geo_weight)
+    else:
+        max_geo = _max_geo_dense(lat, lon, block_size) or 1.0
+        neighbors, weights = _neighbors_dense(
+            lat, lon, feats, max_geo, k_neighbors, feature_weight, geo_weight, block_size
+        )
+    return _assemble_graph(names, nodes, neighbors, weights)
+
+
+@dataclass
+class GraphMatrices:
+    """Weight-independent inputs of the zone graph: n×n feature and normalized geo distances."""
+
+    names: List[str]
+    nodes: Dict[str, Dict[str, float]]
+    feature_dist: np.ndarray
+    geo_norm: np.ndarray
+
+
+@stage_timer("precompute_graph_matrices")
+def precompute_graph_matrices(soil_grouped: pd.DataFrame) -> GraphMatrices:
+    """Compute both distance matrices once (dense, meant for district-level n)."""
+    names, nodes, lat, lon, feats = _graph_inputs(soil_grouped)
+    geo = haversine_matrix(lat, lon, lat, lon)
+    max_geo = _max_geo_dense(lat, lon, max(len(lat), 1)) or 1.0
+    return GraphMatrices(
+        names=names,
+        nodes=nodes,
+        feature_dist=feature_distance_matrix(feats, feats),
+        geo_norm=geo / max_geo,
+    )
+
+
+@stage_timer("graph_from_matrices")
+def graph_from_matrices(
+    matrices: GraphMatrices,
+    k_neighbors: int = K_NEIGHBORS,
+    feature_weight: float = FEATURE_WEIGHT,
+    geo_weight: float = GEO_WEIGHT,
+) -> ZoneGraph:
+    """Derive the graph for a weight pair as a linear combination of the precomputed matrices."""
+    n = len(matrices.names)
+    combined = feature_weight * matrices.feature_dist + geo_weight * matrices.geo_norm
+    np.fill_diagonal(combined, np.inf)  # excluye el propio nodo
+    idx = smallest_k_rows(combined, min(k_neighbors, n - 1)) if n > 1 else np.empty((n, 0), dtype=np.int64)
+    weights = np.take_along_axis(combined, idx, axis=1)
+    return _assemble_graph(matrices.names, matrices.nodes, list(idx), list(weights))
+
+
+class ZoneGraphCache:
+    """Thread-safe LRU of zone graphs keyed by (weights, k_neighbors, dataset version)."""
+
+    def __init__(self, matrices: GraphMatrices, version: str, maxsize: int = GRAPH_CACHE_SIZE):
+        self.matrices = matrices
+        self.version = version
+        self.maxsize = maxsize
+        self._graphs: "OrderedDict[Tuple, ZoneGraph]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        feature_weight: float = FEATURE_WEIGHT,
+        geo_weight: float = GEO_WEIGHT,
+        k_neighbors: int = K_NEIGHBORS,
+    ) -> ZoneGraph:
+        key = (float(feature_weight), float(geo_weight), int(k_neighbors), self.version)
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is not None:
+                self._graphs.move_to_end(key)
+                return graph
+        # Se calcula fuera del lock; dos hilos con la misma clave producen el mismo grafo
+        graph = graph_from_matrices(self.matrices, k_neighbors, feature_weight, geo_weight)
+        with self._lock:
+            self._graphs[key] = graph
+            self._graphs.move_to_end(key)
+            while len(self._graphs) > self.maxsize:
+                self._graphs.popitem(last=False)
+        return graph
+
+
+def zone_graphs_match(a: ZoneGraph, b: ZoneGraph, rel_tol: float = 1e-12) -> bool:
+    """True if both graphs have the same nodes and edges, with weights equal up to rel_tol."""
+    if a.nodes != b.nodes:
+        return False
+    for edges_a, edges_b in ((a.adjacency, b.adjacency), (a.directed, b.directed)):
+        if edges_a.keys() != edges_b.keys():
+            return False
+        for node, neighs in edges_a.items():
+            other = edges_b[node]
+            if [v for v, _ in neighs] != [v for v, _ in other]:
+                return False
+            if not all(math.isclose(w1, w2, rel_tol=rel_tol) for (_, w1), (_, w2) in zip(neighs, other)):
+                return False
+    return True
+
+
+def build_zone_graph_reference(
+    soil_grouped: pd.DataFrame,
+    k_neighbors: int = K_NEIGHBORS,
+    feature_weight: float = FEATURE_WEIGHT,
+    geo_weight: float = GEO_WEIGHT,
+) -> ZoneGraph:
+    """Original pairwise-loop builder (O(n²) Python loops), kept to validate `build_zone_graph` output.
+
+    The benchmark suite checks both methods against it on a subset of districts.
+    """
     records = soil_grouped.copy().reset_index(drop=True)
     feature_cols = [c for c in records.columns if c.endswith("_norm")]
     nodes = {
@@ -48,7 +428,6 @@ def build_zone_graph(
         for row in records.itertuples(index=False)
     }
 
-   
     geo_distances: Dict[Tuple[str, str], float] = {}
     max_geo = 0.0
     for i, row_i in records.iterrows():
@@ -82,7 +461,6 @@ def build_zone_graph(
         distances.sort(key=lambda x: x[1])
         adjacency[row_i.distrito] = distances[:k_neighbors]
 
-    # Directed edges: flow from mejor a peor calidad
     directed: Dict[str, List[Tuple[str, float]]] = {k: [] for k in adjacency.keys()}
     for node, neighs in adjacency.items():
         node_score = nodes[node]["soil_score"]
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import logging
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .climate_store import nan_to_none
+from .config import GRAPH_APSP_PARALLEL_MIN_NODES
+from .executor import PoolUnavailable, TaskTimeout, compute_pool
+from .graph import ZoneGraph
+from .metrics import stage_timer
+from .shared_arrays import ArraySpec
+from .shortest_paths import CSRGraph, attach_csr, resolve_method, solve, to_csr
+
+logger = logging.getLogger(__name__)
+
+
+class UnionFind:
+    """Disjoint sets over nodes 0..n-1 (union by size, path halving)."""
+
+    def __init__(self, n: int):
+        # Listas y no arrays: el bucle toca un elemento por vez
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> bool:
+        """Merge the sets of ``a`` and ``b``; False if they already were the same set."""
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return False
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+        return True
+
+    def labels(self) -> np.ndarray:
+        """Set id per node, numbered in order of each set's first node."""
+        ids: Dict[int, int] = {}
+        return np.array([ids.setdefault(self.find(x), len(ids)) for x in range(len(self.parent))], dtype=np.int64)
+
+
+def undirected_edges(csr: CSRGraph) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(u, v, weight) with u < v, one per node pair: the cheaper direction of each k-NN edge."""
+    u = np.minimum(csr.sources, csr.indices)
+    v = np.maximum(csr.sources, csr.indices)
+    keep = u != v
+    u, v, w = u[keep], v[keep], csr.weights[keep]
+    order = np.lexsort((w, v, u))
+    u, v, w = u[order], v[order], w[order]
+    first = np.ones(len(u), dtype=bool)
+    first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+    return u[first], v[first], w[first]
+
+
+def connected_components(n: int, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Component id per node (edges taken as undirected)."""
+    sets = UnionFind(n)
+    for a, b in zip(u.tolist(), v.tolist()):
+        sets.union(a, b)
+    return sets.labels()
+
+
+def minimum_spanning_tree(n: int, u: np.ndarray, v: np.ndarray, w: np.ndarray) -> np.ndarray:
+    """Kruskal: indices of the edges in a minimum spanning forest (one tree per component).
+
+    Ties in weight are broken by (u, v), so the forest is deterministic.
+    """
+    sets = UnionFind(n)
+    picked = []
+    for e in np.lexsort((v, u, w)).tolist():
+        if sets.union(int(u[e]), int(v[e])):
+            picked.append(e)
+            if len(picked) == n - 1:
+                break
+    return np.array(picked, dtype=np.int64)
+
+
+def _distance_rows(csr: CSRGraph, sources: Sequence[int], method: str) -> np.ndarray:
+    # Una búsqueda por origen; cada fila es el arreglo de distancias de esa búsqueda
+    rows = np.empty((len(sources), len(csr.indptr) - 1))
+    for i, s in enumerate(sources):
+        rows[i] = solve(csr, [s], method).dist
+    return rows
+
+
+def _distance_rows_task(
+    indptr: ArraySpec, indices: ArraySpec, weights: ArraySpec, sources: List[int], method: str
+) -> np.ndarray:
+    # Corre en el worker: CSR desde memoria compartida, igual que las consultas de /algorithms/bellman-ford
+    return _distance_rows(attach_csr(indptr, indices, weights), sources, method)
+
+
+def all_pairs_distances(graph: ZoneGraph, parallel: bool = True) -> np.ndarray:
+    """n × n shortest-path costs over ``graph.adjacency`` (row = origin; inf = unreachable).
+
+    One Dijkstra per origin (Bellman–Ford if a weight is negative), the same search
+    as `/algorithms/bellman-ford`. From GRAPH_APSP_PARALLEL_MIN_NODES nodes the origins
+    are split in contiguous blocks over the compute pool, which reads the graph's CSR
+    arrays from shared memory; a broken pool falls back to the current process.
+    """
+    csr = to_csr(graph)
+    n = len(csr.names)
+    method = resolve_method(csr)
+    if not (parallel and n >= GRAPH_APSP_PARALLEL_MIN_NODES and n > 1):
+        return _distance_rows(csr, range(n), method)
+
+    specs = [
+        compute_pool.share(graph, f"csr:{name}", lambda a=getattr(csr, name): a)
+        for name in ("indptr", "indices", "weights")
+    ]
+    blocks = np.array_split(np.arange(n), min(n, compute_pool.workers))
+    futures = []
+    try:
+        for block in blocks:
+            futures.append(compute_pool.submit(_distance_rows_task, *specs, block.tolist(), method))
+        return np.vstack(compute_pool.gather(futures))  # un solo plazo para todos los bloques
+    except (BrokenProcessPool, PoolUnavailable, OSError) as exc:
+        logger.warning("Pool de procesos no disponible, calculando distancias en el proceso actual: %s", exc)
+        compute_pool.reset()
+        return _distance_rows(csr, range(n), method)
+    except BaseException as exc:
+        for future in futures:  # saturado o timeout: no deja bloques huérfanos en la cola
+            future.cancel()
+        if isinstance(exc, TimeoutError):
+            raise TaskTimeout(f"La matriz de distancias superó {compute_pool.timeout:g}s") from None
+        raise
+
+
+class GraphAnalytics:
+    """Whole-graph structure of one zone graph, computed once per graph (weights + dataset version).
+
+    - ``components``: weakly connected component of each district (union-find over
+      the k-NN edges taken as undirected).
+    - minimum spanning forest (Kruskal over the same undirected edges).
+    - ``distances``: dense all-pairs matrix of directed shortest-path costs (8·n² bytes,
+      the same values as `/algorithms/bellman-ford`), so a pair or a row is an O(1)
+      lookup instead of a single-source search per origin.
+    """
+
+    def __init__(self, graph: ZoneGraph, parallel: bool = True):
+        csr = to_csr(graph)
+        self.names = csr.names
+        self.index = csr.index
+        n = len(self.names)
+        u, v, w = undirected_edges(csr)
+        self.edges = int(csr.indices.size)
+        self.components = connected_components(n, u, v)
+        self.component_sizes = np.bincount(self.components)
+        mst = minimum_spanning_tree(n, u, v, w)
+        self.mst_u, self.mst_v, self.mst_w = u[mst], v[mst], w[mst]
+        self.distances = all_pairs_distances(graph, parallel)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def rows(self, names: Sequence[str]) -> List[int]:
+        missing = [name for name in names if name not in self.index]
+        if missing:
+            raise KeyError(missing[0])
+        return [self.index[name] for name in names]
+
+    def distance(self, a: str, b: str) -> Optional[float]:
+        """Cost of the cheapest route a -> b (None if unreachable)."""
+        i, j = self.rows([a, b])
+        d = float(self.distances[i, j])
+        return d if np.isfinite(d) else None
+
+    def submatrix(self, sources: Sequence[str], targets: Sequence[str]) -> List[List[Optional[float]]]:
+        """Distances between every source (rows) and every target (columns), None if unreachable."""
+        block = self.distances[np.ix_(self.rows(sources), self.rows(targets))]
+        block[np.isinf(block)] = np.nan
+        return [nan_to_none(row) for row in block]
+
+    def summary(self, list_members: bool = True) -> Dict:
+        names = np.asarray(self.names, dtype=object)
+        components = []
+        for cid, size in enumerate(self.component_sizes.tolist()):
+            component = {"id": cid, "size": size}
+            if list_members:
+                component["members"] = names[self.components == cid].tolist()
+            components.append(component)
+        reachable = np.isfinite(self.distances)
+        np.fill_diagonal(reachable, False)
+        return {
+            "nodes": len(self),
+            "edges": self.edges,
+            "components": components,
+            "mst": {
+                "total_weight": float(self.mst_w.sum()),
+                "edges": [
+                    {"from": names[a], "to": names[b], "weight": weight}
+                    for a, b, weight in zip(self.mst_u.tolist(), self.mst_v.tolist(), self.mst_w.tolist())
+                ],
+            },
+            "distances": {
+                "reachable_pairs": int(reachable.sum()),
+                "bytes": int(self.distances.nbytes),
+            },
+        }
+
+
+@stage_timer("graph_analytics")
+def graph_analytics(graph: ZoneGraph, parallel: bool = True) -> GraphAnalytics:
+    """`GraphAnalytics` of ``graph``, built on first use and kept with the graph (like its CSR views)."""
+    analytics = graph._analytics
+    if analytics is None:
+        # Dos hilos con el mismo grafo producen el mismo resultado; gana el último
+        analytics = graph._analytics = GraphAnalytics(graph, parallel)
+    return analytics
@@ -2,29 +2,89 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Any, Callable, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException, Query
+import pandas as pd
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import ValidationError
 
 from . import algorithms
-from .config import DEFAULT_KMEANS_K, DEFAULT_SORT_LIMIT, FEATURE_WEIGHT, GEO_WEIGHT
+from .aggregation import PARTITION_SCHEMES
+from .batch import BATCH_OPERATIONS, BatchRequest, plan_key
+from .config import (
+    ANOMALY_Z,
+    COMPUTE_RETRY_AFTER_S,
+    DEFAULT_KMEANS_K,
+    DEFAULT_SORT_LIMIT,
+    FEATURE_WEIGHT,
+    GEO_WEIGHT,
+    GZIP_MIN_BYTES,
+    SHARED_DATASETS,
+    SHARED_POLL_S,
+    WARMUP_RETRY_AFTER_S,
+)
 from .data_loader import (
+    climate_rolling_series,
+    climate_rollup_series,
     climate_timeseries,
     dataset_summary,
+    dataset_version,
     load_climate,
+    load_climate_rolling,
+    load_climate_rollups,
+    load_climate_store,
+    load_graph_matrices,
+    load_shared,
     load_soil,
+    load_soil_index,
+    load_soil_cube,
+    load_soil_samples,
+    load_similarity_index,
+    loaded_structures,
+    refresh_shared,
+    shared_version,
+    soil_cube_query,
     soil_zones,
 )
-from .graph import build_zone_graph
+from .climate_ingest import ClimateBatch, ingest_rows
+from .climate_rollups import DOWNSAMPLE_MODES, RESOLUTIONS
+from .clustering import KMEANS_MODES
+from .executor import ComputeError, compute_pool
+from .graph import ZoneGraph, ZoneGraphCache
+from .graph_analytics import GraphAnalytics, graph_analytics
+from .metrics import MetricsMiddleware, get_profile, render_metrics
+from .result_cache import ResultCache
+from .responses import (
+    RESPONSE_FORMATS,
+    FastJSONResponse,
+    body_etag,
+    cached_json,
+    not_modified,
+    request_etag,
+    to_columns,
+)
+from .similarity import SIMILARITY_LEVELS, SimilarityIndex, SimilarityRequest, similar
+from .spatial_index import sample_records
+from .soil_cube import CUBE_DIMENSIONS, parse_month
+from .soil_export import EXPORT_FORMATS, EXPORT_SOURCES, SampleFilter, export_samples, parse_range
+from .sorting import SORT_METHODS, parse_sort_keys
+from .warmup import NotReady, Warmup
 
 logger = logging.getLogger("agrofuturo.api")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
 
+# Resultados deterministas de /algorithms/* por (endpoint, parámetros, versión del dataset)
+result_cache = ResultCache()
+
 app = FastAPI(
     title="AgroFuturo Analytics API",
     description="Backend en FastAPI para algoritmos de clima/suelo en Huancayo.",
     version="0.1.0",
+    default_response_class=FastJSONResponse,
 )
 
 app.add_middleware(
@@ -33,83 +93,617 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Profile-Id"],
 )
+# Comprime respuestas grandes (series y rankings) si el cliente acepta gzip
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES)
+# Latencia por ruta (histogramas en /metrics) y profiler por muestreo opcional vía header
+app.add_middleware(MetricsMiddleware)
+
+
+def _build_graph_cache(previous: Optional[ZoneGraphCache] = None) -> ZoneGraphCache:
+    # Matrices de distancia independientes de los pesos; cada par de pesos es una combinación lineal
+    matrices = load_graph_matrices()
+    if previous is not None and previous.matrices is matrices:
+        # Suelo sin cambios (versión compartida tras una ingesta de clima): grafos y analítica siguen valiendo
+        return previous
+    graph_cache = ZoneGraphCache(matrices, dataset_version())
+    graph_cache.get(FEATURE_WEIGHT, GEO_WEIGHT)
+    return graph_cache
+
+
+def _build_graph_analytics(graph_cache: ZoneGraphCache) -> GraphAnalytics:
+    # Componentes, árbol mínimo y distancias de todos los pares del grafo con los pesos por defecto
+    return graph_analytics(graph_cache.get(FEATURE_WEIGHT, GEO_WEIGHT))
+
+
+def _build_warmup(previous: Optional[Warmup] = None) -> Warmup:
+    warmup = Warmup()
+    served = previous.components.get("graph") if previous is not None else None
+    graph_cache = served.value if served is not None and served.state == "ready" else None
+    # Modo compartido: primero se adjunta (o publica) la versión mapeada en memoria
+    roots = ("shared",) if SHARED_DATASETS else ()
+    if SHARED_DATASETS:
+        warmup.add("shared", load_shared)
+    warmup.add("climate", load_climate, deps=roots)
+    warmup.add("climate_store", load_climate_store, deps=("climate",))
+    warmup.add("climate_rollups", load_climate_rollups, deps=("climate_store",))
+    warmup.add("climate_rolling", load_climate_rolling, deps=("climate_store",))
+    warmup.add("soil", load_soil, deps=roots)
+    warmup.add("soil_samples", load_soil_samples, deps=("soil",))
+    warmup.add("similarity_district", lambda: load_similarity_index("district"), deps=("soil",))
+    warmup.add("similarity_sample", lambda: load_similarity_index("sample"), deps=("soil_samples",))
+    warmup.add("soil_index", load_soil_index, deps=("soil",))
+    warmup.add("soil_cube", load_soil_cube, deps=("soil",))
+    warmup.add("graph", lambda: _build_graph_cache(graph_cache), deps=("soil",))
+    warmup.add("graph_analytics", lambda: _build_graph_analytics(warmup.components["graph"].value), deps=("graph",))
+    # Arranca los workers (e importa las tareas) antes del primer request
+    warmup.add("compute_pool", lambda: compute_pool.prime(algorithms.__name__))
+    return warmup
 
 
 @app.on_event("startup")
 async def startup_event():
-    # Preload datasets and graph
-    climate_df, _ = load_climate()
-    _, soil_grouped, norm_meta = load_soil()
-    app.state.graph = build_zone_graph(soil_grouped)
-    app.state.soil_grouped = soil_grouped
-    app.state.norm_meta = norm_meta
-    app.state.climate_df = climate_df
-    logger.info("Backend listo con %s muestras de clima y %s distritos de suelo", len(climate_df), len(soil_grouped))
+    # No bloquea: datasets y estructuras derivadas se cargan en segundo plano (ver /ready)
+    app.state.warmup = _build_warmup()
+    app.state.warmup.start()
+    if SHARED_DATASETS:
+        app.state.shared_follower = asyncio.ensure_future(_follow_shared_versions())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    follower = getattr(app.state, "shared_follower", None)
+    if follower is not None:
+        follower.cancel()
+    compute_pool.shutdown()
+
+
+async def _follow_shared_versions() -> None:
+    """Swap this worker to each newly published shared version, without restarting it.
+
+    The new warmup loads in the background; requests keep using the previous one
+    (and its mapped files) until every component of the new one has finished.
+    """
+    while True:
+        await asyncio.sleep(SHARED_POLL_S)
+        try:
+            await asyncio.to_thread(refresh_shared)
+        except Exception:
+            logger.exception("No se pudo adoptar la versión compartida nueva")
+            continue
+        served = app.state.warmup.components["shared"]
+        if served.state in ("pending", "loading"):
+            continue
+        if served.state == "ready" and served.value.version == shared_version():
+            continue
+        warmup = _build_warmup(app.state.warmup)
+        warmup.start()
+        await warmup.join()
+        app.state.warmup = warmup
+        logger.info("Worker sirviendo la versión compartida %s", shared_version())
+
+
+async def _require(*components: str):
+    """Loaded value(s) of warmup components; NotReady (-> 503) if still loading after the wait or failed."""
+    return await app.state.warmup.wait(*components)
+
+
+@app.exception_handler(NotReady)
+async def not_ready_handler(request: Request, exc: NotReady):
+    detail = {"component": exc.name, "state": exc.state}
+    if exc.error:
+        detail["error"] = exc.error
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Datos aún no disponibles", **detail},
+        headers={"Retry-After": str(WARMUP_RETRY_AFTER_S)},
+    )
+
+
+@app.exception_handler(ComputeError)
+async def compute_error_handler(request: Request, exc: ComputeError):
+    # 429 cola llena, 503 pool caído, 504 la tarea superó COMPUTE_TIMEOUT_S
+    headers = {"Retry-After": str(COMPUTE_RETRY_AFTER_S)} if exc.status_code != 504 else None
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)}, headers=headers)
 
 
 @app.get("/health")
 async def health():
+    # Vivo (proceso arriba); /ready dice si los datos ya están cargados
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def ready(wait: float = Query(0, ge=0, le=600, description="Segundos a esperar a que todo esté listo")):
+    warmup = app.state.warmup
+    if wait and not warmup.is_ready():
+        await warmup.wait_all(wait)
+    status = warmup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+def _check_format(fmt: str) -> bool:
+    fmt = fmt.lower()
+    if fmt not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail="Formato inválido, usa rows o columnar")
+    return fmt == "columnar"
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Formato de texto de Prometheus
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/profiles/{profile_id}", response_class=PlainTextResponse)
+async def debug_profile(profile_id: str):
+    # Pilas colapsadas (flamegraph.pl / speedscope) del request marcado con X-Profile
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return PlainTextResponse(profile)
+
+
+@app.get("/debug/pool")
+async def debug_pool():
+    # Estado del pool de cómputo: workers, tareas corriendo/en cola, utilización y rechazos
+    return compute_pool.info()
+
+
 @app.get("/datasets/summary")
-async def datasets_summary():
-    return dataset_summary()
+async def datasets_summary(request: Request):
+    await _require("climate", "soil")
+    # El reporte de memoria cambia al construirse estructuras derivadas: forman parte del ETag
+    etag = request_etag(request, "|".join([dataset_version(), *loaded_structures()]))
+    return not_modified(request, etag) or cached_json(dataset_summary(), etag)
 
 
 @app.get("/soil/zones")
-async def get_soil_zones(limit: int = Query(50, ge=1, le=200)):
-    return {"zones": soil_zones(limit)}
+async def get_soil_zones(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    format: str = Query("rows", description="rows (lista de objetos) | columnar (un arreglo por campo)"),
+):
+    columnar = _check_format(format)
+    await _require("soil")
+    etag = request_etag(request, dataset_version())
+    return not_modified(request, etag) or cached_json({"zones": soil_zones(limit, columnar=columnar)}, etag)
+
+
+@app.get("/soil/cube")
+async def get_soil_cube(
+    request: Request,
+    by: str = Query("distrito", description="Dimensiones (coma): provincia, distrito, cell, month; vacío = total"),
+    provincia: Optional[List[str]] = Query(None),
+    distrito: Optional[List[str]] = Query(None),
+    cell: Optional[List[str]] = Query(None, description="Celdas de grilla fila:columna (repetible)"),
+    start: Optional[str] = Query(None, alias="from", description="Mes inicial YYYY-MM (fecha_muestra, inclusive)"),
+    end: Optional[str] = Query(None, alias="to", description="Mes final YYYY-MM (inclusive)"),
+    metrics: Optional[str] = Query(None, description="Métricas separadas por coma (default: variables de K-Means)"),
+    stats: str = Query("mean", description="count, mean, std, min, max, sum (coma)"),
+    format: str = Query("rows", description="rows (lista de objetos) | columnar (un arreglo por campo)"),
+):
+    columnar = _check_format(format)
+    await _require("soil_cube")
+    etag = request_etag(request, dataset_version())
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    payload = await asyncio.to_thread(
+        _soil_cube_payload, by, provincia, distrito, cell, start, end, metrics, stats, columnar
+    )
+    return cached_json(payload, etag)
+
+
+def _soil_cube_payload(
+    by: str,
+    provincia: Optional[List[str]],
+    distrito: Optional[List[str]],
+    cell: Optional[List[str]],
+    start: Optional[str],
+    end: Optional[str],
+    metrics: Optional[str],
+    stats: str,
+    columnar: bool,
+) -> dict:
+    dims = [dim.strip() for dim in by.split(",") if dim.strip()]
+    try:
+        groups = soil_cube_query(
+            dims,
+            {"provincia": provincia, "distrito": distrito, "cell": cell},
+            parse_month(start) if start else None,
+            parse_month(end) if end else None,
+            [m.strip() for m in metrics.split(",") if m.strip()] if metrics else None,
+            [s.strip() for s in stats.split(",") if s.strip()] or ["mean"],
+            columnar=columnar,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"by": [dim for dim in CUBE_DIMENSIONS if dim in dims], "groups": groups}
+
+
+@app.get("/soil/samples/export")
+async def export_soil_samples(
+    format: str = Query("ndjson", description="ndjson | csv"),
+    distrito: Optional[List[str]] = Query(None),
+    provincia: Optional[List[str]] = Query(None),
+    start: Optional[datetime] = Query(None, alias="from", description="fecha_muestra desde (ISO-8601, inclusive)"),
+    end: Optional[datetime] = Query(None, alias="to", description="fecha_muestra hasta (ISO-8601, inclusive)"),
+    range_: Optional[List[str]] = Query(None, alias="range", description="columna:min:max, p.ej. pH:5.5:7"),
+    limit: Optional[int] = Query(None, ge=1),
+    source: str = Query("auto", description="auto | memory (frame cargado) | csv (lectura por partes)"),
+):
+    fmt, source = format.lower(), source.lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Formato inválido, usa ndjson o csv")
+    if source not in EXPORT_SOURCES:
+        raise HTTPException(status_code=400, detail="Fuente inválida, usa auto, memory o csv")
+    try:
+        ranges = [parse_range(spec) for spec in range_ or []]
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if source == "memory":
+        await _require("soil")
+    filt = SampleFilter(
+        distritos=distrito or (),
+        provincias=provincia or (),
+        # fecha_muestra no tiene zona horaria: se compara en hora local del dataset
+        date_from=pd.Timestamp(start).tz_localize(None) if start else None,
+        date_to=pd.Timestamp(end).tz_localize(None) if end else None,
+        ranges={col: (low, high) for col, low, high in ranges},
+    )
+    # Generador síncrono: Starlette lo consume en el threadpool, un chunk a la vez
+    return StreamingResponse(
+        export_samples(filt, fmt, source, limit),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="muestras_suelo.{fmt}"'},
+    )
+
+
+@app.get("/soil/samples/bbox")
+async def soil_samples_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    limit: int = Query(1000, ge=1, le=50000),
+):
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="La caja debe cumplir min_lat <= max_lat y min_lon <= max_lon")
+    soil_index, (df, _, _) = await _require("soil_index", "soil")
+    return await asyncio.to_thread(_samples_payload, df, soil_index.bbox, (min_lat, min_lon, max_lat, max_lon), limit)
+
+
+@app.get("/soil/samples/radius")
+async def soil_samples_radius(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(..., gt=0, le=500),
+    limit: int = Query(1000, ge=1, le=50000),
+):
+    soil_index, (df, _, _) = await _require("soil_index", "soil")
+    return await asyncio.to_thread(_samples_payload, df, soil_index.radius, (lat, lon, radius_km), limit)
+
+
+@app.get("/soil/samples/nearest")
+async def soil_samples_nearest(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, ge=1, le=1000),
+):
+    soil_index, (df, _, _) = await _require("soil_index", "soil")
+    return await asyncio.to_thread(_samples_payload, df, soil_index.nearest, (lat, lon, k), k)
+
+
+def _samples_payload(df: pd.DataFrame, query: Callable, args: tuple, limit: int) -> dict:
+    # Consulta al índice y armado de hasta `limit` filas, fuera del event loop
+    found = query(*args)
+    positions, dist = found if isinstance(found, tuple) else (found, None)
+    samples = sample_records(df, positions[:limit], None if dist is None else dist[:limit])
+    return {"count": int(len(positions)), "samples": samples}
+
+
+@app.post("/soil/similar")
+async def soil_similar(body: SimilarityRequest):
+    # Top-k distritos o muestras con el perfil de suelo más parecido (varios perfiles por consulta)
+    if body.level not in SIMILARITY_LEVELS:
+        raise HTTPException(status_code=400, detail="Nivel inválido, usa district o sample")
+    # Los perfiles de distritos nombrados salen siempre del índice por distrito
+    district_index = await _require("similarity_district")
+    index = district_index if body.level == "district" else await _require(f"similarity_{body.level}")
+    return await asyncio.to_thread(_similar_payload, index, district_index, body)
+
+
+def _similar_payload(index: SimilarityIndex, district_index: SimilarityIndex, body: SimilarityRequest) -> dict:
+    try:
+        return similar(index, body, district_index)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=f"No se encontró el distrito {exc.args[0]}")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+def _epoch_seconds(value: Optional[datetime]) -> Optional[int]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)  # fechas sin zona se asumen UTC como el dataset
+    return int(value.timestamp())
 
 
 @app.get("/climate/timeseries")
 async def get_climate_timeseries(
+    request: Request,
     metric: str = Query("TT", description="TT (temp), HR (humedad), RR (lluvia), PP, FF, DD"),
     year: Optional[int] = Query(None),
     limit: int = Query(DEFAULT_SORT_LIMIT, ge=10, le=2000),
+    start: Optional[datetime] = Query(None, alias="from", description="Inicio ISO-8601 (inclusive, UTC)"),
+    end: Optional[datetime] = Query(None, alias="to", description="Fin ISO-8601 (inclusive, UTC)"),
+    format: str = Query("rows", description="rows (lista de objetos) | columnar (un arreglo por campo)"),
+    points: Optional[int] = Query(None, ge=2, le=5000, description="Reduce el rango completo a N puntos"),
+    resolution: Optional[str] = Query(None, description="hour|day|week|month (por defecto se elige según points)"),
+    downsample: str = Query("lttb", description="lttb | minmax (sólo con points)"),
 ):
+    columnar = _check_format(format)
+    _check_timeseries(resolution, downsample)
+    await _require("climate_rollups" if points is not None or resolution is not None else "climate_store")
+    etag = request_etag(request, dataset_version())
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    payload = await asyncio.to_thread(
+        _timeseries_payload, metric, year, limit, start, end, columnar, points, resolution, downsample
+    )
+    return cached_json(payload, etag)
+
+
+def _check_timeseries(resolution: Optional[str], downsample: str) -> None:
+    if resolution is not None and resolution.lower() not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail="Resolución inválida, usa hour, day, week o month")
+    if downsample.lower() not in DOWNSAMPLE_MODES:
+        raise HTTPException(status_code=400, detail="Downsample inválido, usa lttb o minmax")
+
+
+def _timeseries_payload(
+    metric: str,
+    year: Optional[int],
+    limit: int,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    columnar: bool,
+    points: Optional[int],
+    resolution: Optional[str],
+    downsample: str,
+) -> dict:
+    if points is not None or resolution is not None:
+        # Niveles precalculados (hora/día/semana/mes) + LTTB o min/max: costo según points, no según el rango
+        try:
+            used, series = climate_rollup_series(
+                metric=metric,
+                points=points,
+                year=year,
+                start=_epoch_seconds(start),
+                end=_epoch_seconds(end),
+                resolution=resolution.lower() if resolution else None,
+                downsample=downsample.lower(),
+                limit=limit,
+                columnar=columnar,
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return {"metric": metric, "resolution": used, "downsample": downsample.lower() if points else None, "series": series}
     try:
-        series = climate_timeseries(metric=metric, year=year, limit=limit)
+        series = climate_timeseries(
+            metric=metric,
+            year=year,
+            limit=limit,
+            start=_epoch_seconds(start),
+            end=_epoch_seconds(end),
+            columnar=columnar,
+        )
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
     return {"metric": metric, "series": series}
 
 
-def _default_start_node():
-    soil_grouped = app.state.soil_grouped
+@app.get("/climate/rolling")
+async def get_climate_rolling(
+    request: Request,
+    metric: str = Query("TT", description="TT (temp), HR (humedad), RR (lluvia), FF (viento)"),
+    window: str = Query("24h", description="24h | 7d | 30d (ventana móvil hacia atrás)"),
+    year: Optional[int] = Query(None),
+    limit: int = Query(DEFAULT_SORT_LIMIT, ge=10, le=5000),
+    start: Optional[datetime] = Query(None, alias="from", description="Inicio ISO-8601 (inclusive, UTC)"),
+    end: Optional[datetime] = Query(None, alias="to", description="Fin ISO-8601 (inclusive, UTC)"),
+    z: float = Query(ANOMALY_Z, gt=0, le=10, description="|z| desde el que una lectura es anomalía"),
+    anomalies: bool = Query(False, description="Sólo las lecturas marcadas como anomalía"),
+    format: str = Query("rows", description="rows (lista de objetos) | columnar (un arreglo por campo)"),
+):
+    columnar = _check_format(format)
+    await _require("climate_rolling")
+    etag = request_etag(request, dataset_version())
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    payload = await asyncio.to_thread(
+        _rolling_payload, metric, window, year, limit, start, end, z, anomalies, columnar
+    )
+    return cached_json(payload, etag)
+
+
+def _rolling_payload(
+    metric: str,
+    window: str,
+    year: Optional[int],
+    limit: int,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    z: float,
+    anomalies: bool,
+    columnar: bool,
+) -> dict:
+    try:
+        series = climate_rolling_series(
+            metric=metric,
+            window=window,
+            year=year,
+            start=_epoch_seconds(start),
+            end=_epoch_seconds(end),
+            limit=limit,
+            z=z,
+            only_anomalies=anomalies,
+            columnar=columnar,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"metric": metric.upper(), "window": window, "z": z, "series": series}
+
+
+@app.post("/climate/ingest")
+async def ingest_climate(batch: ClimateBatch):
+    # Agrega lecturas nuevas sobre los datos cargados (sin recargar el CSV ni reagrupar el historial)
+    await _require("climate_rollups")
+    return await asyncio.to_thread(ingest_rows, [row.model_dump() for row in batch.rows])
+
+
+def _default_start_node(soil_grouped: pd.DataFrame):
     if soil_grouped is None or soil_grouped.empty:
         return None
     return soil_grouped.iloc[0].distrito
 
 
 @app.get("/algorithms/divide-and-conquer")
-async def divide_and_conquer(partitions: int = Query(4, ge=1, le=16)):
-    climate_df = app.state.climate_df
-    result = await asyncio.to_thread(algorithms.run_divide_and_conquer, climate_df, partitions)
-    return result
+async def divide_and_conquer(
+    partitions: int = Query(4, ge=1, le=16),
+    scheme: str = Query("rows", description="rows (N particiones) | year | month"),
+):
+    return await _divide_and_conquer_result(partitions, scheme)
+
+
+async def _divide_and_conquer_result(partitions: int, scheme: str) -> dict:
+    scheme = scheme.lower()
+    if scheme not in PARTITION_SCHEMES:
+        raise HTTPException(status_code=400, detail="Esquema inválido, usa rows, year o month")
+    await _require("climate_store")
+    climate_store = load_climate_store()  # vigente: incluye filas ingeridas
+    return await result_cache.get_or_compute(
+        "divide-and-conquer",
+        {"partitions": partitions, "scheme": scheme},
+        dataset_version(),
+        algorithms.run_divide_and_conquer,
+        climate_store,
+        partitions,
+        scheme,
+    )
 
 
 @app.get("/algorithms/sort")
 async def sort_series(
+    request: Request,
     dataset: str = Query("climate", description="climate|soil"),
     metric: str = Query("TT"),
-    method: str = Query("quicksort", description="quicksort"),
+    method: str = Query("quicksort", description="quicksort|introsort|numpy|auto"),
     year: Optional[int] = Query(None),
     limit: int = Query(DEFAULT_SORT_LIMIT, ge=10, le=5000),
     reverse: bool = Query(False),
+    top: Optional[int] = Query(None, ge=1, le=5000, description="Sólo los N primeros del ranking (top-k)"),
+    keys: Optional[str] = Query(None, description="Orden estable multi-clave, p.ej. value,-label"),
+    start: Optional[datetime] = Query(None, alias="from", description="Inicio ISO-8601 (sólo climate)"),
+    end: Optional[datetime] = Query(None, alias="to", description="Fin ISO-8601 (sólo climate)"),
+    format: str = Query("rows", description="rows (lista de objetos) | columnar (un arreglo por campo)"),
 ):
-    dataset = dataset.lower()
-    method = method.lower()
-    if method != "quicksort":
-        raise HTTPException(status_code=400, detail="Método inválido, usa quicksort")
+    columnar = _check_format(format)
+    sort_keys = _check_sort(method, keys)
+    await _require_sort_data(dataset)
+    etag = request_etag(request, dataset_version())
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    payload = await _sort_result(dataset, metric, method, year, limit, reverse, top, sort_keys, start, end, columnar)
+    return cached_json(payload, etag)
+
+
+def _check_sort(method: str, keys: Optional[str]):
+    if method.lower() not in SORT_METHODS:
+        raise HTTPException(status_code=400, detail="Método inválido, usa quicksort, introsort, numpy o auto")
+    sort_keys = parse_sort_keys(keys) if keys else None
+    if sort_keys and any(field not in ("label", "value") for field, _ in sort_keys):
+        raise HTTPException(status_code=400, detail="Claves de orden válidas: label, value")
+    return sort_keys
+
 
+async def _require_sort_data(dataset: str) -> None:
+    if dataset.lower() == "soil":
+        await _require("soil")
+    elif dataset.lower() == "climate":
+        await _require("climate_store")
+
+
+async def _sort_result(
+    dataset: str,
+    metric: str,
+    method: str,
+    year: Optional[int],
+    limit: int,
+    reverse: bool,
+    top: Optional[int],
+    sort_keys,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    columnar: bool,
+) -> dict:
+    params = {
+        "dataset": dataset.lower(),
+        "metric": metric,
+        "method": method.lower(),
+        "year": year,
+        "limit": limit,
+        "reverse": reverse,
+        "top": top,
+        "keys": sort_keys,
+        "start": _epoch_seconds(start),
+        "end": _epoch_seconds(end),
+    }
+    payload = await result_cache.get_or_compute("sort", params, dataset_version(), _sort_payload, **params)
+    if columnar and isinstance(payload["items"], list):
+        payload = {**payload, "items": to_columns(payload["items"], ("label", "value"))}
+    return payload
+
+
+async def _sort_payload(**params) -> dict:
+    # Items armados en un hilo (lecturas de datasets); el ordenamiento corre en el pool de cómputo
+    items = await asyncio.to_thread(_sort_items, **params)
+    if not items:
+        return {"items": []}
+    sorted_items = await algorithms.run_sort_pooled(
+        items, "value", params["method"], params["reverse"], params["top"], params["keys"]
+    )
+    return {"dataset": params["dataset"], "metric": params["metric"], "method": params["method"], "items": sorted_items}
+
+
+def _sort_items(
+    dataset: str,
+    metric: str,
+    method: str,
+    year: Optional[int],
+    limit: int,
+    reverse: bool,
+    top: Optional[int],
+    keys,
+    start: Optional[int],
+    end: Optional[int],
+) -> List[dict]:
+    # Arma los items (etiqueta, valor) del dataset pedido
     if dataset == "climate":
-        series = climate_timeseries(metric=metric, year=year, limit=limit)
+        try:
+            series = climate_timeseries(metric=metric, year=year, limit=limit, start=start, end=end, columnar=True)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
         items = [
-            {"label": f"{s['year']}-{s['month']:02d}", "value": s["value"]}
-            for s in series
-            if s["value"] is not None
+            {"label": f"{y}-{m:02d}", "value": v}
+            for y, m, v in zip(series["year"], series["month"], series["value"])
+            if v is not None
         ]
     elif dataset == "soil":
         zones = soil_zones(limit=limit)
@@ -118,20 +712,47 @@ async def sort_series(
         items = [{"label": z["distrito"], "value": z.get(metric)} for z in zones if z.get(metric) is not None]
     else:
         raise HTTPException(status_code=400, detail="Dataset inválido, usa climate o soil")
+    return items
 
-    if not items:
-        return {"items": []}
 
-    sorted_items = await asyncio.to_thread(algorithms.run_sort, items, "value", method, reverse)
-    return {"dataset": dataset, "metric": metric, "method": method, "items": sorted_items}
+@app.get("/algorithms/kmeans")
+async def kmeans(
+    k: int = Query(DEFAULT_KMEANS_K, ge=2, le=12),
+    level: str = Query("district", description="district (promedios por distrito) | sample (muestras crudas)"),
+    mode: str = Query("auto", description="auto|lloyd|hamerly|minibatch"),
+    warm_start: bool = Query(False, description="Parte de centroides cacheados de otro k"),
+    max_iter: int = Query(100, ge=1, le=500),
+):
+    return await _kmeans_result(k, level, mode, warm_start, max_iter)
 
 
-@app.get("/algorithms/kmeans")
-async def kmeans(k: int = Query(DEFAULT_KMEANS_K, ge=2, le=12)):
-    soil_grouped = app.state.soil_grouped
-    norm_meta = app.state.norm_meta
-    result = await asyncio.to_thread(algorithms.run_kmeans, soil_grouped, norm_meta, k)
-    return result
+async def _kmeans_result(k: int, level: str, mode: str, warm_start: bool, max_iter: int) -> dict:
+    level, mode = level.lower(), mode.lower()
+    if mode not in KMEANS_MODES:
+        raise HTTPException(status_code=400, detail="Modo inválido, usa auto, lloyd, hamerly o minibatch")
+    if level not in ("district", "sample"):
+        raise HTTPException(status_code=400, detail="Nivel inválido, usa district o sample")
+    if level == "district":
+        _, features, norm_meta = await _require("soil")
+    else:
+        features, norm_meta = await _require("soil_samples")
+    version = dataset_version()
+    kwargs = {"max_iter": max_iter, "mode": mode, "list_members": level == "district"}
+    if warm_start:
+        # Depende de los centroides guardados por llamadas previas: no es determinista, no se cachea
+        result = await algorithms.run_kmeans_pooled(features, norm_meta, k, warm_start_key=(level, version), **kwargs)
+    else:
+        result = await result_cache.get_or_compute(
+            "kmeans",
+            {"k": k, "level": level, **kwargs},
+            version,
+            algorithms.run_kmeans_pooled,
+            features,
+            norm_meta,
+            k,
+            **kwargs,
+        )
+    return {"level": level, **result}
 
 
 @app.get("/algorithms/bellman-ford")
@@ -139,16 +760,43 @@ async def bellman_ford(
     start: Optional[str] = Query(None),
     feature_weight: float = Query(FEATURE_WEIGHT, ge=0.0, le=1.0, description="Peso similitud de suelo"),
     geo_weight: float = Query(GEO_WEIGHT, ge=0.0, le=1.0, description="Peso distancia geográfica"),
+    sources: Optional[List[str]] = Query(None, description="Varios orígenes (consulta multi-origen)"),
+    method: str = Query("auto", description="auto|dijkstra|bellman-ford"),
 ):
+    return await _bellman_ford_result(start, feature_weight, geo_weight, sources, method)
+
+
+async def _bellman_ford_result(
+    start: Optional[str],
+    feature_weight: float,
+    geo_weight: float,
+    sources: Optional[List[str]],
+    method: str,
+    graph: Optional[ZoneGraph] = None,
+) -> dict:
     if feature_weight + geo_weight == 0:
         raise HTTPException(status_code=400, detail="feature_weight + geo_weight debe ser > 0")
-    # Recalcula grafo con pesos personalizados (barato: pocos nodos)
-    soil_grouped = app.state.soil_grouped
-    graph = build_zone_graph(soil_grouped, feature_weight=feature_weight, geo_weight=geo_weight)
-    start_node = start or _default_start_node()
-    if start_node not in graph.nodes:
-        raise HTTPException(status_code=404, detail=f"No se encontró el distrito {start_node}")
-    result = await asyncio.to_thread(algorithms.run_bellman_ford, graph, start_node)
+    method = method.lower()
+    if method not in ("auto", "dijkstra", "bellman-ford"):
+        raise HTTPException(status_code=400, detail="Método inválido, usa auto, dijkstra o bellman-ford")
+    graph_cache, (_, soil_grouped, _) = await _require("graph", "soil")
+    if graph is None:
+        # Grafo con pesos personalizados desde el cache LRU (fuera del event loop)
+        graph = await asyncio.to_thread(graph_cache.get, feature_weight, geo_weight)
+    start_nodes = sources or [start or _default_start_node(soil_grouped)]
+    for node in start_nodes:
+        if node not in graph.nodes:
+            raise HTTPException(status_code=404, detail=f"No se encontró el distrito {node}")
+    source = start_nodes[0] if len(start_nodes) == 1 else start_nodes
+    result = await result_cache.get_or_compute(
+        "bellman-ford",
+        {"feature_weight": feature_weight, "geo_weight": geo_weight, "sources": start_nodes, "method": method},
+        dataset_version(),
+        algorithms.run_bellman_ford_pooled,
+        graph,
+        source,
+        method,
+    )
     return {
         "feature_weight": feature_weight,
         "geo_weight": geo_weight,
@@ -156,6 +804,225 @@ async def bellman_ford(
     }
 
 
+@app.get("/graph/analytics")
+async def get_graph_analytics(
+    request: Request,
+    feature_weight: float = Query(FEATURE_WEIGHT, ge=0.0, le=1.0, description="Peso similitud de suelo"),
+    geo_weight: float = Query(GEO_WEIGHT, ge=0.0, le=1.0, description="Peso distancia geográfica"),
+    members: bool = Query(True, description="Listar los distritos de cada componente"),
+):
+    _check_graph_weights(feature_weight, geo_weight)
+    # La versión se lee con el grafo ya cargado: una recarga en curso no deja un ETag viejo
+    await _require("graph", "graph_analytics")
+    etag = request_etag(request, dataset_version())
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    analytics = await _graph_analytics_for(feature_weight, geo_weight)
+    payload = {"feature_weight": feature_weight, "geo_weight": geo_weight, **analytics.summary(members)}
+    return cached_json(payload, etag)
+
+
+@app.get("/graph/distances")
+async def get_graph_distances(
+    request: Request,
+    distritos: Optional[List[str]] = Query(None, description="Orígenes (filas, repetible); vacío = todos"),
+    targets: Optional[List[str]] = Query(None, description="Destinos (columnas, repetible); vacío = los orígenes"),
+    feature_weight: float = Query(FEATURE_WEIGHT, ge=0.0, le=1.0, description="Peso similitud de suelo"),
+    geo_weight: float = Query(GEO_WEIGHT, ge=0.0, le=1.0, description="Peso distancia geográfica"),
+):
+    _check_graph_weights(feature_weight, geo_weight)
+    await _require("graph", "graph_analytics")
+    etag = request_etag(request, dataset_version())
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    analytics = await _graph_analytics_for(feature_weight, geo_weight)
+    return cached_json(_graph_distances_payload(analytics, distritos, targets, feature_weight, geo_weight), etag)
+
+
+def _check_graph_weights(feature_weight: float, geo_weight: float) -> None:
+    if feature_weight + geo_weight == 0:
+        raise HTTPException(status_code=400, detail="feature_weight + geo_weight debe ser > 0")
+
+
+async def _graph_analytics_for(
+    feature_weight: float, geo_weight: float, graph: Optional[ZoneGraph] = None
+) -> GraphAnalytics:
+    _check_graph_weights(feature_weight, geo_weight)
+    # La analítica del grafo por defecto ya está precalculada; otros pesos se calculan una vez por grafo
+    graph_cache, _ = await _require("graph", "graph_analytics")
+    if graph is None:
+        graph = await asyncio.to_thread(graph_cache.get, feature_weight, geo_weight)
+    return await asyncio.to_thread(graph_analytics, graph)
+
+
+def _graph_distances_payload(
+    analytics: GraphAnalytics,
+    distritos: Optional[List[str]],
+    targets: Optional[List[str]],
+    feature_weight: float,
+    geo_weight: float,
+) -> dict:
+    sources = distritos or analytics.names
+    targets = targets or sources
+    try:
+        distance = analytics.submatrix(sources, targets)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=f"No se encontró el distrito {exc.args[0]}")
+    return {
+        "feature_weight": feature_weight,
+        "geo_weight": geo_weight,
+        "sources": list(sources),
+        "targets": list(targets),
+        "distance": distance,
+    }
+
+
+@app.post("/algorithms/batch")
+async def algorithms_batch(request: Request, batch: BatchRequest):
+    """Several dashboard operations in one round-trip, over one load of the shared inputs.
+
+    The batch is planned before running anything: every operation is validated,
+    identical ones are computed once, the warmup components they need are awaited
+    together, and each distinct zone graph (weight pair) is derived once for all the
+    route queries. Distinct operations then run concurrently (result cache, worker
+    threads and the compute pool). Results come back in request order, each with its
+    own status (a full compute pool is a 429 for that operation only).
+    The response has an ETag (dataset version + the planned operations), so a repeated
+    dashboard load with If-None-Match gets a 304 without running anything; batches
+    with a warm-started k-means (not deterministic) or a transient error (429/5xx) get none.
+    """
+    planned: List[Tuple[Optional[Tuple[str, Any]], Optional[dict]]] = []
+    for item in batch.operations:
+        spec = BATCH_OPERATIONS.get(item.op.strip("/"))
+        if spec is None:
+            planned.append((None, {"status": 400, "detail": f"Operación desconocida: {item.op}"}))
+            continue
+        try:
+            planned.append(((item.op.strip("/"), spec[0].model_validate(item.params)), None))
+        except ValidationError as exc:
+            planned.append((None, {"status": 422, "detail": exc.errors(include_url=False, include_context=False)}))
+
+    distinct = {}
+    for entry, _ in planned:
+        if entry is not None:
+            distinct.setdefault(plan_key(*entry), entry)
+    components = sorted({name for op, _ in distinct.values() for name in BATCH_OPERATIONS[op][1]})
+    if components:
+        await _require(*components)
+    etag = None
+    if not any(op == "algorithms/kmeans" and params.warm_start for op, params in distinct.values()):
+        # Ids y orden cuentan: la respuesta los repite; los parámetros ya normalizados por plan_key
+        plan = [
+            (item.id, item.op, error or plan_key(*entry)) for item, (entry, error) in zip(batch.operations, planned)
+        ]
+        etag = body_etag(request, dataset_version(), plan)
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+    weights = {
+        (p.feature_weight, p.geo_weight)
+        for op, p in distinct.values()
+        if op in ("algorithms/bellman-ford", "graph/distances") and p.feature_weight + p.geo_weight > 0
+    }
+    graphs = {}
+    if weights:
+        graph_cache = await _require("graph")
+        built = await asyncio.gather(*(asyncio.to_thread(graph_cache.get, fw, gw) for fw, gw in weights))
+        graphs = dict(zip(weights, built))
+
+    outcomes = await asyncio.gather(
+        *(_BATCH_HANDLERS[op](params, graphs) for op, params in distinct.values()), return_exceptions=True
+    )
+    by_key = dict(zip(distinct, outcomes))
+    results = []
+    for item, (entry, error) in zip(batch.operations, planned):
+        result = {"id": item.id, "op": item.op}
+        value = error if entry is None else by_key[plan_key(*entry)]
+        if isinstance(value, HTTPException):
+            result.update(status=value.status_code, detail=value.detail)
+        elif isinstance(value, ComputeError):
+            result.update(status=value.status_code, detail=str(value))
+        elif isinstance(value, BaseException):
+            raise value  # NotReady -> 503, el resto -> 500 como en los GET
+        elif entry is None:
+            result.update(value)
+        else:
+            result.update(status=200, data=value)
+        results.append(result)
+    payload = {"version": dataset_version(), "results": results}
+    if etag is not None and not any(r["status"] == 429 or r["status"] >= 500 for r in results):
+        return cached_json(payload, etag)
+    # Respuesta ya armada: evita el jsonable_encoder de FastAPI sobre todo el lote
+    return FastJSONResponse(payload)
+
+
+async def _batch_zones(p, graphs) -> dict:
+    return {"zones": soil_zones(p.limit, columnar=_check_format(p.format))}
+
+
+async def _batch_cube(p, graphs) -> dict:
+    columnar = _check_format(p.format)
+    return await asyncio.to_thread(
+        _soil_cube_payload, p.by, p.provincia, p.distrito, p.cell, p.start, p.end, p.metrics, p.stats, columnar
+    )
+
+
+async def _batch_timeseries(p, graphs) -> dict:
+    columnar = _check_format(p.format)
+    _check_timeseries(p.resolution, p.downsample)
+    return await asyncio.to_thread(
+        _timeseries_payload, p.metric, p.year, p.limit, p.start, p.end, columnar, p.points, p.resolution, p.downsample
+    )
+
+
+async def _batch_rolling(p, graphs) -> dict:
+    columnar = _check_format(p.format)
+    return await asyncio.to_thread(
+        _rolling_payload, p.metric, p.window, p.year, p.limit, p.start, p.end, p.z, p.anomalies, columnar
+    )
+
+
+async def _batch_sort(p, graphs) -> dict:
+    columnar = _check_format(p.format)
+    sort_keys = _check_sort(p.method, p.keys)
+    return await _sort_result(
+        p.dataset, p.metric, p.method, p.year, p.limit, p.reverse, p.top, sort_keys, p.start, p.end, columnar
+    )
+
+
+async def _batch_kmeans(p, graphs) -> dict:
+    return await _kmeans_result(p.k, p.level, p.mode, p.warm_start, p.max_iter)
+
+
+async def _batch_bellman_ford(p, graphs) -> dict:
+    graph = graphs.get((p.feature_weight, p.geo_weight))
+    return await _bellman_ford_result(p.start, p.feature_weight, p.geo_weight, p.sources, p.method, graph)
+
+
+async def _batch_graph_distances(p, graphs) -> dict:
+    graph = graphs.get((p.feature_weight, p.geo_weight))
+    analytics = await _graph_analytics_for(p.feature_weight, p.geo_weight, graph)
+    return _graph_distances_payload(analytics, p.distritos, p.targets, p.feature_weight, p.geo_weight)
+
+
+async def _batch_divide_and_conquer(p, graphs) -> dict:
+    return await _divide_and_conquer_result(p.partitions, p.scheme)
+
+
+_BATCH_HANDLERS = {
+    "soil/zones": _batch_zones,
+    "soil/cube": _batch_cube,
+    "climate/timeseries": _batch_timeseries,
+    "climate/rolling": _batch_rolling,
+    "algorithms/sort": _batch_sort,
+    "algorithms/kmeans": _batch_kmeans,
+    "algorithms/bellman-ford": _batch_bellman_ford,
+    "algorithms/divide-and-conquer": _batch_divide_and_conquer,
+    "graph/distances": _batch_graph_distances,
+}
+
 
 @app.get("/")
 async def root():
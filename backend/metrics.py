@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import bisect
+import functools
+import math
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .config import PROFILE_HEADER, PROFILE_INTERVAL_S, PROFILER_ENABLED
+
+# Segundos: cubre desde lecturas de arrays (~ms) hasta cargas desde CSV y grafos grandes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Iteraciones de K-Means / rondas de relajación
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, List] = {}  # etiquetas -> [conteos por bucket, suma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(key, list(s[0]), s[1], s[2]) for key, s in sorted(self._series.items())]
+        for key, counts, total, n in snapshot:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_labels(key + (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(key)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(key)} {n}")
+        return lines
+
+
+class CounterMetric:
+    """Monotonic counter per label set, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(key)} {value!r}" for key, value in snapshot)
+        return lines
+
+
+class GaugeMetric:
+    """Point-in-time values per label set, read from a collector when rendering."""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._collect: Optional[Callable[[], Iterable[Tuple[Dict[str, str], float]]]] = None
+
+    def set_collector(self, collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]]) -> None:
+        self._collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        if self._collect is not None:
+            for labels, value in self._collect():
+                key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+                lines.append(f"{self.name}{_labels(key)} {float(value)!r}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+
+HTTP_LATENCY = Histogram("agrofuturo_http_request_duration_seconds", "Latencia de requests HTTP por ruta.")
+STAGE_LATENCY = Histogram("agrofuturo_stage_duration_seconds", "Duración de etapas internas (carga, grafo, algoritmos).")
+KMEANS_ITERATIONS = Histogram("agrofuturo_kmeans_iterations", "Iteraciones de K-Means hasta converger.", COUNT_BUCKETS)
+SHORTEST_PATH_ROUNDS = Histogram(
+    "agrofuturo_shortest_path_rounds", "Rondas de relajación de Bellman-Ford (0 con Dijkstra).", COUNT_BUCKETS
+)
+RESULT_CACHE_EVENTS = CounterMetric(
+    "agrofuturo_result_cache_total", "Consultas al caché de resultados por endpoint (hits, misses, coalesced)."
+)
+COMPUTE_TASKS = CounterMetric(
+    "agrofuturo_compute_tasks_total", "Tareas del pool de cómputo por función y resultado (completed, rejected, timeout...)."
+)
+COMPUTE_TASK_LATENCY = Histogram(
+    "agrofuturo_compute_task_duration_seconds", "Desde el envío al pool de cómputo hasta el resultado (incluye la cola)."
+)
+COMPUTE_POOL_TASKS = GaugeMetric("agrofuturo_compute_pool_tasks", "Tareas del pool de cómputo corriendo o en cola.")
+COMPUTE_POOL_UTILIZATION = GaugeMetric(
+    "agrofuturo_compute_pool_utilization", "Fracción del tiempo de los workers ocupada desde que arrancó el pool."
+)
+REGISTRY: List = [
+    HTTP_LATENCY,
+    STAGE_LATENCY,
+    KMEANS_ITERATIONS,
+    SHORTEST_PATH_ROUNDS,
+    RESULT_CACHE_EVENTS,
+    COMPUTE_TASKS,
+    COMPUTE_TASK_LATENCY,
+    COMPUTE_POOL_TASKS,
+    COMPUTE_POOL_UTILIZATION,
+]
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Time a block into ``agrofuturo_stage_duration_seconds{stage=...}`` (also on error)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+
+
+def render_metrics() -> str:
+    return "\n".join(line for hist in REGISTRY for line in hist.render()) + "\n"
+
+
+# Frame más interno de un hilo bloqueado: cola del pool, locks, selector del event loop
+_IDLE_FRAMES = ("_worker ", "wait ", "_wait_for_tstate_lock ", "select ", "get ")
+
+
+class SamplingProfiler:
+    """Wall-clock sampler: every `interval` seconds records the stack of every other thread.
+
+    The result is in collapsed-stack format (``frame;frame;frame count``), ready for
+    flamegraph tools. It samples the whole process, so concurrent requests show up too.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_S):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._on_done: Optional[Callable[[str], None]] = None
+        self._thread = threading.Thread(target=self._run, name="agrofuturo-profiler", daemon=True)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                # Hilos ociosos (esperando trabajo o eventos) no aportan
+                if stack and not stack[0].startswith(_IDLE_FRAMES):
+                    self.samples[";".join(reversed(stack))] += 1
+        if self._on_done is not None:
+            self._on_done(self.collapsed())
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self, on_done: Callable[[str], None]) -> None:
+        """Stop sampling without waiting: the sampler thread hands the collapsed stacks to ``on_done``."""
+        self._on_done = on_done
+        self._stop.set()
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+
+# Últimos perfiles por id (acotado)
+_profiles: "OrderedDict[str, str]" = OrderedDict()
+_profiles_lock = threading.Lock()
+_MAX_PROFILES = 16
+
+
+def get_profile(profile_id: str) -> Optional[str]:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def _store_profile(profile_id: str, collapsed: str) -> None:
+    with _profiles_lock:
+        _profiles[profile_id] = collapsed
+        while len(_profiles) > _MAX_PROFILES:
+            _profiles.popitem(last=False)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: per-route latency histogram and, with the profile header, a sampled profile.
+
+    Latency is measured until the last body chunk is sent, so streamed responses count
+    in full. Routes are labelled by their path template; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[object, str] = {}
+
+    def _route_label(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        label = self._routes.get(endpoint)
+        if label is None:
+            router = scope.get("app")
+            for route in getattr(router, "routes", []):
+                if getattr(route, "endpoint", None) is endpoint:
+                    label = route.path
+                    break
+            self._routes[endpoint] = label = label or "unmatched"
+        return label
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profiler = None
+        profile_id = None
+        if PROFILER_ENABLED and _header(scope, PROFILE_HEADER) in ("1", "true", "yes"):
+            profile_id = uuid.uuid4().hex[:12]
+            profiler = SamplingProfiler().start()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if profile_id is not None:
+                    message.setdefault("headers", [])
+                    message["headers"] = [*message["headers"], (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_LATENCY.observe(
+                elapsed, method=scope["method"], route=self._route_label(scope), status=str(status["code"])
+            )
+            if profiler is not None:
+                # No bloquea el event loop esperando al hilo del sampler
+                profiler.stop(functools.partial(_store_profile, profile_id))
+
+
+def _header(scope, name: str) -> Optional[str]:
+    target = name.lower().encode()
+    for key, value in scope.get("headers", []):
+        if key == target:
+            return value.decode().strip().lower()
+    return None
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Dict, List, Optional, Sequence
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+try:  # orjson es opcional: serializa NumPy/NaN directo y mucho más rápido
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+RESPONSE_FORMATS = ("rows", "columnar")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when available (NaN -> null), stdlib json otherwise."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def to_columns(records: List[Dict], fields: Optional[Sequence[str]] = None) -> Dict[str, List]:
+    """Row dicts -> one list per field (``format=columnar``)."""
+    if fields is None:
+        fields = list(records[0].keys()) if records else []
+    return {field: [r.get(field) for r in records] for field in fields}
+
+
+def request_etag(request: Request, version: str) -> str:
+    """Weak ETag from the dataset version plus path and (order-independent) query params."""
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    digest = hashlib.sha1(f"{version}|{request.url.path}|{query}".encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def body_etag(request: Request, version: str, key: Any) -> str:
+    """Weak ETag for a POST whose response depends only on the dataset version and ``key`` (its normalized body)."""
+    digest = hashlib.sha1(f"{version}|{request.url.path}|{key!r}".encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Comparación débil: ignora el prefijo W/ de ambos lados
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """304 if the client already holds this representation (checked before any work)."""
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+    return None
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    # no-cache: el navegador guarda la respuesta pero revalida siempre con If-None-Match
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def cached_json(content: Any, etag: str) -> Response:
+    return FastJSONResponse(content, headers=cache_headers(etag))
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional, Tuple
+
+from .config import RESULT_CACHE_SIZE, RESULT_CACHE_TTL_S
+from .metrics import RESULT_CACHE_EVENTS
+
+CacheKey = Tuple[str, Tuple, str]
+
+
+def _normalize(value: Any) -> Hashable:
+    # Parámetros equivalentes producen la misma clave (listas -> tuplas, floats enteros -> int)
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def make_key(endpoint: str, params: Mapping[str, Any], version: str) -> CacheKey:
+    return endpoint, tuple(sorted((name, _normalize(v)) for name, v in params.items() if v is not None)), version
+
+
+class ResultCache:
+    """In-process LRU + TTL cache of endpoint results, with single-flight computation.
+
+    The key is (endpoint, normalized params, dataset version), so a dataset reload
+    never serves stale results. Concurrent identical requests await one shared task,
+    which runs the function in a worker thread (or awaits it, for coroutine functions
+    that dispatch to the compute pool) and is shielded from cancellation of any
+    single caller. Failures are propagated to every waiter and not cached.
+    Only the event loop thread touches the dictionaries, so no lock is needed.
+    """
+
+    def __init__(self, maxsize: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_TTL_S):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    def _lookup(self, key: CacheKey) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            self.stats["evictions"] += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _store(self, key: CacheKey, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _count(self, endpoint: str, outcome: str) -> None:
+        self.stats[outcome] += 1
+        RESULT_CACHE_EVENTS.inc(endpoint=endpoint, outcome=outcome)
+
+    async def get_or_compute(
+        self,
+        endpoint: str,
+        params: Mapping[str, Any],
+        version: str,
+        fn: Callable[..., Any],
+        *args: Any,
+        **kwargs: Any,
+    ) -> Any:
+        key = make_key(endpoint, params, version)
+        found, value = self._lookup(key)
+        if found:
+            self._count(endpoint, "hits")
+            return value
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count(endpoint, "coalesced")
+        else:
+            self._count(endpoint, "misses")
+            if asyncio.iscoroutinefunction(fn):
+                task = asyncio.ensure_future(fn(*args, **kwargs))
+            else:
+                task = asyncio.ensure_future(asyncio.to_thread(fn, *args, **kwargs))
+            self._inflight[key] = task
+
+            def _done(fut: asyncio.Future, key: CacheKey = key) -> None:
+                self._inflight.pop(key, None)
+                if not fut.cancelled() and fut.exception() is None:
+                    self._store(key, fut.result())
+
+            task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def info(self) -> Dict[str, Optional[int]]:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "inflight": len(self._inflight), **self.stats}
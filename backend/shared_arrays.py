@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class ArraySpec:
+    """Picklable handle to a NumPy array living in a shared memory segment."""
+
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+
+class SharedArray:
+    """Owner side: copies an array into shared memory once; `close()` frees it."""
+
+    def __init__(self, array: np.ndarray):
+        array = np.ascontiguousarray(array)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.array = np.ndarray(array.shape, dtype=array.dtype, buffer=self._shm.buf)
+        self.array[...] = array
+        self.spec = ArraySpec(name=self._shm.name, shape=array.shape, dtype=array.dtype.str)
+
+    def close(self) -> None:
+        if self._shm is None:
+            return
+        self.array = None
+        try:
+            self._shm.close()
+        except BufferError:  # aún hay vistas vivas; el mapeo se libera con ellas
+            pass
+        self._shm.unlink()
+        self._shm = None
+
+
+# Segmentos ya adjuntados en este proceso (los workers reusan el mapeo entre tareas);
+# se acotan para soltar versiones viejas de los datasets
+_attached: Dict[str, Tuple[shared_memory.SharedMemory, np.ndarray]] = {}
+_MAX_ATTACHED = 16
+
+
+def attach_array(spec: ArraySpec) -> np.ndarray:
+    """Worker side: zero-copy, read-only view of a shared array (cached per process)."""
+    cached = _attached.get(spec.name)
+    if cached is not None:
+        return cached[1]
+    # Python < 3.13 registra el segmento también al adjuntarlo y el resource tracker lo
+    # borraría al salir el worker; sólo el proceso que lo creó debe liberarlo.
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        shm = shared_memory.SharedMemory(name=spec.name)
+    finally:
+        resource_tracker.register = register
+    array = np.ndarray(spec.shape, dtype=np.dtype(spec.dtype), buffer=shm.buf)
+    array.flags.writeable = False
+    if len(_attached) >= _MAX_ATTACHED:
+        oldest = next(iter(_attached))
+        try:
+            _attached.pop(oldest)[0].close()
+        except BufferError:
+            pass
+    _attached[spec.name] = (shm, array)
+    return array
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .config import SHARED_DATASETS_DIR, SHARED_KEEP_VERSIONS
+
+logger = logging.getLogger(__name__)
+
+# Subir cuando cambie la disposición de los archivos: las versiones viejas se ignoran
+SHARED_FORMAT = 1
+
+
+@dataclass
+class SharedVersion:
+    """One published dataset version, attached read-only: frames and arrays over memory-mapped `.npy` files."""
+
+    version: str
+    frames: Dict[str, pd.DataFrame]
+    arrays: Dict[str, np.ndarray]
+    meta: Dict
+
+
+def _current_path(root: Path) -> Path:
+    return root / "CURRENT"
+
+
+@contextmanager
+def publish_lock(root: Path = SHARED_DATASETS_DIR) -> Iterator[None]:
+    """Exclusive lock across processes: one publisher at a time (the others wait and then attach)."""
+    root.mkdir(parents=True, exist_ok=True)
+    with (root / ".lock").open("a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def current_version(root: Path = SHARED_DATASETS_DIR) -> Optional[str]:
+    """Version the workers should be serving (None if nothing was published yet)."""
+    try:
+        return _current_path(root).read_text().strip() or None
+    except OSError:
+        return None
+
+
+def _save(path: Path, values: np.ndarray) -> None:
+    np.save(path, np.ascontiguousarray(values), allow_pickle=False)
+
+
+def _save_frame(df: pd.DataFrame, target: Path, name: str) -> Dict:
+    """Write one `.npy` per column (categories and texts as int codes + labels) and return its spec."""
+    columns = []
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        base = f"{name}.{i}"
+        if isinstance(values.dtype, pd.CategoricalDtype) or values.dtype == object:
+            # Textos como categorías: los códigos se comparten; las etiquetas son pocas (o se copian igual)
+            cat = values.astype("category").cat
+            labels = cat.categories.to_numpy()
+            _save(target / f"{base}.codes.npy", cat.codes.to_numpy())
+            _save(target / f"{base}.labels.npy", labels.astype(str) if labels.dtype == object else labels)
+            kind = "category" if isinstance(values.dtype, pd.CategoricalDtype) else "text"
+            columns.append({"name": col, "kind": kind, "file": base})
+        elif isinstance(values.dtype, pd.DatetimeTZDtype):
+            _save(target / f"{base}.npy", values.array.asi8)
+            columns.append({"name": col, "kind": "datetime", "tz": str(values.dtype.tz), "file": base})
+        else:
+            _save(target / f"{base}.npy", values.to_numpy())
+            columns.append({"name": col, "kind": "array", "file": base})
+    _save(target / f"{name}.index.npy", df.index.to_numpy())
+    return {"columns": columns}
+
+
+def _load(path: Path) -> np.ndarray:
+    return np.load(path, mmap_mode="r", allow_pickle=False)
+
+
+def _load_frame(source: Path, name: str, spec: Dict) -> pd.DataFrame:
+    data = {}
+    for column in spec["columns"]:
+        base = source / column["file"]
+        if column["kind"] in ("category", "text"):
+            codes, labels = _load(Path(f"{base}.codes.npy")), np.load(f"{base}.labels.npy", allow_pickle=False)
+            if labels.dtype.kind == "U":
+                labels = labels.astype(object)
+            values = pd.Categorical.from_codes(codes, categories=pd.Index(labels), validate=False)
+            # Texto libre (p.ej. id_muestra): vuelve a object, copia propia de cada worker
+            data[column["name"]] = values if column["kind"] == "category" else np.asarray(values, dtype=object)
+        elif column["kind"] == "datetime":
+            stamps = _load(Path(f"{base}.npy")).view("M8[ns]")
+            dtype = pd.DatetimeTZDtype(tz=column["tz"])
+            try:  # sin copia; la API pública (tz_localize) copia el arreglo
+                data[column["name"]] = pd.arrays.DatetimeArray._simple_new(stamps, dtype=dtype)
+            except (AttributeError, TypeError):  # pragma: no cover - otras versiones de pandas
+                data[column["name"]] = pd.DatetimeIndex(stamps).tz_localize(column["tz"])
+        else:
+            data[column["name"]] = _load(Path(f"{base}.npy"))
+    index = pd.Index(_load(source / f"{name}.index.npy"), copy=False)
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+def _frame_files(name: str, spec: Dict) -> List[str]:
+    files = [f"{name}.index.npy"]
+    for column in spec["columns"]:
+        if column["kind"] in ("category", "text"):
+            files += [f"{column['file']}.codes.npy", f"{column['file']}.labels.npy"]
+        else:
+            files.append(f"{column['file']}.npy")
+    return files
+
+
+def _link(source: Path, target: Path) -> None:
+    try:
+        os.link(source, target)  # mismo inodo: sin copia, y las páginas ya cargadas siguen en caché
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def write_version(
+    frames: Dict[str, pd.DataFrame],
+    arrays: Dict[str, np.ndarray],
+    meta: Dict,
+    root: Path = SHARED_DATASETS_DIR,
+    base: Optional[str] = None,
+) -> str:
+    """Write a new version and make it current (call under `publish_lock`); returns its id.
+
+    Files go to a fresh directory and `CURRENT` is switched last with an atomic
+    rename, so a worker sees either the previous complete version or the new one.
+    With ``base``, the frames and arrays not given are hard-linked from that version
+    (not rewritten) and ``meta`` updates its meta. Old versions beyond
+    SHARED_KEEP_VERSIONS are removed: workers still mapping them keep their pages
+    until they swap (POSIX unlink semantics).
+    """
+    previous = json.loads((root / base / "manifest.json").read_text()) if base else None
+    version = f"{time.time_ns():x}"
+    target = root / version
+    target.mkdir(parents=True)
+    manifest = {
+        "format": SHARED_FORMAT,
+        "frames": {name: _save_frame(df, target, name) for name, df in frames.items()},
+        "arrays": list(arrays),
+        "meta": meta,
+    }
+    if previous is not None:
+        for name, spec in previous["frames"].items():
+            if name not in frames:
+                for file in _frame_files(name, spec):
+                    _link(root / base / file, target / file)
+                manifest["frames"][name] = spec
+        for name in previous["arrays"]:
+            if name not in arrays:
+                _link(root / base / f"{name}.npy", target / f"{name}.npy")
+                manifest["arrays"].append(name)
+        manifest["meta"] = {**previous["meta"], **meta}
+    for name, values in arrays.items():
+        _save(target / f"{name}.npy", values)
+    (target / "manifest.json").write_text(json.dumps(manifest))
+    tmp = root / f".CURRENT.{os.getpid()}.tmp"
+    tmp.write_text(version)
+    os.replace(tmp, _current_path(root))
+    _prune(root, version)
+    return version
+
+
+def _prune(root: Path, current: str) -> None:
+    versions = sorted(p for p in root.iterdir() if p.is_dir() and p.name != current)
+    for old in versions[: max(len(versions) - (SHARED_KEEP_VERSIONS - 1), 0)]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def open_version(version: str, root: Path = SHARED_DATASETS_DIR) -> Optional[SharedVersion]:
+    """Attach a published version (zero-copy, read-only); None if it is missing or of another format."""
+    source = root / version
+    try:
+        manifest = json.loads((source / "manifest.json").read_text())
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != SHARED_FORMAT:
+        return None
+    frames = {name: _load_frame(source, name, spec) for name, spec in manifest["frames"].items()}
+    arrays = {name: _load(source / f"{name}.npy") for name in manifest["arrays"]}
+    return SharedVersion(version, frames, arrays, manifest["meta"])
+
+
+def main() -> None:
+    # Proceso cargador: `python -m backend.shared_datasets` publica una versión nueva desde los CSV
+    from . import data_loader
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    version = data_loader.publish_shared()
+    print(f"Versión publicada: {version} en {SHARED_DATASETS_DIR}")
+
+
+if __name__ == "__main__":
+    main()
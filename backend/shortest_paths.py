@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import heapq
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .graph import ZoneGraph
+from .shared_arrays import ArraySpec, attach_array
+
+
+@dataclass
+class CSRGraph:
+    """Integer-indexed compressed sparse row view of a ZoneGraph edge set."""
+
+    names: List[str]
+    index: Dict[str, int]
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+
+    def __post_init__(self):
+        # Copias en listas para el bucle de Dijkstra (indexar listas es más rápido que arrays)
+        self._indptr = self.indptr.tolist()
+        self._indices = self.indices.tolist()
+        self._weights = self.weights.tolist()
+        self.sources = np.repeat(np.arange(len(self.names)), np.diff(self.indptr))
+
+    @property
+    def has_negative_weights(self) -> bool:
+        return bool(self.weights.size and self.weights.min() < 0)
+
+
+@dataclass
+class ShortestPaths:
+    csr: CSRGraph
+    sources: List[int]
+    dist: np.ndarray
+    prev: np.ndarray
+    origin: np.ndarray
+    method: str
+    rounds: int
+
+    def path_to(self, target: int) -> Optional[List[int]]:
+        """Node indices from the closest source to target, or None if unreachable."""
+        if not math.isfinite(self.dist[target]):
+            return None
+        path = [target]
+        while self.prev[path[-1]] >= 0:
+            path.append(int(self.prev[path[-1]]))
+        path.reverse()
+        return path
+
+
+def to_csr(graph: ZoneGraph, edges: str = "adjacency") -> CSRGraph:
+    """Build (once per graph) the CSR arrays for ``graph.adjacency`` or ``graph.directed``."""
+    cached = graph._csr.get(edges)
+    if cached is not None:
+        return cached
+    edge_map = getattr(graph, edges)
+    names = list(edge_map.keys())
+    index = {name: i for i, name in enumerate(names)}
+    counts = np.fromiter((len(neighs) for neighs in edge_map.values()), dtype=np.int64, count=len(names))
+    indptr = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    indices = np.fromiter(
+        (index[v] for neighs in edge_map.values() for v, _ in neighs), dtype=np.int64, count=int(indptr[-1])
+    )
+    weights = np.fromiter(
+        (w for neighs in edge_map.values() for _, w in neighs), dtype=float, count=int(indptr[-1])
+    )
+    csr = CSRGraph(names=names, index=index, indptr=indptr, indices=indices, weights=weights)
+    graph._csr[edges] = csr
+    return csr
+
+
+def attach_csr(indptr: ArraySpec, indices: ArraySpec, weights: ArraySpec) -> CSRGraph:
+    """CSR graph over arrays shared by `to_csr`'s caller (in a pool worker); no names, only indices."""
+    n = indptr.shape[0] - 1
+    return CSRGraph(
+        names=[""] * n,
+        index={},
+        indptr=attach_array(indptr),
+        indices=attach_array(indices),
+        weights=attach_array(weights),
+    )
+
+
+def dijkstra(csr: CSRGraph, sources: Sequence[int]) -> ShortestPaths:
+    """Binary-heap Dijkstra from one or more sources (non-negative weights only)."""
+    n = len(csr.names)
+    dist = [math.inf] * n
+    prev = [-1] * n
+    origin = [-1] * n
+    heap = []
+    for s in sources:
+        dist[s] = 0.0
+        origin[s] = s
+        heap.append((0.0, s))
+    heapq.heapify(heap)
+    indptr, indices, weights = csr._indptr, csr._indices, csr._weights
+    done = [False] * n
+    while heap:
+        d, u = heapq.heappop(heap)
+        if done[u]:
+            continue
+        done[u] = True
+        for e in range(indptr[u], indptr[u + 1]):
+            v = indices[e]
+            nd = d + weights[e]
+            if nd < dist[v]:
+                dist[v] = nd
+                prev[v] = u
+                origin[v] = origin[u]
+                heapq.heappush(heap, (nd, v))
+    return ShortestPaths(
+        csr=csr,
+        sources=list(sources),
+        dist=np.asarray(dist),
+        prev=np.asarray(prev),
+        origin=np.asarray(origin),
+        method="dijkstra",
+        rounds=0,
+    )
+
+
+def bellman_ford(csr: CSRGraph, sources: Sequence[int]) -> ShortestPaths:
+    """Vectorized Bellman–Ford: each round relaxes every edge at once with NumPy.
+
+    Supports negative weights; raises ValueError on a negative cycle reachable
+    from the sources.
+    """
+    n = len(csr.names)
+    src, dst, w = csr.sources, csr.indices, csr.weights
+    dist = np.full(n, np.inf)
+    prev = np.full(n, -1, dtype=np.int64)
+    origin = np.full(n, -1, dtype=np.int64)
+    dist[list(sources)] = 0.0
+    origin[list(sources)] = list(sources)
+
+    rounds = 0
+    converged = False
+    for _ in range(max(n - 1, 1)):
+        cand = dist[src] + w
+        better = np.flatnonzero(cand < dist[dst])
+        if not better.size:
+            converged = True
+            break
+        rounds += 1
+        # Por destino, la arista con menor candidato (lexsort: destino, luego costo)
+        better = better[np.lexsort((cand[better], dst[better]))]
+        first = np.ones(better.size, dtype=bool)
+        first[1:] = dst[better][1:] != dst[better][:-1]
+        best = better[first]
+        dist[dst[best]] = cand[best]
+        prev[dst[best]] = src[best]
+        origin[dst[best]] = origin[src[best]]
+    if not converged and np.any(dist[src] + w < dist[dst]):
+        raise ValueError("El grafo tiene un ciclo de costo negativo alcanzable desde el origen")
+    return ShortestPaths(
+        csr=csr, sources=list(sources), dist=dist, prev=prev, origin=origin, method="bellman-ford", rounds=rounds
+    )
+
+
+def source_indices(csr: CSRGraph, sources: Sequence[str]) -> List[int]:
+    missing = [s for s in sources if s not in csr.index]
+    if missing:
+        raise KeyError(missing[0])
+    return [csr.index[s] for s in sources]
+
+
+def resolve_method(csr: CSRGraph, method: str = "auto") -> str:
+    """Concrete algorithm for ``method``: auto is Dijkstra unless a weight is negative."""
+    if method == "auto":
+        return "bellman-ford" if csr.has_negative_weights else "dijkstra"
+    if method == "dijkstra" and csr.has_negative_weights:
+        raise ValueError("Dijkstra requiere pesos no negativos, usa bellman-ford")
+    if method not in ("dijkstra", "bellman-ford"):
+        raise ValueError(f"Método de caminos inválido: {method}")
+    return method
+
+
+def solve(csr: CSRGraph, sources: Sequence[int], method: str) -> ShortestPaths:
+    return dijkstra(csr, sources) if method == "dijkstra" else bellman_ford(csr, sources)
+
+
+def shortest_paths(graph: ZoneGraph, sources: Sequence[str], method: str = "auto") -> ShortestPaths:
+    """Single or multi-source shortest paths over ``graph.adjacency``.
+
+    ``method="auto"`` uses Dijkstra when every weight is non-negative (always the
+    case for `build_zone_graph`) and falls back to Bellman–Ford otherwise.
+    """
+    csr = to_csr(graph)
+    idx = source_indices(csr, sources)
+    return solve(csr, idx, resolve_method(csr, method))
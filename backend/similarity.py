@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel, Field
+
+from .climate_store import nan_to_none
+from .config import SIMILARITY_BLOCK_ELEMENTS, SIMILARITY_MAX_K, SIMILARITY_MAX_PROFILES
+from .graph import haversine_matrix, smallest_k_rows
+
+SIMILARITY_LEVELS = ("district", "sample")
+
+
+class SimilarityRequest(BaseModel):
+    """Profiles to match: raw soil values per feature, or existing districts (their averages)."""
+
+    profiles: List[Dict[str, float]] = Field(default_factory=list, max_length=SIMILARITY_MAX_PROFILES)
+    distritos: List[str] = Field(default_factory=list, max_length=SIMILARITY_MAX_PROFILES)
+    level: str = Field("district", description="district (promedios por distrito) | sample (muestras crudas)")
+    k: int = Field(10, ge=1, le=SIMILARITY_MAX_K)
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lon: Optional[float] = Field(None, ge=-180, le=180)
+    radius_km: Optional[float] = Field(None, gt=0, le=500)
+
+
+class SimilarityIndex:
+    """Top-k search by soil profile over the ``*_norm`` feature matrix of one level.
+
+    A profile gives raw values for any subset of the features; they are scaled with
+    the level's `norm_meta` and only those features count. The distance is the RMS
+    difference over them (normalized units, 0 = identical) and ``similarity`` is
+    ``1 - distance``. Rows are scanned in blocks of at most SIMILARITY_BLOCK_ELEMENTS
+    values (profiles × rows × features): each block gets the squared distances of every
+    profile from two matrix products, keeps its k best by partial selection, and the
+    survivors are merged and re-measured exactly. Memory does not grow with the number
+    of samples. Rows missing a used feature never match.
+    """
+
+    def __init__(self, frame: pd.DataFrame, norm_meta: Dict[str, Tuple[float, float]], fields: Sequence[str]):
+        self.features = list(norm_meta)
+        self.norm_meta = norm_meta
+        matrix = frame[[f"{col}_norm" for col in self.features]].to_numpy(dtype=float)
+        self.matrix = matrix
+        # Términos de la expansión |x - p|² = x² - 2·x·p + p², con NaN -> 0 y su máscara aparte
+        self._missing = np.isnan(matrix).astype(float)
+        self._filled = np.nan_to_num(matrix)
+        self._squared = self._filled * self._filled
+        self.lat = frame["lat"].to_numpy(dtype=float)
+        self.lon = frame["lon"].to_numpy(dtype=float)
+        # Columnas de salida por fila (etiquetas, coordenadas y valores crudos)
+        self.fields = [f for f in (*fields, "lat", "lon", *self.features) if f in frame.columns]
+        self._columns = {f: _column_values(frame[f]) for f in self.fields}
+        labels = frame["distrito"].astype(str).tolist() if "distrito" in frame.columns else []
+        self._row_of = {label: i for i, label in reversed(list(enumerate(labels)))}
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    def normalize(self, profile: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """(normalized vector, 0/1 weights of the given features) for a raw-unit profile."""
+        unknown = [name for name in profile if name not in self.norm_meta]
+        if unknown:
+            raise ValueError(f"Variable desconocida: {unknown[0]}, usa {', '.join(self.features)}")
+        if not profile:
+            raise ValueError("El perfil debe traer al menos una variable")
+        vector, weights = np.zeros(len(self.features)), np.zeros(len(self.features))
+        for j, name in enumerate(self.features):
+            if name in profile:
+                min_v, max_v = self.norm_meta[name]
+                span = max_v - min_v
+                vector[j] = (profile[name] - min_v) / span if span else 0.0
+                weights[j] = 1.0
+        return vector, weights
+
+    def row_of(self, distrito: str) -> Optional[int]:
+        return self._row_of.get(distrito)
+
+    def profile_of(self, row: int) -> Dict[str, float]:
+        """Raw feature values of one row (the profile of an existing district)."""
+        return {f: self._columns[f][row] for f in self.features if self._columns[f][row] is not None}
+
+    def search(
+        self,
+        profiles: np.ndarray,
+        weights: np.ndarray,
+        k: int,
+        allowed: Optional[np.ndarray] = None,
+        exclude: Optional[Sequence[Optional[int]]] = None,
+    ) -> List[List[Tuple[int, float]]]:
+        """(row, distance) of the k closest rows for each profile (q × features arrays)."""
+        q, n = len(profiles), len(self.matrix)
+        n_used = np.maximum(weights.sum(axis=1), 1.0)
+        weighted = weights * profiles
+        constant = (weighted * profiles).sum(axis=1)
+        block = max(1, SIMILARITY_BLOCK_ELEMENTS // max(q * len(self.features), 1))
+        cand_rows, cand_sq = [], []
+        for lo in range(0, n, block):
+            hi = min(lo + block, n)
+            # Distancias² ponderadas de todo el bloque con dos productos de matrices
+            sq = self._squared[lo:hi] @ weights.T - 2.0 * (self._filled[lo:hi] @ weighted.T) + constant
+            sq = np.maximum(sq, 0.0).T
+            sq[(self._missing[lo:hi] @ weights.T).T > 0] = np.inf  # le falta una variable usada
+            if allowed is not None:
+                sq[:, ~allowed[lo:hi]] = np.inf
+            if exclude is not None:
+                for i, row in enumerate(exclude):
+                    if row is not None and lo <= row < hi:
+                        sq[i, row - lo] = np.inf
+            idx = smallest_k_rows(sq, k)
+            cand_rows.append(idx + lo)
+            cand_sq.append(np.take_along_axis(sq, idx, axis=1))
+        if not cand_rows:
+            return [[] for _ in range(q)]
+        rows, sq = np.concatenate(cand_rows, axis=1), np.concatenate(cand_sq, axis=1)
+        best = smallest_k_rows(sq, k)  # candidatos en orden de fila: empates por índice
+        rows = np.take_along_axis(rows, best, axis=1)
+        found = np.isfinite(np.take_along_axis(sq, best, axis=1))
+        results = []
+        for i in range(q):
+            picked = rows[i][found[i]]
+            # Distancia exacta de los elegidos (la expansión pierde precisión cerca de 0)
+            diff = np.where(weights[i] > 0, self.matrix[picked] - profiles[i], 0.0)
+            dist = np.sqrt((diff * diff).sum(axis=1) / n_used[i])
+            order = np.lexsort((picked, dist))
+            results.append([(int(picked[j]), float(dist[j])) for j in order])
+        return results
+
+    def within(self, lat: float, lon: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows inside the radius mask, km from the point to every row)."""
+        km = haversine_matrix(np.array([lat]), np.array([lon]), self.lat, self.lon)[0]
+        return km <= radius_km, km
+
+    def record(self, row: int) -> Dict:
+        return {f: self._columns[f][row] for f in self.fields}
+
+
+def _column_values(values: pd.Series) -> List:
+    if values.dtype.kind == "f":
+        return nan_to_none(values.to_numpy())
+    if values.dtype.kind in "iu":
+        return values.tolist()
+    return values.astype(object).tolist()
+
+
+def similar(index: SimilarityIndex, request: SimilarityRequest, districts: SimilarityIndex) -> Dict:
+    """Run a `SimilarityRequest` against ``index``: one result (query + matches) per profile, then per district.
+
+    District queries use the district's average profile from ``districts`` (the
+    district-level index); at that level the district itself is left out of its matches.
+    """
+    queries: List[Dict] = []
+    vectors, weights, exclude = [], [], []
+    for profile in request.profiles:
+        vector, weight = index.normalize(profile)
+        queries.append({"profile": profile})
+        vectors.append(vector)
+        weights.append(weight)
+        exclude.append(None)
+    for distrito in request.distritos:
+        row = districts.row_of(distrito)
+        if row is None:
+            raise KeyError(distrito)
+        vector, weight = index.normalize(districts.profile_of(row))
+        queries.append({"distrito": distrito})
+        vectors.append(vector)
+        weights.append(weight)
+        exclude.append(row if districts is index else None)  # no se devuelve a sí mismo
+    if not queries:
+        raise ValueError("Indica al menos un perfil (profiles) o un distrito (distritos)")
+
+    allowed, km = None, None
+    if request.radius_km is not None or request.lat is not None or request.lon is not None:
+        if request.lat is None or request.lon is None or request.radius_km is None:
+            raise ValueError("El filtro geográfico necesita lat, lon y radius_km")
+        allowed, km = index.within(request.lat, request.lon, request.radius_km)
+
+    found = index.search(np.array(vectors), np.array(weights), request.k, allowed, exclude)
+    results = []
+    for query, matches in zip(queries, found):
+        out = []
+        for row, dist in matches:
+            match = {**index.record(row), "distance": dist, "similarity": 1.0 - dist}
+            if km is not None:
+                match["distance_km"] = float(km[row])
+            out.append(match)
+        results.append({"query": query, "matches": out})
+    return {"level": request.level, "features": index.features, "results": results}
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+from .config import SNAPSHOT_DIR, SNAPSHOTS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Subir cuando cambie la limpieza/derivación en data_loader: invalida snapshots viejos
+SNAPSHOT_FORMAT = 1
+
+try:  # pyarrow es opcional: sin él se lee siempre el CSV
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - depende del entorno
+    pa = None
+    feather = None
+
+
+def snapshots_available() -> bool:
+    return SNAPSHOTS_ENABLED and feather is not None
+
+
+def _snapshot_dir(source: Path) -> Path:
+    return SNAPSHOT_DIR / source.stem
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_fingerprint(source: Path, with_hash: bool = True) -> Dict:
+    stat = source.stat()
+    fingerprint = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    if with_hash:
+        fingerprint["sha256"] = _file_hash(source)
+    return fingerprint
+
+
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _write_frame(df: pd.DataFrame, path: Path) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    feather.write_feather(pa.Table.from_pandas(df, preserve_index=True), tmp, compression="lz4")
+    os.replace(tmp, path)
+
+
+def _read_frame(path: Path) -> pd.DataFrame:
+    return feather.read_table(path, memory_map=True).to_pandas()
+
+
+def load_snapshot(source: Path) -> Optional[Tuple[Dict[str, pd.DataFrame], Dict]]:
+    """Return (frames, meta) if a snapshot of `source` exists and is still valid, else None.
+
+    The snapshot is stale when the CSV size changes; when only the mtime changes
+    the content hash decides (a `touch` does not force a re-parse).
+    """
+    if not snapshots_available():
+        return None
+    manifest_path = _snapshot_dir(source) / "manifest.json"
+    try:
+        manifest = json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        return None
+
+    saved = manifest["source"]
+    current = source_fingerprint(source, with_hash=False)
+    if current["size"] != saved["size"]:
+        return None
+    if current["mtime_ns"] != saved["mtime_ns"]:
+        if _file_hash(source) != saved["sha256"]:
+            return None
+        # Mismo contenido con mtime nuevo: actualiza el manifest para no volver a hashear
+        manifest["source"]["mtime_ns"] = current["mtime_ns"]
+        try:
+            _atomic_write_bytes(manifest_path, json.dumps(manifest).encode())
+        except OSError:
+            pass
+
+    try:
+        frames = {name: _read_frame(manifest_path.parent / f"{name}.feather") for name in manifest["frames"]}
+    except (OSError, pa.ArrowException) as exc:
+        logger.warning("Snapshot de %s ilegible, se releerá el CSV: %s", source.name, exc)
+        return None
+    return frames, manifest.get("meta", {})
+
+
+def write_snapshot(
+    source: Path, fingerprint: Dict, frames: Dict[str, pd.DataFrame], meta: Optional[Dict] = None
+) -> None:
+    """Persist cleaned frames (Arrow/Feather, lz4) plus JSON metadata next to the CSVs.
+
+    `fingerprint` must be taken (`source_fingerprint`) before parsing the CSV, so a
+    file replaced mid-parse never validates a snapshot of its old content.
+    """
+    if not snapshots_available():
+        return
+    target = _snapshot_dir(source)
+    try:
+        target.mkdir(parents=True, exist_ok=True)
+        for name, df in frames.items():
+            _write_frame(df, target / f"{name}.feather")
+        # El manifest va al final: sólo se considera válido un snapshot completo
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "source": fingerprint,
+            "frames": list(frames),
+            "meta": meta or {},
+        }
+        _atomic_write_bytes(target / "manifest.json", json.dumps(manifest).encode())
+    except OSError as exc:
+        logger.warning("No se pudo escribir el snapshot de %s: %s", source.name, exc)
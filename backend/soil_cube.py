@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from itertools import combinations
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .climate_store import nan_to_none
+
+CUBE_DIMENSIONS = ("provincia", "distrito", "cell", "month")
+CUBE_STATS = ("count", "mean", "std", "min", "max", "sum")
+
+
+@dataclass
+class Cuboid:
+    """Cells of one dimension subset: sorted dimension codes plus per-metric partials.
+
+    ``total`` and ``sumsq`` are taken over ``value - shift`` (one shift per metric,
+    the same in every cuboid), so they merge by addition and the variance does not
+    lose precision on metrics with a large offset such as the coordinates.
+    """
+
+    dims: Tuple[str, ...]
+    codes: np.ndarray  # celdas × dims, orden lexicográfico; -1 = sin valor
+    rows: np.ndarray  # muestras por celda
+    count: np.ndarray  # celdas × métricas (valores no nulos)
+    total: np.ndarray
+    sumsq: np.ndarray
+    min: np.ndarray
+    max: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def take(self, mask: np.ndarray) -> "Cuboid":
+        return Cuboid(
+            self.dims,
+            self.codes[mask],
+            self.rows[mask],
+            self.count[mask],
+            self.total[mask],
+            self.sumsq[mask],
+            self.min[mask],
+            self.max[mask],
+        )
+
+    def rollup(self, dims: Sequence[str]) -> "Cuboid":
+        """Merge the cells that share ``dims`` (sums of sums, min of mins): exact, no raw rows."""
+        keep = [self.dims.index(dim) for dim in dims]
+        codes = self.codes[:, keep]
+        if not len(self):
+            return Cuboid(tuple(dims), codes, self.rows, self.count, self.total, self.sumsq, self.min, self.max)
+        order = np.lexsort(codes.T[::-1]) if keep else np.arange(len(self))
+        codes = codes[order]
+        changed = np.any(codes[1:] != codes[:-1], axis=1) if keep else np.zeros(len(self) - 1, dtype=bool)
+        starts = np.concatenate([[0], np.flatnonzero(changed) + 1])
+
+        def reduce(ufunc: np.ufunc, values: np.ndarray) -> np.ndarray:
+            return ufunc.reduceat(values[order], starts, axis=0)
+
+        return Cuboid(
+            tuple(dims),
+            codes[starts],
+            reduce(np.add, self.rows),
+            reduce(np.add, self.count),
+            reduce(np.add, self.total),
+            reduce(np.add, self.sumsq),
+            reduce(np.fmin, self.min),
+            reduce(np.fmax, self.max),
+        )
+
+
+def _factorize(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    codes, labels = pd.factorize(values, sort=True)
+    return codes.astype(np.int64), np.asarray(labels, dtype=object)
+
+
+class SoilCube:
+    """Soil samples pre-aggregated by provincia × distrito × grid cell × month.
+
+    The base cuboid holds count/sum/sumsq/min/max of every metric per occupied
+    combination (a few thousand cells for ~50k samples). Coarser cuboids (subsets
+    of the dimensions, down to the grand total) are rolled up once at build time and
+    kept when they at least halve their source. A query starts from the smallest
+    cuboid that has every dimension it groups or filters by, masks its cells and
+    merges what remains, so its cost depends on the number of cells, never on the
+    number of samples.
+    Grid cells are squares of ``cell_deg`` degrees (``fila:columna`` of floor(lat / deg),
+    floor(lon / deg)); months come from ``fecha_muestra``.
+    """
+
+    def __init__(self, df: pd.DataFrame, metrics: Sequence[str], cell_deg: float):
+        self.metrics = [m for m in metrics if m in df.columns]
+        self.cell_deg = cell_deg
+        self.labels: Dict[str, np.ndarray] = {}
+        codes = []
+        for dim in ("provincia", "distrito"):
+            dim_codes, self.labels[dim] = _factorize(df[dim])
+            codes.append(dim_codes)
+
+        lat = df["lat"].to_numpy(dtype=float)
+        lon = df["lon"].to_numpy(dtype=float)
+        located = ~(np.isnan(lat) | np.isnan(lon))
+        cell_index = pd.MultiIndex.from_arrays(
+            [np.floor(lat[located] / cell_deg).astype(np.int64), np.floor(lon[located] / cell_deg).astype(np.int64)]
+        )
+        located_codes, cells = cell_index.factorize(sort=True)
+        cell_codes = np.full(len(df), -1, dtype=np.int64)  # sin coordenadas -> -1
+        cell_codes[located] = located_codes
+        self.cell_rows = cells.get_level_values(0).to_numpy(dtype=np.int64)
+        self.cell_cols = cells.get_level_values(1).to_numpy(dtype=np.int64)
+        self.labels["cell"] = np.array([f"{r}:{c}" for r, c in zip(self.cell_rows, self.cell_cols)], dtype=object)
+        codes.append(cell_codes)
+
+        # Meses desde 1970-01 (sin fecha -> -1)
+        dates = pd.to_datetime(df["fecha_muestra"], errors="coerce")
+        month_codes, month_values = _factorize((dates.dt.year - 1970) * 12 + dates.dt.month - 1)
+        self.month_keys = month_values.astype(np.int64)
+        self.labels["month"] = np.array([str(key) for key in self.month_keys.astype("datetime64[M]")], dtype=object)
+        codes.append(month_codes)
+        self._code_of = {dim: {label: i for i, label in enumerate(labels)} for dim, labels in self.labels.items()}
+
+        values = df[self.metrics].to_numpy(dtype=float) if self.metrics else np.empty((len(df), 0))
+        valid = ~np.isnan(values)
+        # Desplazamiento por métrica: promedio global (estabiliza sumsq)
+        counts = valid.sum(axis=0)
+        self.shift = np.where(counts > 0, np.nansum(values, axis=0) / np.maximum(counts, 1), 0.0)
+        centered = np.where(valid, values - self.shift, 0.0)
+        raw = Cuboid(
+            CUBE_DIMENSIONS,
+            np.column_stack(codes) if len(df) else np.empty((0, len(CUBE_DIMENSIONS)), dtype=np.int64),
+            np.ones(len(df), dtype=np.int64),
+            valid.astype(np.int64),
+            centered,
+            centered * centered,
+            values,
+            values,
+        )
+        self.cuboids: Dict[Tuple[str, ...], Cuboid] = {CUBE_DIMENSIONS: raw.rollup(CUBE_DIMENSIONS)}
+        for size in range(len(CUBE_DIMENSIONS) - 1, -1, -1):
+            for dims in combinations(CUBE_DIMENSIONS, size):
+                source = self.source_for(dims)
+                rolled = source.rollup(dims)
+                # Sólo se guarda si reduce a la mitad o menos (p.ej. distrito ya implica provincia)
+                if 2 * len(rolled) <= len(source):
+                    self.cuboids[dims] = rolled
+        self.samples = len(df)
+
+    def source_for(self, dims: Sequence[str]) -> Cuboid:
+        """Smallest precomputed cuboid that has every dimension in ``dims``."""
+        candidates = [c for key, c in self.cuboids.items() if set(dims) <= set(key)]
+        return min(candidates, key=len)
+
+    def query(
+        self,
+        by: Sequence[str] = (),
+        filters: Optional[Dict[str, Sequence[str]]] = None,
+        month_from: Optional[int] = None,
+        month_to: Optional[int] = None,
+    ) -> Cuboid:
+        """Cells grouped by ``by`` over the samples matching every filter.
+
+        ``filters`` maps a dimension to the labels to keep (unknown labels match
+        nothing); ``month_from``/``month_to`` are inclusive months since 1970-01.
+        """
+        unknown = [dim for dim in (*by, *(filters or {})) if dim not in CUBE_DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Dimensión inválida: {unknown[0]}, usa {', '.join(CUBE_DIMENSIONS)}")
+        by = tuple(dim for dim in CUBE_DIMENSIONS if dim in by)
+        filters = {dim: labels for dim, labels in (filters or {}).items() if labels}
+        filtered = set(filters) | ({"month"} if month_from is not None or month_to is not None else set())
+        source = self.source_for(set(by) | filtered)
+        if not filtered:
+            return source if source.dims == by else source.rollup(by)
+
+        mask = np.ones(len(source), dtype=bool)
+        for dim, labels in filters.items():
+            wanted = [self._code_of[dim][label] for label in labels if label in self._code_of[dim]]
+            mask &= np.isin(source.codes[:, source.dims.index(dim)], wanted)
+        if "month" in filtered:
+            month_codes = source.codes[:, source.dims.index("month")]
+            keys = np.where(month_codes >= 0, self.month_keys[month_codes], np.iinfo(np.int64).min)
+            if month_from is not None:
+                mask &= (month_codes >= 0) & (keys >= month_from)
+            if month_to is not None:
+                mask &= (month_codes >= 0) & (keys <= month_to)
+        return source.take(mask).rollup(by)
+
+    def columns(self, cuboid: Cuboid, metrics: Sequence[str], stats: Sequence[str] = ("mean",)) -> Dict[str, List]:
+        """One list per field: the dimension labels, ``muestras`` and each metric statistic.
+
+        The mean keeps the metric name (as in `/soil/zones`); every other statistic is
+        ``<metric>_<stat>``. Grid cells add the center of the cell (``cell_lat``, ``cell_lon``).
+        """
+        out: Dict[str, List] = {}
+        for j, dim in enumerate(cuboid.dims):
+            codes = cuboid.codes[:, j]
+            labels = self.labels[dim]
+            out[dim] = [labels[c] if c >= 0 else None for c in codes.tolist()]
+            if dim == "cell":
+                located = codes >= 0
+                safe = np.where(located, codes, 0)
+                out["cell_lat"] = nan_to_none(np.where(located, (self.cell_rows[safe] + 0.5) * self.cell_deg, np.nan))
+                out["cell_lon"] = nan_to_none(np.where(located, (self.cell_cols[safe] + 0.5) * self.cell_deg, np.nan))
+        out["muestras"] = cuboid.rows.tolist()
+        for metric in metrics:
+            i = self.metrics.index(metric)
+            n = cuboid.count[:, i].astype(float)
+            total = cuboid.total[:, i]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean_c = np.where(n > 0, total / n, np.nan)
+                var = np.where(n > 1, np.maximum((cuboid.sumsq[:, i] - total * mean_c) / (n - 1), 0.0), np.nan)
+            values = {
+                "mean": mean_c + self.shift[i],
+                "std": np.sqrt(var),
+                "min": cuboid.min[:, i],
+                "max": cuboid.max[:, i],
+                "sum": np.where(n > 0, total + self.shift[i] * n, np.nan),
+            }
+            for stat in stats:
+                name = metric if stat == "mean" else f"{metric}_{stat}"
+                out[name] = cuboid.count[:, i].tolist() if stat == "count" else nan_to_none(values[stat])
+        return out
+
+
+def month_key(year: int, month: int) -> int:
+    """Months since 1970-01 (the cube's month coordinate)."""
+    return (year - 1970) * 12 + (month - 1)
+
+
+def parse_month(value: str) -> int:
+    """``YYYY-MM`` (or a full ISO date) -> months since 1970-01."""
+    try:
+        stamp = pd.Timestamp(value)
+    except ValueError:
+        stamp = pd.NaT
+    if stamp is pd.NaT:
+        raise ValueError(f"Mes inválido: {value}, usa YYYY-MM")
+    return month_key(stamp.year, stamp.month)
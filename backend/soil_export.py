@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import data_loader
+from .config import SOIL_EXPORT_CHUNK_ROWS, SOIL_EXPORT_CSV_MIN_BYTES
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+EXPORT_SOURCES = ("auto", "memory", "csv")
+
+
+@dataclass
+class SampleFilter:
+    """Row filter for raw soil samples; empty fields do not filter."""
+
+    distritos: Sequence[str] = ()
+    provincias: Sequence[str] = ()
+    date_from: Optional[pd.Timestamp] = None
+    date_to: Optional[pd.Timestamp] = None
+    # columna -> (mínimo, máximo), ambos inclusivos y opcionales
+    ranges: Dict[str, Tuple[Optional[float], Optional[float]]] = field(default_factory=dict)
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        keep = np.ones(len(df), dtype=bool)
+        if self.distritos:
+            keep &= df["distrito"].isin(self.distritos).to_numpy()
+        if self.provincias:
+            keep &= df["provincia"].isin(self.provincias).to_numpy()
+        if self.date_from is not None or self.date_to is not None:
+            dates = df["fecha_muestra"]
+            if self.date_from is not None:
+                keep &= (dates >= self.date_from).to_numpy()
+            if self.date_to is not None:
+                keep &= (dates <= self.date_to).to_numpy()
+        for col, (low, high) in self.ranges.items():
+            values = df[col].to_numpy(dtype=float)
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values <= high
+        return keep
+
+
+def parse_range(spec: str) -> Tuple[str, Optional[float], Optional[float]]:
+    """``"pH:5.5:7"`` / ``"pH:5.5:"`` / ``"pH::7"`` -> (column, min, max)."""
+    parts = spec.split(":")
+    if len(parts) != 3 or not parts[0]:
+        raise ValueError(f"Rango inválido '{spec}', usa columna:min:max")
+    col, low, high = parts
+    if col not in data_loader.SOIL_NUMERIC_COLS:
+        raise ValueError(f"Columna {col} no es numérica en suelo")
+    try:
+        return col, float(low) if low else None, float(high) if high else None
+    except ValueError:
+        raise ValueError(f"Rango inválido '{spec}', min y max deben ser números") from None
+
+
+def resolve_source(source: str = "auto") -> str:
+    # El CSV se lee por partes si es grande o si el frame aún no está en memoria
+    if source != "auto":
+        return source
+    loaded = data_loader.load_soil.cache_info().currsize > 0
+    too_big = data_loader.SOIL_PATH.stat().st_size >= SOIL_EXPORT_CSV_MIN_BYTES
+    return "memory" if loaded and not too_big else "csv"
+
+
+def iter_samples(
+    filt: SampleFilter,
+    source: str = "auto",
+    limit: Optional[int] = None,
+    chunk_rows: int = SOIL_EXPORT_CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """Filtered raw samples in chunks of at most `chunk_rows` rows."""
+    source = resolve_source(source)
+    remaining = limit
+    if source == "memory":
+        df, _, _ = data_loader.load_soil()
+        idx = np.flatnonzero(filt.mask(df))
+        if remaining is not None:
+            idx = idx[:remaining]
+        for lo in range(0, len(idx), chunk_rows):
+            yield df.iloc[idx[lo : lo + chunk_rows]]
+        return
+    for chunk in data_loader.iter_soil_csv(chunk_rows):
+        chunk = chunk[filt.mask(chunk)]
+        if remaining is not None:
+            chunk = chunk.iloc[:remaining]
+            remaining -= len(chunk)
+        if len(chunk):
+            yield chunk
+        if remaining == 0:
+            return
+
+
+def _iso_dates(chunk: pd.DataFrame) -> pd.DataFrame:
+    out = chunk.copy()
+    out["fecha_muestra"] = out["fecha_muestra"].dt.strftime("%Y-%m-%d")
+    return out
+
+
+def encode_chunks(chunks: Iterator[pd.DataFrame], fmt: str) -> Iterator[bytes]:
+    """NDJSON (one object per line, NaN -> null) or CSV with a single header row."""
+    header = True
+    for chunk in chunks:
+        chunk = _iso_dates(chunk)
+        if fmt == "ndjson":
+            text = chunk.to_json(orient="records", lines=True, force_ascii=False, double_precision=15)
+            yield (text if text.endswith("\n") else text + "\n").encode()
+        else:
+            yield chunk.to_csv(index=False, header=header).encode()
+        header = False
+    if fmt == "csv" and header:
+        # Sin coincidencias: sólo la cabecera
+        yield (",".join(sample_columns()) + "\n").encode()
+
+
+def export_samples(
+    filt: SampleFilter,
+    fmt: str = "ndjson",
+    source: str = "auto",
+    limit: Optional[int] = None,
+    chunk_rows: int = SOIL_EXPORT_CHUNK_ROWS,
+) -> Iterator[bytes]:
+    return encode_chunks(iter_samples(filt, source, limit, chunk_rows), fmt)
+
+
+def sample_columns() -> List[str]:
+    return list(pd.read_csv(data_loader.SOIL_PATH, nrows=0).columns)
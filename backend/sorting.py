@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import heapq
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .graph import smallest_k
+
+SORT_METHODS = ("auto", "quicksort", "introsort", "numpy")
+# Por debajo de este tamaño el overhead de NumPy no compensa
+NUMPY_MIN_ITEMS = 64
+_INSERTION_CUTOFF = 16
+
+
+def quicksort(items: List[Dict], key: str) -> List[Dict]:
+    """Three-way QuickSort with an explicit stack (no recursion limit); stable like the original."""
+    out: List[Dict] = []
+    # Pila de tareas: listas por ordenar o bloques ya ordenados (iguales al pivote)
+    stack: List[Tuple[bool, List[Dict]]] = [(False, items)]
+    while stack:
+        done, chunk = stack.pop()
+        if done or len(chunk) <= 1:
+            out.extend(chunk)
+            continue
+        pivot = chunk[len(chunk) // 2][key]
+        left = [x for x in chunk if x[key] < pivot]
+        middle = [x for x in chunk if x[key] == pivot]
+        right = [x for x in chunk if x[key] > pivot]
+        # LIFO: se apila en orden inverso para emitir izquierda, medio, derecha
+        stack.append((False, right))
+        stack.append((True, middle))
+        stack.append((False, left))
+    return out
+
+
+def _insertion_sort(order: List[int], keys: List, lo: int, hi: int) -> None:
+    for i in range(lo + 1, hi):
+        idx = order[i]
+        value = keys[idx]
+        j = i - 1
+        while j >= lo and keys[order[j]] > value:
+            order[j + 1] = order[j]
+            j -= 1
+        order[j + 1] = idx
+
+
+def _heapsort(order: List[int], keys: List, lo: int, hi: int) -> None:
+    heap = [(keys[idx], idx) for idx in order[lo:hi]]
+    heapq.heapify(heap)
+    for i in range(lo, hi):
+        order[i] = heapq.heappop(heap)[1]
+
+
+def introsort(keys: Sequence) -> List[int]:
+    """In-place introsort of an index permutation by `keys` (not stable).
+
+    Median-of-three QuickSort with Hoare-style partitioning, insertion sort for
+    short ranges and a heapsort fallback past 2·log2(n) levels, so already sorted
+    or heavily tied series stay O(n log n) and never recurse.
+    """
+    keys = list(keys)
+    order = list(range(len(keys)))
+    if len(order) < 2:
+        return order
+    stack = [(0, len(order), 2 * int(math.log2(len(order))))]
+    while stack:
+        lo, hi, depth = stack.pop()
+        if hi - lo <= _INSERTION_CUTOFF:
+            _insertion_sort(order, keys, lo, hi)
+            continue
+        if depth == 0:
+            _heapsort(order, keys, lo, hi)
+            continue
+        mid = (lo + hi) // 2
+        a, b, c = keys[order[lo]], keys[order[mid]], keys[order[hi - 1]]
+        pivot = sorted((a, b, c))[1]
+        i, j = lo, hi - 1
+        while i <= j:
+            while keys[order[i]] < pivot:
+                i += 1
+            while keys[order[j]] > pivot:
+                j -= 1
+            if i <= j:
+                order[i], order[j] = order[j], order[i]
+                i += 1
+                j -= 1
+        stack.append((lo, j + 1, depth - 1))
+        stack.append((i, hi, depth - 1))
+    return order
+
+
+def argsort_order(keys: Sequence[float]) -> np.ndarray:
+    """Stable NumPy argsort (timsort/radix on numeric keys)."""
+    return np.argsort(np.asarray(keys, dtype=float), kind="stable")
+
+
+def top_k_order(keys: Sequence[float], k: int, reverse: bool = False) -> np.ndarray:
+    """First k positions of the stable (optionally reversed) sort, via partial selection.
+
+    Matches ``stable_sort[:k]`` (or ``reversed(stable_sort)[:k]``) exactly, ties included.
+    """
+    values = np.asarray(keys, dtype=float)
+    if not reverse:
+        return smallest_k(values, k)
+    # Orden inverso de un sort estable: mayores primero y, en empates, el índice mayor primero
+    n = len(values)
+    return (n - 1) - smallest_k(-values[::-1], k)
+
+
+def multi_key_sort(items: List[Dict], keys: Sequence[Tuple[str, bool]]) -> List[Dict]:
+    """Stable sort by several (field, descending) keys, most significant first."""
+    out = list(items)
+    for field, descending in reversed(keys):
+        out.sort(key=lambda x: x[field], reverse=descending)
+    return out
+
+
+def parse_sort_keys(spec: str) -> List[Tuple[str, bool]]:
+    """``"value,-label"`` -> [("value", False), ("label", True)]."""
+    keys = []
+    for part in spec.split(","):
+        part = part.strip()
+        if part:
+            keys.append((part.lstrip("-"), part.startswith("-")))
+    return keys
+
+
+def choose_method(n: int, top: Optional[int] = None) -> str:
+    if top is not None and top < n:
+        return "top-k"
+    return "numpy" if n >= NUMPY_MIN_ITEMS else "quicksort"
+
+
+def sort_items(
+    items: List[Dict],
+    key: str,
+    method: str = "auto",
+    reverse: bool = False,
+    top: Optional[int] = None,
+    keys: Optional[Sequence[Tuple[str, bool]]] = None,
+) -> Tuple[List[Dict], str]:
+    """Sort (or rank the top N of) `items` and return (result, strategy used)."""
+    if keys:
+        result = multi_key_sort(items, keys)
+        if reverse:
+            result.reverse()
+        return (result[:top] if top is not None else result), "multi-key"
+    if method == "auto":
+        method = choose_method(len(items), top)
+    if method == "top-k":
+        order = top_k_order([x[key] for x in items], top, reverse)
+        return [items[i] for i in order.tolist()], method
+
+    if method == "quicksort":
+        result = quicksort(items, key)
+    elif method == "introsort":
+        result = [items[i] for i in introsort([x[key] for x in items])]
+    elif method == "numpy":
+        result = [items[i] for i in argsort_order([x[key] for x in items]).tolist()]
+    else:
+        raise ValueError(f"Método de orden inválido: {method}, usa {', '.join(SORT_METHODS)}")
+    if reverse:
+        result.reverse()
+    return (result[:top] if top is not None else result), method
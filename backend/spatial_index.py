@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .climate_store import nan_to_none
+from .graph import EARTH_RADIUS_KM, haversine_matrix
+
+# Campos devueltos por muestra (además de la distancia en consultas por punto)
+SAMPLE_FIELDS = [
+    "distrito",
+    "provincia",
+    "lat",
+    "lon",
+    "pH",
+    "MO_pct",
+    "CEC_cmol_kg",
+    "N_total_pct",
+    "P_disponible_mg_kg",
+    "K_intercambiable_mg_kg",
+    "pendiente_pct",
+    "indice_calidad_suelo",
+]
+# Puntos promedio por celda de la grilla
+_TARGET_PER_CELL = 16
+# Holgura (grados) al pasar un radio en km a una caja lat/lon; el filtro exacto va después
+_BOX_MARGIN_DEG = 1e-9
+
+
+class SoilSpatialIndex:
+    """Uniform lat/lon grid over the soil samples, plus a BallTree for k-nearest.
+
+    Points are stored sorted by cell (row-major), so the cells of one grid row that
+    overlap a box are a single contiguous slice: a bounding-box query is one slice
+    per grid row plus an exact mask on the border. Radius queries take the box that
+    encloses the circle and keep the candidates whose `graph.haversine_matrix`
+    distance is within the radius, so they match a brute-force scan exactly.
+    """
+
+    def __init__(self, df: pd.DataFrame, target_per_cell: int = _TARGET_PER_CELL):
+        lat_all = df["lat"].to_numpy(dtype=float)
+        lon_all = df["lon"].to_numpy(dtype=float)
+        self.positions = np.flatnonzero(~(np.isnan(lat_all) | np.isnan(lon_all)))  # filas de df con coordenadas
+        lat, lon = lat_all[self.positions], lon_all[self.positions]
+        n = len(lat)
+        self.lat0 = float(lat.min()) if n else 0.0
+        self.lon0 = float(lon.min()) if n else 0.0
+        lat_span = float(lat.max()) - self.lat0 if n else 0.0
+        lon_span = float(lon.max()) - self.lon0 if n else 0.0
+        # Celda cuadrada (en grados) para ~target_per_cell puntos; se agranda si la grilla sale enorme
+        cell = math.sqrt(max(lat_span * lon_span, 1e-12) * target_per_cell / max(n, 1))
+        cell = max(cell, 1e-6)
+        while (int(lat_span / cell) + 1) * (int(lon_span / cell) + 1) > 4 * n + 16:
+            cell *= 2
+        self.cell = cell
+        self.n_lat = int(lat_span / cell) + 1
+        self.n_lon = int(lon_span / cell) + 1
+
+        cell_id = self._row(lat) * self.n_lon + self._col(lon)
+        order = np.argsort(cell_id, kind="stable")
+        self.order = self.positions[order]  # posición en df de cada punto, ordenado por celda
+        self.lat = np.ascontiguousarray(lat[order])
+        self.lon = np.ascontiguousarray(lon[order])
+        self.cell_start = np.searchsorted(cell_id[order], np.arange(self.n_lat * self.n_lon + 1))
+        self._tree = None
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def _row(self, lat: np.ndarray) -> np.ndarray:
+        return np.clip(((lat - self.lat0) / self.cell).astype(np.int64), 0, self.n_lat - 1)
+
+    def _col(self, lon: np.ndarray) -> np.ndarray:
+        return np.clip(((lon - self.lon0) / self.cell).astype(np.int64), 0, self.n_lon - 1)
+
+    def _box_candidates(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """Sorted-array slots of every point in the cells overlapping the box."""
+        if not len(self) or max_lat < self.lat0 or max_lon < self.lon0:
+            return np.empty(0, dtype=np.int64)
+        r0, r1 = self._row(np.array([min_lat, max_lat]))
+        c0, c1 = self._col(np.array([min_lon, max_lon]))
+        first = np.arange(r0, r1 + 1) * self.n_lon
+        starts, ends = self.cell_start[first + c0], self.cell_start[first + c1 + 1]
+        slices = [np.arange(s, e) for s, e in zip(starts.tolist(), ends.tolist()) if e > s]
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """Positions (in the source frame, ascending) of the samples inside the box, edges included."""
+        slots = self._box_candidates(min_lat, min_lon, max_lat, max_lon)
+        lat, lon = self.lat[slots], self.lon[slots]
+        inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        return np.sort(self.order[slots[inside]])
+
+    def radius(self, lat: float, lon: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """(positions, km) of the samples within `radius_km` great-circle km, nearest first."""
+        d_lat = math.degrees(radius_km / EARTH_RADIUS_KM) + _BOX_MARGIN_DEG
+        if abs(lat) + d_lat >= 90 or radius_km >= math.pi * EARTH_RADIUS_KM / 2:
+            slots = np.arange(len(self))  # cerca de los polos la caja no acota la longitud
+        else:
+            ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(abs(lat) + d_lat))
+            d_lon = 180.0 if ratio >= 1 else math.degrees(math.asin(ratio)) + _BOX_MARGIN_DEG
+            slots = self._box_candidates(lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon)
+        dist = haversine_matrix([lat], [lon], self.lat[slots], self.lon[slots])[0]
+        keep = dist <= radius_km
+        slots, dist = slots[keep], dist[keep]
+        order = np.lexsort((self.order[slots], dist))  # por distancia; empates por fila
+        return self.order[slots[order]], dist[order]
+
+    def build_tree(self):
+        """BallTree over the haversine metric for `nearest`, built once (the loader builds it up front)."""
+        if self._tree is None:
+            from sklearn.neighbors import BallTree
+
+            self._tree = BallTree(np.radians(np.column_stack([self.lat, self.lon])), metric="haversine")
+        return self._tree
+
+    def nearest(self, lat: float, lon: float, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(positions, km) of the `k` nearest samples (BallTree over the haversine metric)."""
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        _, slots = self.build_tree().query(np.radians([[lat, lon]]), k=k)
+        slots = slots[0]
+        # Distancias con la misma fórmula que el grafo (no la del árbol)
+        dist = haversine_matrix([lat], [lon], self.lat[slots], self.lon[slots])[0]
+        order = np.lexsort((self.order[slots], dist))
+        return self.order[slots[order]], dist[order]
+
+
+def sample_records(df: pd.DataFrame, positions: np.ndarray, distance_km: Optional[np.ndarray] = None) -> List[Dict]:
+    """Rows of `df` at `positions` as JSON-safe dicts (optionally with `distance_km`)."""
+    subset = df.iloc[positions]
+    columns: Dict[str, List] = {"row": positions.tolist()}
+    for col in SAMPLE_FIELDS:
+        if col in ("distrito", "provincia"):
+            columns[col] = subset[col].astype(object).tolist()
+        else:
+            columns[col] = nan_to_none(subset[col].to_numpy(dtype=float))
+    if distance_km is not None:
+        columns["distance_km"] = distance_km.tolist()
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .config import WARMUP_WAIT_S
+from .metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+COMPONENT_STATES = ("pending", "loading", "ready", "failed")
+
+
+class NotReady(Exception):
+    """A component a request needs is still loading (after the wait) or failed to load."""
+
+    def __init__(self, name: str, state: str, error: Optional[str] = None):
+        self.name = name
+        self.state = state
+        self.error = error
+        super().__init__(f"{name}: {state}" + (f" ({error})" if error else ""))
+
+
+@dataclass
+class Component:
+    name: str
+    load: Callable[[], Any]
+    deps: Tuple[str, ...] = ()
+    state: str = "pending"
+    value: Any = None
+    error: Optional[str] = None
+    started: Optional[float] = None
+    seconds: Optional[float] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def info(self) -> Dict:
+        elapsed = self.seconds
+        if elapsed is None and self.started is not None:
+            elapsed = time.monotonic() - self.started
+        out = {"state": self.state, "deps": list(self.deps), "seconds": None if elapsed is None else round(elapsed, 3)}
+        if self.error:
+            out["error"] = self.error
+        return out
+
+
+class Warmup:
+    """Background loading of datasets and derived structures, with per-component state.
+
+    Each component runs in a worker thread once all of its dependencies are ready, so
+    independent chains (climate, soil) load concurrently while the server already
+    accepts requests. Endpoints `await wait(...)` for what they need: they get the
+    loaded value, or `NotReady` if it is still loading after `timeout` or failed.
+    Create and `start()` it inside the running event loop (app startup).
+    """
+
+    def __init__(self) -> None:
+        self.components: Dict[str, Component] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._started: Optional[float] = None
+
+    def add(self, name: str, load: Callable[[], Any], deps: Sequence[str] = ()) -> None:
+        unknown = [dep for dep in deps if dep not in self.components]
+        if unknown:
+            raise ValueError(f"Dependencias desconocidas para {name}: {unknown}")
+        self.components[name] = Component(name, load, tuple(deps))
+
+    def start(self) -> None:
+        self._started = time.monotonic()
+        self._tasks = [asyncio.ensure_future(self._run(comp)) for comp in self.components.values()]
+
+    def _load(self, comp: Component) -> Any:
+        with stage_timer(f"warmup:{comp.name}"):
+            return comp.load()
+
+    async def _run(self, comp: Component) -> None:
+        try:
+            for dep in comp.deps:
+                parent = self.components[dep]
+                await parent.done.wait()
+                if parent.state != "ready":
+                    comp.state, comp.error = "failed", f"depende de {dep}, que falló"
+                    return
+            comp.state, comp.started = "loading", time.monotonic()
+            try:
+                comp.value = await asyncio.to_thread(self._load, comp)
+            except Exception as exc:
+                logger.exception("Falló la carga de %s", comp.name)
+                comp.state, comp.error = "failed", f"{type(exc).__name__}: {exc}"
+            else:
+                comp.state = "ready"
+                logger.info("%s listo en %.2fs", comp.name, time.monotonic() - comp.started)
+            comp.seconds = time.monotonic() - comp.started
+        finally:
+            comp.done.set()
+
+    async def wait(self, *names: str, timeout: float = WARMUP_WAIT_S) -> Any:
+        """Value of each component (a single value for one name), waiting up to `timeout` seconds in total."""
+        deadline = time.monotonic() + timeout
+        values = []
+        for name in names:
+            comp = self.components[name]
+            if not comp.done.is_set():
+                try:
+                    await asyncio.wait_for(comp.done.wait(), max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    raise NotReady(name, comp.state) from None
+            if comp.state != "ready":
+                raise NotReady(name, comp.state, comp.error)
+            values.append(comp.value)
+        return values[0] if len(values) == 1 else tuple(values)
+
+    async def join(self) -> None:
+        """Wait until every component has finished loading (ready or failed)."""
+        await asyncio.gather(*self._tasks)
+
+    async def wait_all(self, timeout: float) -> bool:
+        try:
+            await self.wait(*self.components, timeout=timeout)
+        except NotReady:
+            return False
+        return True
+
+    def is_ready(self) -> bool:
+        return all(comp.state == "ready" for comp in self.components.values())
+
+    def status(self) -> Dict:
+        done = sum(comp.done.is_set() for comp in self.components.values())
+        return {
+            "ready": self.is_ready(),
+            "progress": {"done": done, "total": len(self.components)},
+            "elapsed_s": None if self._started is None else round(time.monotonic() - self._started, 3),
+            "components": {name: comp.info() for name, comp in self.components.items()},
+        }